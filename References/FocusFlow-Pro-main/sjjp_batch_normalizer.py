@@ -0,0 +1,483 @@
+"""
+SJJP Student List Normalizer – batch command line
+=================================================
+
+Headless counterpart of the Streamlit app in
+``sjjp_student_normalizer_app.py`` for nightly consolidations.  It takes
+files, directories or glob patterns, normalises every roster on a pool
+of worker processes with the same pipeline as the app
+(``_read_uploaded_file`` → ``_normalise_dataframe`` →
+``_to_import_format``) and writes one ``<school>_Import.csv`` per school
+(``--format`` picks gzip or Parquet, ``--zip`` bundles them).
+As in the app, the school name is the file name without its extension,
+so ``Al Noor.csv`` and ``Al Noor.xlsx`` end up in the same import file,
+in input order.
+
+Usage
+-----
+::
+
+    python sjjp_batch_normalizer.py rosters/ "extra/*.xlsx" -o out/ -j 8
+
+A per-file report (status, rows, timings, error, counts of Emirates IDs
+that failed validation) is printed at the end and can also be written
+as JSON with ``--report``; with ``--profile`` each file entry also lists
+the wall time and rows of every pipeline stage (``--trace-memory`` adds
+memory deltas).  ``--dedupe`` merges students that appear in several
+files of a school (same Student No or valid Emirate Id, never two
+Student Nos); ``--conflicts`` writes the fields whose values disagreed.
+``--fuzzy`` lists groups of records with similar names that are
+probably the same student, for review.  ``--cache-dir`` keeps cleaned
+rosters in an on-disk cache shared with the app, so files that come back
+unchanged next week are neither read nor cleaned again.  ``--previous``
+points at last run's import files: each school found there only gets
+its new and changed students, and ``--changes`` lists what changed.
+``--rules`` swaps the built-in cleaning rules for a JSON rule plan (see
+``NORMALISATION_PLAN``), e.g. to map an extra column into the import.
+The exit status is 1 when at least one file failed.
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from sjjp_student_normalizer_app import (
+    CSV_CHUNK_SIZE,
+    DEDUPE_CONFLICT_COLUMNS,
+    DELTA_REPORT_COLUMNS,
+    DISK_CACHE_BYTES,
+    DISK_CACHE_DIR,
+    EXPORT_FORMATS,
+    FUZZY_REPORT_COLUMNS,
+    NORMALISATION_ENGINES,
+    NORMALISATION_PLAN,
+    SECTION_SCOPES,
+    CleanerCache,
+    DiskCache,
+    ImportWriter,
+    StageProfiler,
+    _NamedBytes,
+    _apply_section_pattern,
+    _available_export_formats,
+    _clean_dataframe,
+    _compile_rule_plan,
+    _deduplicate_students,
+    _emirates_id_issues,
+    _fuzzy_duplicate_candidates,
+    _import_delta,
+    _load_rule_plan,
+    _export_file_name,
+    _path_digest,
+    _profile_stage,
+    _read_previous_import,
+    _read_streamed_import,
+    _read_uploaded_file,
+    _rule_plan_digest,
+    _stream_csv_to_import,
+    _to_import_format,
+    _write_zip_bundle,
+)
+
+# Extensions picked up when a directory is given.  ``.xls`` is included so
+# that it shows up as a failure in the report instead of being ignored.
+INPUT_EXTENSIONS = ('.csv', '.xlsx', '.xls', '.docx')
+
+# Cleaner cache of the current worker process, shared by the files it handles.
+_worker_cache: Optional[CleanerCache] = None
+
+
+def _school_name(path: Path) -> str:
+    """Default school name for a file, as in the app (name without extension)."""
+    return re.sub(r'\.[^.]+$', '', path.name)
+
+
+def _collect_inputs(patterns: List[str], recursive: bool = False) -> List[Path]:
+    """Expand files, directories and glob patterns into a sorted, unique list."""
+    found = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            candidates = path.rglob('*') if recursive else path.iterdir()
+            found.extend(p for p in candidates
+                         if p.is_file() and p.suffix.lower() in INPUT_EXTENSIONS)
+        elif path.is_file():
+            found.append(path)
+        else:
+            found.extend(Path(p) for p in glob.glob(pattern, recursive=recursive)
+                         if Path(p).is_file())
+    return sorted(set(found))
+
+
+def _process_file(path: Path, part_path: Path, section_pattern_option: str, engine: str,
+                  stream_csv: bool, chunksize: int, profile: bool = False,
+                  trace_memory: bool = False, sheet_workers: Optional[int] = None,
+                  section_scope: str = 'file', cache_dir: Optional[Path] = None,
+                  cache_bytes: int = DISK_CACHE_BYTES,
+                  plan: List[dict] = NORMALISATION_PLAN) -> dict:
+    """Normalise one roster into ``part_path`` and return its report entry.
+
+    Runs inside a worker process; exceptions are reported, not raised.
+    With ``profile`` the entry also gets the ``stages`` records of a
+    ``StageProfiler`` (with memory when ``trace_memory`` is set).
+    ``sheet_workers`` is passed on to the XLSX reader and ``section_scope``
+    to the normaliser.  With ``cache_dir`` the cleaned roster is looked up
+    in (and else written to) a ``DiskCache`` there, and ``cached`` tells
+    whether reading and cleaning were skipped; streamed CSVs bypass it.
+    ``plan`` holds the cleaning rules (see ``NORMALISATION_PLAN``).
+    """
+    global _worker_cache
+    if _worker_cache is None:
+        _worker_cache = CleanerCache()
+    profiler = StageProfiler(trace_memory=trace_memory) if profile else None
+    result = {'file': str(path), 'school': _school_name(path), 'status': 'ok',
+              'rows': 0, 'read_s': 0.0, 'normalise_s': 0.0, 'write_s': 0.0, 'error': ''}
+    started = time.perf_counter()
+    try:
+        if stream_csv and path.suffix.lower() == '.csv':
+            with open(part_path, 'wb') as out:
+                summary, err = _stream_csv_to_import(
+                    path, out, section_pattern_option, chunksize=chunksize,
+                    engine=engine, cache=_worker_cache, profiler=profiler,
+                    section_scope=section_scope, plan=plan,
+                )
+            if summary is None:
+                result.update(status='failed', error=err)
+            else:
+                result.update(rows=summary['rows'], emirates_id=summary['emirates_id'],
+                              normalise_s=time.perf_counter() - started)
+            return result
+
+        disk = DiskCache(cache_dir, cache_bytes) if cache_dir is not None else None
+        cleaned = None
+        if disk is not None:
+            disk_key = (_path_digest(path), path.suffix.lower(), engine)
+            if plan != NORMALISATION_PLAN:
+                disk_key += (_rule_plan_digest(plan),)
+            with _profile_stage(profiler, 'disk_cache:get') as stage:
+                cleaned = disk.get(disk_key)
+                stage['rows'] = len(cleaned) if cleaned is not None else 0
+            result['cached'] = cleaned is not None
+        if cleaned is None:
+            with _profile_stage(profiler, 'read') as stage:
+                df, err = _read_uploaded_file(_NamedBytes.from_path(path),
+                                              sheet_workers=sheet_workers)
+                stage['rows'] = len(df) if df is not None else 0
+            if df is None:
+                result.update(status='failed', error=err,
+                              read_s=time.perf_counter() - started)
+                return result
+        result['read_s'] = time.perf_counter() - started
+        step = time.perf_counter()
+        if cleaned is None:
+            cleaned = _clean_dataframe(df, engine=engine, cache=_worker_cache,
+                                       profiler=profiler, plan=plan)
+            if disk is not None:
+                with _profile_stage(profiler, 'disk_cache:put', len(cleaned)):
+                    disk.put(disk_key, cleaned)
+        normalised = _apply_section_pattern(cleaned, section_pattern_option, engine=engine,
+                                            cache=_worker_cache, profiler=profiler,
+                                            section_scope=section_scope)
+        with _profile_stage(profiler, 'import_format', len(normalised)):
+            import_df = _to_import_format(normalised, plan=plan)
+        result['normalise_s'] = time.perf_counter() - step
+        step = time.perf_counter()
+        with _profile_stage(profiler, 'export', len(import_df)):
+            import_df.to_csv(part_path, index=False, encoding='utf-8')
+        result['write_s'] = time.perf_counter() - step
+        result['rows'] = len(import_df)
+        if 'Emirate Id Status' in normalised.columns:
+            result['emirates_id'] = _emirates_id_issues(normalised['Emirate Id Status'])
+    except Exception as exc:
+        result.update(status='failed', error=f'Failed to process {path.name}: {exc}')
+    finally:
+        if profiler is not None:
+            result['stages'] = [{k: v for k, v in record.items() if k != 'file'}
+                                for record in profiler.records()]
+    return result
+
+
+def _write_school_files(results: List[dict], parts: List[Path], output_dir: Path,
+                        fmt: str = 'csv', zip_path: Optional[Path] = None,
+                        dedupe: bool = False, priority: Optional[List[str]] = None,
+                        fuzzy: bool = False,
+                        previous_dir: Optional[Path] = None) -> Tuple[dict, dict]:
+    """Combine successful part files per school, in input order.
+
+    Each school's parts are streamed through an ``ImportWriter`` (header
+    written once) into ``<school>_Import.<ext>``, or into one member per
+    school of the zip archive at ``zip_path``.  With ``dedupe`` the parts
+    of a school are read back and merged by ``_deduplicate_students``
+    first, preferring the input file names listed in ``priority``; with
+    ``fuzzy`` they are searched for possible duplicates by
+    ``_fuzzy_duplicate_candidates`` (after merging, if both are set).
+    With ``previous_dir`` a school whose last import file is found there
+    (under any export format's name) only gets its new and changed rows
+    (see ``_import_delta``).  Returns the output path per school (the
+    archive path when zipping) and the merge summary, fuzzy candidates
+    and/or delta per school.  Schools are combined and written one after
+    the other, so at most one part file is open at any time.
+    """
+    schools = {}
+    for result, part in zip(results, parts):
+        if result['status'] == 'ok':
+            schools.setdefault(result['school'], []).append((Path(result['file']).name, part))
+    merges = {}
+
+    def school_sources():
+        # One school at a time: only its frames are in memory, and part
+        # files are opened by the writer while they are copied
+        for school, school_parts in schools.items():
+            sources = [part for _, part in school_parts]
+            if dedupe or fuzzy or previous_dir is not None:
+                frames = []
+                for part in sources:
+                    with open(part, 'rb') as f:
+                        frames.append(_read_streamed_import(f))
+                merges[school] = {}
+            if dedupe:
+                merged, conflicts = _deduplicate_students(
+                    frames, [name for name, _ in school_parts], priority)
+                merges[school].update(rows_in=sum(map(len, frames)), rows_out=len(merged),
+                                      conflicts=conflicts)
+                sources = frames = [merged]
+            if fuzzy:
+                combined = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+                merges[school]['candidates'] = _fuzzy_duplicate_candidates(combined)
+            if previous_dir is not None:
+                previous_path = next((previous_dir / _export_file_name(school, f)
+                                      for f in EXPORT_FORMATS
+                                      if (previous_dir / _export_file_name(school, f)).exists()),
+                                     None)
+                previous, err = (_read_previous_import(previous_path) if previous_path
+                                 else (None, 'no previous import'))
+                merges[school].update(delta=None, previous=err)
+                if previous is not None:
+                    combined = (frames[0] if len(frames) == 1
+                                else pd.concat(frames, ignore_index=True))
+                    changes, report, summary = _import_delta(previous, combined)
+                    merges[school].update(delta=summary, changes=report,
+                                          previous=str(previous_path))
+                    sources = [changes]
+            yield school, sources
+
+    if zip_path is not None:
+        with open(zip_path, 'wb') as out:
+            _write_zip_bundle(out, school_sources(), fmt)
+        return {school: str(zip_path) for school in schools}, merges
+    outputs = {}
+    for school, sources in school_sources():
+        outputs[school] = output_dir / _export_file_name(school, fmt)
+        with open(outputs[school], 'wb') as out, ImportWriter(out, fmt) as writer:
+            for source in sources:
+                writer.write(source)
+    return outputs, merges
+
+
+def run_batch(inputs: List[Path], output_dir: Path, section_pattern_option: str = 'auto',
+              workers: Optional[int] = None, engine: str = 'vectorized',
+              stream_csv: bool = False, chunksize: int = CSV_CHUNK_SIZE,
+              profile: bool = False, trace_memory: bool = False,
+              fmt: str = 'csv', zip_path: Optional[Path] = None,
+              dedupe: bool = False, priority: Optional[List[str]] = None,
+              fuzzy: bool = False, section_scope: str = 'file',
+              cache_dir: Optional[Path] = None, cache_bytes: int = DISK_CACHE_BYTES,
+              previous_dir: Optional[Path] = None,
+              plan: List[dict] = NORMALISATION_PLAN) -> dict:
+    """Normalise ``inputs`` on a process pool and write per-school import files.
+
+    Returns a report with one entry per file (in input order), the output
+    files per school and the total wall time.  With ``profile`` each entry
+    carries its per-stage records under ``stages``.  ``fmt`` is a key of
+    ``EXPORT_FORMATS``; with ``zip_path`` all schools go into one archive.
+    With ``dedupe`` duplicate students are merged per school and the
+    report gains a ``dedupe`` entry per school; the merge conflicts are
+    returned as a DataFrame under ``conflicts`` (not JSON serialisable).
+    With ``fuzzy`` the possible duplicates of all schools are returned
+    the same way under ``candidates``, and counted per school under
+    ``fuzzy``.  ``section_scope`` selects a per-file or per-grade section
+    vote (see ``SECTION_SCOPES``).  ``cache_dir`` enables the on-disk
+    cache of cleaned rosters, capped at ``cache_bytes``.  With
+    ``previous_dir`` the report gains a ``delta`` entry per school (its
+    change counts, or the reason no delta was made) and the change
+    reports of all schools under ``changes`` (a DataFrame).  ``plan``
+    replaces the built-in cleaning rules (see ``NORMALISATION_PLAN``).
+    """
+    started = time.perf_counter()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='sjjp_batch_') as tmp:
+        parts = [Path(tmp) / f'part_{i:06d}.csv' for i in range(len(inputs))]
+        # Files are already spread over the pool; only parse the sheets of
+        # a workbook in parallel when running in-process.
+        sheet_workers = None if workers == 1 else 1
+        args = [(path, part, section_pattern_option, engine, stream_csv, chunksize,
+                 profile, trace_memory, sheet_workers, section_scope, cache_dir, cache_bytes,
+                 plan)
+                for path, part in zip(inputs, parts)]
+        if workers == 1:
+            results = [_process_file(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_process_file, *zip(*args))) if args else []
+        outputs, merges = _write_school_files(results, parts, output_dir, fmt, zip_path,
+                                              dedupe=dedupe, priority=priority, fuzzy=fuzzy,
+                                              previous_dir=previous_dir)
+    report = {
+        'files': results,
+        'outputs': {school: str(path) for school, path in outputs.items()},
+        'total_s': time.perf_counter() - started,
+    }
+    if dedupe:
+        report['dedupe'] = {school: {'rows_in': merge['rows_in'], 'rows_out': merge['rows_out'],
+                                     'conflicts': len(merge['conflicts'])}
+                            for school, merge in merges.items()}
+        conflicts = [merge['conflicts'].assign(School=school) for school, merge in merges.items()
+                     if len(merge['conflicts'])]
+        report['conflicts'] = (pd.concat(conflicts, ignore_index=True) if conflicts
+                               else pd.DataFrame(columns=DEDUPE_CONFLICT_COLUMNS + ['School']))
+    if fuzzy:
+        report['fuzzy'] = {school: {'clusters': int(merge['candidates']['Cluster'].nunique()),
+                                    'rows': len(merge['candidates'])}
+                           for school, merge in merges.items()}
+        candidates = [merge['candidates'].assign(School=school)
+                      for school, merge in merges.items() if len(merge['candidates'])]
+        report['candidates'] = (pd.concat(candidates, ignore_index=True) if candidates
+                                else pd.DataFrame(columns=FUZZY_REPORT_COLUMNS + ['School']))
+    if previous_dir is not None:
+        report['delta'] = {school: merge['delta'] or {'error': merge['previous']}
+                           for school, merge in merges.items()}
+        changes = [merge['changes'].assign(School=school) for school, merge in merges.items()
+                   if merge['delta'] is not None and len(merge['changes'])]
+        report['changes'] = (pd.concat(changes, ignore_index=True) if changes
+                             else pd.DataFrame(columns=DELTA_REPORT_COLUMNS + ['School']))
+    return report
+
+
+def _print_report(report: dict, stream=sys.stdout) -> None:
+    """Print a plain-text summary of a batch report."""
+    for entry in report['files']:
+        timing = entry['read_s'] + entry['normalise_s'] + entry['write_s']
+        line = f"{entry['status']:<6} {entry['rows']:>8} rows {timing:8.2f}s  {entry['file']}"
+        if entry.get('cached'):
+            line += "  (cached)"
+        if entry['error']:
+            line += f"  ({entry['error']})"
+        if entry.get('emirates_id'):
+            line += "  [Emirate Id: " + ", ".join(
+                f"{label} {count}" for label, count in entry['emirates_id'].items()) + "]"
+        print(line, file=stream)
+    for school, merge in report.get('dedupe', {}).items():
+        print(f"merged {merge['rows_in'] - merge['rows_out']} duplicate rows of {school} "
+              f"({merge['conflicts']} conflicting fields)", file=stream)
+    for school, found in report.get('fuzzy', {}).items():
+        print(f"{found['clusters']} groups of possible duplicates in {school} "
+              f"({found['rows']} rows)", file=stream)
+    for school, delta in report.get('delta', {}).items():
+        if 'error' in delta:
+            print(f"full import for {school} ({delta['error']})", file=stream)
+        else:
+            print(f"delta import for {school}: {delta['new']} new, {delta['changed']} changed, "
+                  f"{delta['removed']} removed, {delta['unchanged']} unchanged", file=stream)
+    failed = sum(entry['status'] != 'ok' for entry in report['files'])
+    print(f"{len(report['files']) - failed} succeeded, {failed} failed, "
+          f"{len(report['outputs'])} import file(s) in {report['total_s']:.2f}s", file=stream)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Normalise SJJP student lists in batch and write per-school import CSVs.')
+    parser.add_argument('inputs', nargs='+', help='files, directories or glob patterns')
+    parser.add_argument('-o', '--output-dir', default='.', type=Path,
+                        help="directory for the <school>_Import files (default: .)")
+    parser.add_argument('-s', '--section-pattern', default='auto',
+                        choices=['auto', 'letters', 'numbers'])
+    parser.add_argument('--section-scope', default='file', choices=SECTION_SCOPES,
+                        help="with -s auto, vote once per file or once per grade (default: file)")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help='worker processes (default: CPU count; 1 runs in-process)')
+    parser.add_argument('--engine', default='vectorized', choices=sorted(NORMALISATION_ENGINES))
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help='descend into sub-directories and allow ** in patterns')
+    parser.add_argument('--stream-csv', action='store_true',
+                        help='process CSV files in chunks with bounded memory')
+    parser.add_argument('--chunksize', type=int, default=CSV_CHUNK_SIZE)
+    parser.add_argument('--profile', action='store_true',
+                        help='record per-stage timings of every file in the report')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='with --profile, also trace memory per stage (slower)')
+    parser.add_argument('-f', '--format', default='csv', choices=_available_export_formats(),
+                        help='format of the per-school import files (default: csv)')
+    parser.add_argument('--zip', type=Path, metavar='PATH',
+                        help='write all import files into this zip archive instead')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='merge duplicate students (same Student No or valid Emirate Id) per school')
+    parser.add_argument('--prefer', action='append', default=[], metavar='FILE',
+                        help='with --dedupe, prefer values from this input file name '
+                             '(repeat, most preferred first)')
+    parser.add_argument('--conflicts', type=Path, metavar='PATH',
+                        help='with --dedupe, write the merge conflicts as CSV here')
+    parser.add_argument('--fuzzy', type=Path, metavar='PATH',
+                        help='look for possible duplicates by similar names and write them '
+                             'as CSV here')
+    parser.add_argument('--previous', type=Path, metavar='DIR',
+                        help='directory with the previous <school>_Import files; only new and '
+                             'changed students are exported for the schools found there')
+    parser.add_argument('--changes', type=Path, metavar='PATH',
+                        help='with --previous, write the new/changed/removed students as CSV here')
+    parser.add_argument('--cache-dir', type=Path, nargs='?', const=Path(DISK_CACHE_DIR),
+                        metavar='DIR',
+                        help='reuse cleaned rosters from an on-disk cache (default DIR: '
+                             f'{DISK_CACHE_DIR}); unchanged files skip reading and cleaning')
+    parser.add_argument('--cache-size', type=int, default=DISK_CACHE_BYTES // (1024 * 1024),
+                        metavar='MB', help='size cap of the on-disk cache (default: %(default)s)')
+    parser.add_argument('--rules', type=Path, metavar='PATH',
+                        help='JSON rule plan replacing the built-in cleaning rules '
+                             '(same structure as NORMALISATION_PLAN)')
+    parser.add_argument('--report', type=Path, help='also write the report as JSON here')
+    args = parser.parse_args(argv)
+
+    plan = NORMALISATION_PLAN
+    if args.rules:
+        try:
+            plan = _load_rule_plan(args.rules)
+            _compile_rule_plan(plan, (), NORMALISATION_ENGINES[args.engine])
+        except (OSError, ValueError) as exc:
+            parser.error(f'--rules: {exc}')
+
+    inputs = _collect_inputs(args.inputs, recursive=args.recursive)
+    if not inputs:
+        parser.error('no input files found')
+    report = run_batch(inputs, args.output_dir, args.section_pattern, workers=args.workers,
+                       engine=args.engine, stream_csv=args.stream_csv, chunksize=args.chunksize,
+                       profile=args.profile or args.trace_memory,
+                       trace_memory=args.trace_memory, fmt=args.format, zip_path=args.zip,
+                       dedupe=args.dedupe, priority=args.prefer, fuzzy=args.fuzzy is not None,
+                       section_scope=args.section_scope, cache_dir=args.cache_dir,
+                       cache_bytes=args.cache_size * 1024 * 1024, previous_dir=args.previous,
+                       plan=plan)
+    _print_report(report)
+    conflicts = report.pop('conflicts', None)
+    if args.conflicts and conflicts is not None:
+        conflicts.to_csv(args.conflicts, index=False, encoding='utf-8')
+    changes = report.pop('changes', None)
+    if args.changes and changes is not None:
+        changes.to_csv(args.changes, index=False, encoding='utf-8')
+    candidates = report.pop('candidates', None)
+    if candidates is not None:
+        candidates.to_csv(args.fuzzy, index=False, encoding='utf-8')
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    return 1 if any(entry['status'] != 'ok' for entry in report['files']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,421 @@
+"""
+SJJP Student List Normalizer – benchmarks
+=========================================
+
+Regression benchmarks for ``sjjp_student_normalizer_app.py``.  A
+synthetic generator produces realistic, messy rosters (honourifics,
+mixed-case and Arabic names, mixed date formats and Excel serials,
+UAE/international and multi-number phones, ``G5``/``Grade 5`` grades,
+mixed letter/number sections, varied column headers) which are rendered
+as CSV, XLSX and DOCX.  The suite then times:
+
+* every column cleaner of the selected engines (the ``_clean_*``
+  helpers as wired in ``NORMALISATION_ENGINES``),
+* ``_read_uploaded_file`` per format, ``_docx_to_dataframe`` and its
+  streaming counterpart, and plain ``pd.read_excel`` as the baseline
+  of the XLSX reader,
+* ``_normalise_dataframe`` and ``_to_import_format``.
+
+For each case the best wall time of ``--repeat`` runs, the throughput
+in rows per second and the peak memory traced by ``tracemalloc`` during
+a separate run are reported.  Results can be saved as JSON and compared
+with a previous run, e.g. one taken on another version of the app.
+
+Usage
+-----
+::
+
+    python sjjp_benchmark.py                            # 1k, 100k and 1M rows
+    python sjjp_benchmark.py --sizes 1000 100000 --json after.json
+    python sjjp_benchmark.py --sizes 100000 --compare before.json
+
+XLSX and DOCX inputs are only built up to ``--binary-max-rows`` rows
+(100k by default): a million-row workbook takes minutes to write with
+openpyxl and the matching ``document.xml`` is around a gigabyte.
+"""
+
+import argparse
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+import zipfile
+from typing import Callable, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+import sjjp_student_normalizer_app as app
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+# Largest roster rendered as XLSX or DOCX (see the module docstring).
+BINARY_MAX_ROWS = 100_000
+
+###############################################################################
+# Synthetic roster generator
+###############################################################################
+
+_FIRST_NAMES = [
+    'ahmed', 'mohammed', 'fatima', 'mariam', 'omar', 'aisha', 'khalid', 'noura',
+    'sara', 'yousef', 'hessa', 'rashid', 'priya', 'john', "o'neil", 'anne-marie',
+]
+_LAST_NAMES = [
+    'al ali', 'al mansoori', 'al shamsi', 'al ketbi', 'khan', 'haddad', 'smith',
+    'kumar', 'el-sayed', 'al nuaimi', 'al zaabi', 'fernandes',
+]
+_ARABIC_FIRST = ['أحمد', 'محمد', 'فاطمة', 'مريم', 'عمر', 'عائشة', 'خالد', 'نورة']
+_ARABIC_LAST = ['العلي', 'المنصوري', 'الشامسي', 'الكتبي', 'النعيمي', 'الزعابي']
+_HONOURIFICS = ['', '', '', '', 'Mr. ', 'mrs ', 'Dr. ', 'Sheikh ', 'sheikha ', 'Ms. ']
+_GENDERS = ['M', 'F', 'male', 'Female', ' f ', 'MALE', '']
+_DATE_FORMATS = ['%d/%m/%Y', '%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d.%m.%Y',
+                 '%d %b %Y', '%Y-%m-%d %H:%M:%S', 'excel']
+_GRADES = ['G5', 'Grade 5', '5', 'g-7', 'G 12', '11', 'grade 1', 'KG2', '', '13']
+_SECTIONS = ['A', 'b', 'C', '1', '2', ' 3 ', 'ADV', 'adv', 'D', '']
+_NATIONALITIES = ['UAE', 'Emirati', 'united arab emirates', 'India', 'Egypt', 'Pakistan',
+                  'Jordan', 'Philippines', 'إماراتي', '']
+
+# Column headers are drawn from SYNONYMS so that renaming is exercised too.
+_HEADERS = {
+    'Student No': 'Student ID',
+    'Student Name': 'Full Name',
+    'Student Name (Arabic)': 'Arabic Name',
+    'Gender': 'Sex',
+    'Date Of Birth': 'DOB',
+    'Grade': 'Class',
+    'Section': 'Homeroom',
+    'Nationality': 'Nationality',
+    'Emirate Id': 'EID',
+    'Parent Phone': 'Parent Mobile',
+    'Student Phone': 'Student Mobile',
+    'Student Email': 'Student Email',
+    'Parent Email': 'Parent E-mail',
+}
+
+
+def _pick(rng: np.random.Generator, options: List[str], n: int) -> pd.Series:
+    return pd.Series(rng.choice(np.array(options, dtype=object), n), dtype=object)
+
+
+def _digits(rng: np.random.Generator, n: int, width: int) -> pd.Series:
+    values = rng.integers(0, 10 ** width, n)
+    return pd.Series(values.astype(str), dtype=object).str.zfill(width)
+
+
+def _phones(rng: np.random.Generator, n: int) -> pd.Series:
+    """UAE mobiles and landlines in local and international forms, plus foreign numbers."""
+    sub = _digits(rng, n, 7)
+    prefix = _pick(rng, ['50', '52', '54', '55', '56', '58'], n)
+    styles = [
+        '0' + prefix + sub,
+        '0' + prefix + ' ' + sub.str[:3] + ' ' + sub.str[3:],
+        '+971 ' + prefix + ' ' + sub,
+        '00971' + prefix + sub,
+        prefix + sub,
+        '02' + sub,
+        '04 ' + sub,
+        '+44 20 7946 ' + sub.str[:4],
+        '0' + prefix + sub + ' / 0' + prefix.str[::-1].str.replace('0', '5') + sub.str[::-1],
+        pd.Series('', index=sub.index, dtype=object),
+    ]
+    choice = rng.integers(0, len(styles), n)
+    return pd.Series(np.choose(choice, [s.to_numpy() for s in styles]), dtype=object)
+
+
+def make_roster(n: int, seed: int = 0) -> pd.DataFrame:
+    """Return a synthetic raw roster of ``n`` rows with messy string values."""
+    rng = np.random.default_rng(seed)
+    first = _pick(rng, _FIRST_NAMES, n)
+    last = _pick(rng, _LAST_NAMES, n)
+    name = _pick(rng, _HONOURIFICS, n) + first + _pick(rng, [' ', '  ', ' '], n) + last
+    case = rng.integers(0, 4, n)
+    name = name.where(case != 1, name.str.upper()).where(case != 2, name.str.title())
+    arabic = _pick(rng, _ARABIC_FIRST, n) + ' ' + _pick(rng, _ARABIC_LAST, n)
+    # a few rosters put the Arabic name in the English column
+    name = name.mask(rng.random(n) < 0.02, arabic)
+
+    days = rng.integers(12_800, 18_000, n)  # 2005 to 2019
+    dates = pd.Series(pd.to_datetime(days, unit='D'))
+    fmt = rng.integers(0, len(_DATE_FORMATS), n)
+    dob = pd.Series('', index=dates.index, dtype=object)
+    for i, code in enumerate(_DATE_FORMATS):
+        rows = fmt == i
+        if code == 'excel':
+            dob[rows] = (days[rows] + 25_569).astype(str)
+        else:
+            dob[rows] = dates[rows].dt.strftime(code).to_numpy()
+    dob = dob.mask(rng.random(n) < 0.03, '')
+
+    year = dates.dt.year.astype(str).to_numpy()
+    eid = '784-' + pd.Series(year, dtype=object) + '-' + _digits(rng, n, 7) + '-' + _digits(rng, n, 1)
+    eid = eid.where(rng.random(n) < 0.8, eid.str.replace('-', '', regex=False))
+
+    handle = first.str.replace(r"[^a-z]", '', regex=True) + _digits(rng, n, 4)
+    domain = _pick(rng, ['@ese.gov.ae', '@gmail.com', '@school.ae', ''], n)
+    student_email = (handle + domain).where(domain != '', '')
+    parent_email = ('parent.' + handle + '@' + _pick(rng, ['gmail.com', 'hotmail.com'], n))
+    parent_email = parent_email.mask(rng.random(n) < 0.3, '')
+
+    roster = pd.DataFrame({
+        'Student No': pd.Series(np.arange(1, n + 1).astype(str), dtype=object),
+        'Student Name': name,
+        'Student Name (Arabic)': arabic,
+        'Gender': _pick(rng, _GENDERS, n),
+        'Date Of Birth': dob,
+        'Grade': _pick(rng, _GRADES, n),
+        'Section': _pick(rng, _SECTIONS, n),
+        'Nationality': _pick(rng, _NATIONALITIES, n),
+        'Emirate Id': eid,
+        'Parent Phone': _phones(rng, n),
+        'Student Phone': _phones(rng, n).mask(rng.random(n) < 0.6, ''),
+        'Student Email': student_email,
+        'Parent Email': parent_email,
+    })
+    return roster.rename(columns=_HEADERS)
+
+
+def roster_to_csv(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode('utf-8')
+
+
+def roster_to_xlsx(df: pd.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, engine='openpyxl')
+    return buffer.getvalue()
+
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+    'relationships/officeDocument" Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def roster_to_docx(df: pd.DataFrame) -> bytes:
+    """Render ``df`` as a minimal Word document holding one table.
+
+    A heading paragraph precedes the table, as in the rosters schools
+    send, so the extractors have non-table content to skip.
+    """
+    def row_xml(cells) -> str:
+        return '<w:tr>' + ''.join(
+            f'<w:tc><w:p><w:r><w:t xml:space="preserve">{escape(str(c))}</w:t></w:r></w:p></w:tc>'
+            for c in cells
+        ) + '</w:tr>'
+
+    body = io.StringIO()
+    body.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               f'<w:document xmlns:w="{app._W_NS["w"]}"><w:body>'
+               '<w:p><w:r><w:t>Student list</w:t></w:r></w:p><w:tbl>')
+    body.write(row_xml(df.columns))
+    for values in df.itertuples(index=False, name=None):
+        body.write(row_xml(values))
+    body.write('</w:tbl><w:sectPr/></w:body></w:document>')
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('[Content_Types].xml', _DOCX_CONTENT_TYPES)
+        z.writestr('_rels/.rels', _DOCX_RELS)
+        z.writestr('word/document.xml', body.getvalue())
+    return buffer.getvalue()
+
+
+###############################################################################
+# Measurement
+###############################################################################
+
+# Engine entry -> (input column, whether the input is the cleaned column).
+_FIELD_INPUTS = {
+    'name': ('Student Name', False),
+    'gender': ('Gender', False),
+    'date': ('Date Of Birth', False),
+    'grade': ('Grade', False),
+    'section': ('Section', False),
+    'nationality': ('Nationality', False),
+    'phone': ('Parent Phone', False),
+    'phone_list': ('Parent Phone', False),
+    'emirates_id': ('Emirate Id', False),
+    'citizenship': ('Nationality', True),
+    'cycle': ('Grade', True),
+    'emirates_id_status': ('Emirate Id', True),
+    'detect_section': ('Section', True),
+    'convert_section': ('Section', True),
+}
+
+
+def _field_args(field: str, values: pd.Series, cleaned: Optional[pd.DataFrame]) -> tuple:
+    """Arguments of the engine entry ``field`` given its input column."""
+    if field == 'convert_section':
+        return values, 'letters'
+    if field == 'emirates_id_status':
+        return values, cleaned['Date Of Birth']
+    return (values,)
+
+
+def _measure(func: Callable[[], object], repeat: int,
+             memory: bool) -> Tuple[float, Optional[int]]:
+    """Best wall time of ``repeat`` runs and, optionally, traced peak bytes."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+
+def _cases(rows: int, seed: int, engines: List[str], binary_max_rows: int,
+           select: Optional[str] = None) -> List[Tuple[str, Callable[[], object]]]:
+    """Build the named benchmark callables for one roster size.
+
+    Only cases whose name contains ``select`` are returned, and inputs no
+    selected case needs (such as the XLSX and DOCX renderings) are not built.
+    """
+    def wanted(*names: str) -> bool:
+        return not select or any(select in name for name in names)
+
+    raw = make_roster(rows, seed)
+    standard = app._standardise_column_names(raw.copy())
+    cases = []
+    for engine in engines:
+        cleaners = app.NORMALISATION_ENGINES[engine]
+        cleaned = None
+        for field, (column, use_cleaned) in _FIELD_INPUTS.items():
+            if not wanted(f'{engine}:{field}'):
+                continue
+            if use_cleaned and cleaned is None:
+                cleaned = app._clean_dataframe(raw, engine=engine)
+            values = (cleaned if use_cleaned else standard)[column]
+            func = lambda c=cleaners[field], a=_field_args(field, values, cleaned): c(*a)
+            cases.append((f'{engine}:{field}', func))
+        cases.append((f'{engine}:_normalise_dataframe',
+                       lambda e=engine: app._normalise_dataframe(raw, 'auto', engine=e)))
+    if wanted('_to_import_format'):
+        normalised = app._normalise_dataframe(raw, 'auto')
+        cases.append(('_to_import_format', lambda: app._to_import_format(normalised)))
+
+    files = {'csv': roster_to_csv(raw)}
+    if rows <= binary_max_rows:
+        if wanted('read:xlsx', 'pd.read_excel'):
+            files['xlsx'] = roster_to_xlsx(raw)
+        if wanted('read:docx', '_docx_to_dataframe', '_docx_to_dataframe_streaming'):
+            files['docx'] = roster_to_docx(raw)
+    for ext, data in files.items():
+        cases.append((f'read:{ext}',
+                      lambda d=data, e=ext: app._read_uploaded_file(
+                          app._NamedBytes(d, f'roster.{e}'))))
+    if 'xlsx' in files:
+        # the pre-streaming reader, as a baseline for read:xlsx
+        cases.append(('pd.read_excel', lambda: pd.read_excel(
+            io.BytesIO(files['xlsx']), dtype=str, engine='openpyxl')))
+    if 'docx' in files:
+        cases.append(('_docx_to_dataframe', lambda: app._docx_to_dataframe(files['docx'])))
+        cases.append(('_docx_to_dataframe_streaming',
+                      lambda: app._docx_to_dataframe_streaming(files['docx'])))
+    return [(case, func) for case, func in cases if wanted(case)]
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, engines=('vectorized',), repeat: int = 3,
+                   memory: bool = True, seed: int = 0, binary_max_rows: int = BINARY_MAX_ROWS,
+                   select: Optional[str] = None, log=None) -> List[dict]:
+    """Run every case at every size and return one result dict per case.
+
+    ``select`` keeps only cases whose name contains it; ``log`` receives
+    each result as soon as it is measured.
+    """
+    results = []
+    for rows in sizes:
+        for case, func in _cases(rows, seed, list(engines), binary_max_rows, select):
+            seconds, peak = _measure(func, repeat, memory)
+            result = {
+                'case': case,
+                'rows': rows,
+                'seconds': seconds,
+                'rows_per_s': rows / seconds if seconds else float('inf'),
+                'peak_mb': peak / 2 ** 20 if peak is not None else None,
+            }
+            results.append(result)
+            if log:
+                log(result)
+    return results
+
+
+def _format_result(result: dict, baseline: Optional[Dict[Tuple[str, int], dict]] = None) -> str:
+    peak = f"{result['peak_mb']:9.1f}" if result['peak_mb'] is not None else f"{'-':>9}"
+    line = (f"{result['case']:<34} {result['rows']:>9} {result['seconds']:10.4f} "
+            f"{result['rows_per_s']:14,.0f} {peak}")
+    if baseline is not None:
+        before = baseline.get((result['case'], result['rows']))
+        line += f"  x{before['seconds'] / result['seconds']:.2f}" if before else '  (new)'
+    return line
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the SJJP normaliser.')
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES),
+                        help='roster sizes in rows (default: 1000 100000 1000000)')
+    parser.add_argument('--engines', nargs='+', default=['vectorized'],
+                        choices=sorted(app.NORMALISATION_ENGINES),
+                        help="engines whose cleaners are timed ('scalar' is slow at 1M rows)")
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case (best kept)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    parser.add_argument('--binary-max-rows', type=int, default=BINARY_MAX_ROWS,
+                        help='largest roster rendered as XLSX and DOCX')
+    parser.add_argument('--select', help='only run cases whose name contains this text')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', default='', help='free-form label stored in the JSON output')
+    parser.add_argument('--json', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run to report speedups against')
+    args = parser.parse_args(argv)
+    # the scalar date helper warns for every value pandas has to guess
+    warnings.simplefilter('ignore', UserWarning)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fh:
+            baseline = {(r['case'], r['rows']): r for r in json.load(fh)['results']}
+
+    header = f"{'case':<34} {'rows':>9} {'seconds':>10} {'rows/s':>14} {'peak MB':>9}"
+    print(header + ('  speedup' if baseline is not None else ''))
+    results = run_benchmarks(
+        args.sizes, args.engines, repeat=args.repeat, memory=not args.no_memory,
+        seed=args.seed, binary_max_rows=args.binary_max_rows, select=args.select,
+        log=lambda r: print(_format_result(r, baseline), flush=True),
+    )
+    if args.json:
+        report = {
+            'label': args.label,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'results': results,
+        }
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,560 @@
+"""
+SJJP Student List Normalizer – local HTTP service
+=================================================
+
+Small HTTP front end for the pipeline of ``sjjp_student_normalizer_app.py``
+so that SIS integration scripts can normalise rosters without the
+Streamlit UI.  Uploads are queued as jobs and processed on a pool of
+worker processes by the batch normaliser's ``_process_file`` (read →
+``_clean_dataframe`` / ``_apply_section_pattern``, i.e.
+``_normalise_dataframe`` → ``_to_import_format``); clients poll a job
+for its status and download the import file once it is done.  Only the
+standard library is used on top of the app's own dependencies, and the
+server listens on ``127.0.0.1`` by default.
+
+Usage
+-----
+::
+
+    python sjjp_normalizer_service.py --port 8765 -j 4
+
+    curl --data-binary @"Al Noor.xlsx" \\
+         "http://127.0.0.1:8765/jobs?filename=Al%20Noor.xlsx&section_pattern=auto"
+    curl http://127.0.0.1:8765/jobs/<id>
+    curl -OJ http://127.0.0.1:8765/jobs/<id>/result
+
+Endpoints
+---------
+``POST /jobs``
+    The request body is the roster file itself; the query string gives
+    ``filename`` (required, its extension picks the reader; the
+    ``X-Filename`` header works too), ``school`` (default: the file name
+    without extension), ``section_pattern``, ``section_scope`` and
+    ``format`` (as in the batch CLI).  Answers ``202`` with the job.
+    Bodies over ``--max-upload-mb`` are refused with ``413`` and a full
+    queue with ``503``.
+``GET /jobs`` and ``GET /jobs/<id>``
+    All jobs, or one job: ``status`` is ``queued``, ``running``,
+    ``done``, ``failed`` or ``cancelled``, with row count, timings,
+    Emirate Id issue counts and the error of failed jobs.
+``GET /jobs/<id>/result``
+    The ``<school>_Import`` file of a finished job (``409`` before).
+``DELETE /jobs/<id>``
+    Cancels a queued job or discards a finished one and its files.
+``GET /health``
+    Queue length, running jobs and pool size.
+
+Finished jobs are forgotten (and their files deleted) ``--keep-minutes``
+after they finish.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from sjjp_batch_normalizer import INPUT_EXTENSIONS, _process_file
+from sjjp_student_normalizer_app import (
+    CSV_CHUNK_SIZE,
+    DISK_CACHE_BYTES,
+    DISK_CACHE_DIR,
+    EXPORT_FORMATS,
+    NORMALISATION_ENGINES,
+    SECTION_SCOPES,
+    ImportWriter,
+    _available_export_formats,
+    _export_file_name,
+)
+
+# Default size cap of one upload.
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+# Default number of jobs waiting for a worker before uploads are refused.
+JOB_QUEUE_SIZE = 32
+# Default time finished jobs and their files are kept.
+JOB_KEEP_SECONDS = 60 * 60
+# Block size for streaming uploads to disk and results to clients.
+TRANSFER_BLOCK_BYTES = 1024 * 1024
+
+SECTION_PATTERNS = ('auto', 'letters', 'numbers')
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+class NormalisationService:
+    """Job table, bounded job queue and worker pool behind the HTTP handler.
+
+    ``workers`` dispatcher threads take jobs off a queue of at most
+    ``queue_size`` entries and run each one on a process pool of the same
+    size, so at most ``workers`` rosters are normalised at once and at
+    most ``queue_size`` uploads wait on disk.  Every job lives in its own
+    directory under ``jobs_dir`` holding the upload and the result.
+    All methods are safe to call from the server's request threads.
+    """
+
+    def __init__(self, jobs_dir: Path, workers: int = 2, queue_size: int = JOB_QUEUE_SIZE,
+                 keep_seconds: float = JOB_KEEP_SECONDS, engine: str = 'vectorized',
+                 stream_csv: bool = False, chunksize: int = CSV_CHUNK_SIZE,
+                 cache_dir: Optional[Path] = None,
+                 cache_bytes: int = DISK_CACHE_BYTES) -> None:
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self.keep_seconds = keep_seconds
+        self.engine = engine
+        self.stream_csv = stream_csv
+        self.chunksize = chunksize
+        self.cache_dir = cache_dir
+        self.cache_bytes = cache_bytes
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._closing = False
+        self.queue_size = queue_size
+        # Room for one stop sentinel per dispatcher on top of the jobs
+        self._queue: 'queue.Queue[Optional[str]]' = queue.Queue(maxsize=queue_size + workers)
+        # forkserver: forking this multi-threaded server process is unsafe
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('forkserver'))
+        self._threads = [threading.Thread(target=self._dispatch, name=f'sjjp-job-{i}',
+                                          daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, upload: Path, filename: str, school: str, section_pattern: str,
+               section_scope: str, fmt: str) -> Optional[dict]:
+        """Queue the roster at ``upload`` (moved into the job directory).
+
+        Returns the new job, or ``None`` when the queue is full or the
+        service is closing (the upload is then deleted).
+        """
+        self.purge()
+        job_id = uuid.uuid4().hex
+        job_dir = self.jobs_dir / job_id
+        # The upload keeps its name (and extension) in a folder of its own
+        (job_dir / 'upload').mkdir(parents=True)
+        path = job_dir / 'upload' / filename
+        os.replace(upload, path)
+        job = {
+            'id': job_id, 'file': filename, 'school': school, 'status': 'queued',
+            'section_pattern': section_pattern, 'section_scope': section_scope, 'format': fmt,
+            'submitted': _now(), 'started': None, 'finished': None,
+            'rows': 0, 'seconds': None, 'emirates_id': {}, 'error': '',
+            '_dir': job_dir, '_path': path, '_finished_at': None,
+        }
+        with self._lock:  # so that close() cannot drain the queue in between
+            if not self._closing and self._queue.qsize() < self.queue_size:
+                self._queue.put_nowait(job_id)
+                self._jobs[job_id] = job
+                return self._public(job)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return None
+
+    def status(self, job_id: Optional[str] = None):
+        """One job by id (``None`` if unknown), or all jobs in submission order."""
+        self.purge()
+        with self._lock:
+            if job_id is None:
+                return [self._public(job) for job in self._jobs.values()]
+            job = self._jobs.get(job_id)
+            return self._public(job) if job is not None else None
+
+    def result(self, job_id: str) -> Tuple[Optional[dict], Optional[Path]]:
+        """``(job, result path)``; the path is ``None`` until the job is done."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None, None
+            path = job.get('_result') if job['status'] == 'done' else None
+            return self._public(job), path
+
+    def delete(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued job or discard a finished one.
+
+        Running jobs are left alone; the returned job tells which applied
+        (``None`` for unknown ids).
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] == 'queued':
+                job['status'] = 'cancelled'  # the dispatcher drops it and its files
+            if job['_finished_at'] is None:  # cancelled above, or running
+                return self._public(job)
+            del self._jobs[job_id]
+            public = self._public(job)
+        shutil.rmtree(job['_dir'], ignore_errors=True)
+        return public
+
+    def health(self) -> dict:
+        with self._lock:
+            running = sum(job['status'] == 'running' for job in self._jobs.values())
+            jobs = len(self._jobs)
+        return {'queued': self._queue.qsize(), 'running': running, 'workers': self.workers,
+                'jobs': jobs}
+
+    def purge(self) -> None:
+        """Forget finished jobs older than ``keep_seconds`` and delete their files."""
+        cutoff = time.monotonic() - self.keep_seconds
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job['_finished_at'] is not None and job['_finished_at'] < cutoff]
+            for job in expired:
+                del self._jobs[job['id']]
+        for job in expired:
+            shutil.rmtree(job['_dir'], ignore_errors=True)
+
+    def close(self) -> None:
+        """Stop taking jobs, cancel the queued ones and wait for running ones."""
+        # Empty the queue first: the dispatchers must not start the jobs
+        # still waiting, and a full queue would block the sentinels.
+        with self._lock:
+            self._closing = True
+        while True:
+            try:
+                job_id = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job_id is None:
+                continue
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                # queued, or cancelled by delete() while waiting
+                job.update(status='cancelled', finished=_now(),
+                           _finished_at=time.monotonic())
+            shutil.rmtree(job['_dir'], ignore_errors=True)
+        for _ in self._threads:
+            self._queue.put_nowait(None)
+        for thread in self._threads:
+            thread.join()
+        self._pool.shutdown(cancel_futures=True)
+
+    def _dispatch(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job['status'] != 'queued':
+                    if job is not None:  # cancelled while waiting
+                        job['_finished_at'] = time.monotonic()
+                        shutil.rmtree(job['_dir'], ignore_errors=True)
+                    continue
+                job.update(status='running', started=_now())
+            self._run(job)
+
+    def _run(self, job: dict) -> None:
+        path = job['_path']
+        part = job['_dir'] / 'import.part.csv'
+        started = time.perf_counter()
+        try:
+            result = self._pool.submit(
+                _process_file, path, part, job['section_pattern'], self.engine,
+                self.stream_csv, self.chunksize, False, False, 1, job['section_scope'],
+                self.cache_dir, self.cache_bytes,
+            ).result()
+            update = {'status': 'done' if result['status'] == 'ok' else 'failed',
+                      'rows': result['rows'], 'emirates_id': result.get('emirates_id', {}),
+                      'error': result['error']}
+            if result['status'] == 'ok':
+                output = job['_dir'] / _export_file_name(job['school'], job['format'])
+                if job['format'] == 'csv':
+                    os.replace(part, output)
+                else:
+                    with open(part, 'rb') as source, open(output, 'wb') as out, \
+                            ImportWriter(out, job['format']) as writer:
+                        writer.write(source)
+                    part.unlink()
+                update['_result'] = output
+        except Exception as exc:  # e.g. a worker process that died
+            update = {'status': 'failed', 'error': f'Failed to process {path.name}: {exc}'}
+        update.update(finished=_now(), seconds=round(time.perf_counter() - started, 3),
+                      _finished_at=time.monotonic())
+        with self._lock:
+            job.update(update)
+
+    @staticmethod
+    def _public(job: dict) -> dict:
+        """The job without internal fields, plus the URL of its result when done."""
+        public = {k: v for k, v in job.items() if not k.startswith('_')}
+        public['url'] = f"/jobs/{job['id']}"
+        if job['status'] == 'done':
+            public['result_url'] = f"/jobs/{job['id']}/result"
+        return public
+
+
+def _content_disposition(filename: str) -> str:
+    """``attachment`` header value for ``filename``, which may be non-ASCII.
+
+    Headers are sent as latin-1, so the name goes in ``filename*`` as
+    RFC 5987 UTF-8, with ``filename`` as an ASCII fallback for older
+    clients (``"`` and ``\\`` are already replaced in school names).
+    """
+    fallback = re.sub(r'[^\x20-\x7e]', '_', filename)
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename, safe="")}'
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP endpoints of a ``NormalisationService`` (see the module docstring)."""
+
+    server_version = 'SJJPNormalizer/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self) -> NormalisationService:
+        return self.server.service
+
+    def _send_json(self, status: HTTPStatus, payload, headers: Optional[dict] = None) -> None:
+        body = json.dumps(payload, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: HTTPStatus, message: str,
+                    headers: Optional[dict] = None) -> None:
+        self._send_json(status, {'error': message}, headers)
+
+    def _route(self) -> Tuple[list, dict]:
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return parts, query
+
+    def do_GET(self) -> None:
+        parts, _ = self._route()
+        if parts == ['health']:
+            self._send_json(HTTPStatus.OK, self.service.health())
+        elif parts == ['jobs']:
+            self._send_json(HTTPStatus.OK, self.service.status())
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self.service.status(parts[1])
+            if job is None:
+                self._send_error(HTTPStatus.NOT_FOUND, f'Unknown job: {parts[1]}')
+            else:
+                self._send_json(HTTPStatus.OK, job)
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result':
+            self._send_result(parts[1])
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f'No such endpoint: {self.path}')
+
+    def _send_result(self, job_id: str) -> None:
+        job, path = self.service.result(job_id)
+        if job is None:
+            self._send_error(HTTPStatus.NOT_FOUND, f'Unknown job: {job_id}')
+            return
+        if path is None:
+            self._send_error(HTTPStatus.CONFLICT, f"Job {job_id} is {job['status']}")
+            return
+        try:
+            source = open(path, 'rb')
+        except OSError:  # discarded meanwhile
+            self._send_error(HTTPStatus.NOT_FOUND, f'Result of job {job_id} is gone')
+            return
+        with source:
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-Type', EXPORT_FORMATS[job['format']][1])
+            self.send_header('Content-Length', str(os.fstat(source.fileno()).st_size))
+            self.send_header('Content-Disposition', _content_disposition(path.name))
+            self.end_headers()
+            shutil.copyfileobj(source, self.wfile, TRANSFER_BLOCK_BYTES)
+
+    def _check_upload(self) -> Tuple[Optional[tuple], str, dict]:
+        """Validate an upload from its request line and headers alone.
+
+        Returns ``(error, filename, options)`` where ``error`` is ``None``
+        or the ``(status, message)`` to refuse the upload with.
+        """
+        parts, query = self._route()
+        filename = os.path.basename(query.get('filename') or self.headers.get('X-Filename', ''))
+        filename = re.sub(r'[\x00-\x1f"\\]', '_', filename)
+        options = {
+            'section_pattern': query.get('section_pattern', 'auto'),
+            'section_scope': query.get('section_scope', 'file'),
+            'fmt': query.get('format', 'csv'),
+        }
+        if parts != ['jobs']:
+            return (HTTPStatus.NOT_FOUND, f'No such endpoint: {self.path}'), filename, options
+        if Path(filename).suffix.lower() not in INPUT_EXTENSIONS:
+            return ((HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+                     'filename with one of these extensions is required: '
+                     + ', '.join(INPUT_EXTENSIONS)), filename, options)
+        for name, value, allowed in (
+                ('section_pattern', options['section_pattern'], SECTION_PATTERNS),
+                ('section_scope', options['section_scope'], SECTION_SCOPES),
+                ('format', options['fmt'], _available_export_formats())):
+            if value not in allowed:
+                return ((HTTPStatus.BAD_REQUEST,
+                         f'{name} must be one of {", ".join(allowed)}, not {value!r}'),
+                        filename, options)
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            return (HTTPStatus.LENGTH_REQUIRED, 'Content-Length is required'), filename, options
+        if int(length) > self.server.max_upload_bytes:
+            return ((HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                     f'Uploads are limited to {self.server.max_upload_bytes} bytes'),
+                    filename, options)
+        return None, filename, options
+
+    def handle_expect_100(self) -> bool:
+        # Clients sending "Expect: 100-continue" learn about a refused
+        # upload before sending the body.
+        error, _, _ = self._check_upload()
+        if error is not None:
+            self.close_connection = True
+            self._send_error(*error)
+            return False
+        return super().handle_expect_100()
+
+    def do_POST(self) -> None:
+        error, filename, options = self._check_upload()
+        if error is not None:
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self._send_error(*error)
+            return
+        upload = self._receive(int(self.headers['Content-Length']))
+        if upload is None:
+            self.close_connection = True
+            self._send_error(HTTPStatus.BAD_REQUEST, 'Upload ended before Content-Length')
+            return
+        _, query = self._route()
+        school = query.get('school') or re.sub(r'\.[^.]+$', '', filename)
+        # The school names the result file and its Content-Disposition
+        school = re.sub(r'[\x00-\x1f"/\\]', '_', school)
+        job = self.service.submit(upload, filename, school, **options)
+        if job is None:
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, 'The job queue is full',
+                             {'Retry-After': '30'})
+            return
+        self._send_json(HTTPStatus.ACCEPTED, job, {'Location': job['url']})
+
+    def _receive(self, length: int) -> Optional[Path]:
+        """Stream the request body to a temporary file; ``None`` if it was cut short."""
+        fd, tmp = tempfile.mkstemp(dir=self.service.jobs_dir, suffix='.upload')
+        with os.fdopen(fd, 'wb') as out:
+            remaining = length
+            while remaining:
+                block = self.rfile.read(min(remaining, TRANSFER_BLOCK_BYTES))
+                if not block:
+                    break
+                out.write(block)
+                remaining -= len(block)
+        if remaining:
+            os.remove(tmp)
+            return None
+        return Path(tmp)
+
+    def do_DELETE(self) -> None:
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != 'jobs':
+            self._send_error(HTTPStatus.NOT_FOUND, f'No such endpoint: {self.path}')
+            return
+        job = self.service.delete(parts[1])
+        if job is None:
+            self._send_error(HTTPStatus.NOT_FOUND, f'Unknown job: {parts[1]}')
+        elif job['status'] == 'running':
+            self._send_error(HTTPStatus.CONFLICT, f'Job {parts[1]} is running')
+        else:
+            self._send_json(HTTPStatus.OK, job)
+
+    def log_message(self, format: str, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(service: NormalisationService, host: str = '127.0.0.1', port: int = 8765,
+                max_upload_bytes: int = MAX_UPLOAD_BYTES,
+                quiet: bool = False) -> ThreadingHTTPServer:
+    """HTTP server for ``service``, one thread per connection (not started)."""
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.max_upload_bytes = max_upload_bytes
+    server.quiet = quiet
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Serve the SJJP student list normaliser over HTTP with a job queue.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--queue-size', type=int, default=JOB_QUEUE_SIZE,
+                        help='jobs waiting for a worker before uploads are refused '
+                             '(default: %(default)s)')
+    parser.add_argument('--max-upload-mb', type=int, default=MAX_UPLOAD_BYTES // (1024 * 1024),
+                        help='size cap of one upload (default: %(default)s)')
+    parser.add_argument('--keep-minutes', type=float, default=JOB_KEEP_SECONDS / 60,
+                        help='how long finished jobs and their files are kept '
+                             '(default: %(default)s)')
+    parser.add_argument('--jobs-dir', type=Path,
+                        help='directory for uploads and results (default: a temporary '
+                             'directory removed on exit)')
+    parser.add_argument('--engine', default='vectorized', choices=sorted(NORMALISATION_ENGINES))
+    parser.add_argument('--stream-csv', action='store_true',
+                        help='process CSV uploads in chunks with bounded memory')
+    parser.add_argument('--chunksize', type=int, default=CSV_CHUNK_SIZE)
+    parser.add_argument('--cache-dir', type=Path, nargs='?', const=Path(DISK_CACHE_DIR),
+                        metavar='DIR',
+                        help='reuse cleaned rosters from an on-disk cache (default DIR: '
+                             f'{DISK_CACHE_DIR})')
+    parser.add_argument('--quiet', action='store_true', help='do not log every request')
+    args = parser.parse_args(argv)
+
+    jobs_dir = args.jobs_dir
+    if jobs_dir is None:
+        jobs_dir = Path(tempfile.mkdtemp(prefix='sjjp_service_'))
+    else:
+        jobs_dir.mkdir(parents=True, exist_ok=True)
+    service = NormalisationService(jobs_dir, workers=max(1, args.workers),
+                                   queue_size=args.queue_size,
+                                   keep_seconds=args.keep_minutes * 60, engine=args.engine,
+                                   stream_csv=args.stream_csv, chunksize=args.chunksize,
+                                   cache_dir=args.cache_dir)
+    server = make_server(service, args.host, args.port,
+                         max_upload_bytes=args.max_upload_mb * 1024 * 1024, quiet=args.quiet)
+    print(f'Serving on http://{args.host}:{server.server_port} '
+          f'({service.workers} workers, jobs in {jobs_dir})', file=sys.stderr)
+    # Stop on SIGTERM as on Ctrl+C, so the worker processes are shut down too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.jobs_dir is None:
+            shutil.rmtree(jobs_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,6 +21,11 @@ Limitations
   with an inherent table structure (CSV, XLSX, DOCX).  Scanned PDFs
   should be processed through OCR or exported to CSV/XLSX prior to
   upload.
+* **XLSX workbooks are read sheet by sheet.**  Every sheet whose
+  header row contains a known column name (see ``SYNONYMS``) is read
+  and the sheets are combined, so one grade per sheet is fine; other
+  sheets (instructions, totals) are ignored.  The header is the first
+  non-blank row of a sheet.
 * **DOCX parsing is best effort.**  The application includes a
   lightweight parser that extracts the largest table from the Word
   document.  If your document contains multiple tables, ensure the
@@ -33,7 +38,16 @@ Run the application with Streamlit (e.g. ``streamlit run
 sjjp_student_normalizer_app.py``).  Upload your student lists, select
 your preferred section formatting (letters, numbers or automatic
 detection), optionally enter a school name for each file, then click
-*Process Files* to download the normalised CSV(s).
+*Process Files* to download the normalised CSV(s).  With the on-disk
+cache enabled, cleaned rosters are kept (as Parquet, under
+``~/.cache/sjjp_normalizer``) and a file uploaded again unchanged is
+neither parsed nor cleaned; the batch CLI can share the same cache.
+In delta mode the previous import file of each school is uploaded as
+well and only new and changed students are exported, with a report of
+the changes (removed students included).  In pipelined mode the next
+files are decoded on reader threads while the current one is normalised.
+Without the UI, ``sjjp_batch_normalizer.py`` processes whole directories
+and ``sjjp_normalizer_service.py`` accepts rosters over local HTTP.
 
 The normalisation rules implemented here follow the guidelines
 described by the user:
@@ -51,34 +65,106 @@ described by the user:
   normalised to the integer 5.  Grades outside 1–12 are treated as
   missing.
 * **Section**: the pattern may be detected automatically (majority
-  vote), or forced to letters or numbers.  Mixed patterns are
-  reconciled so that all values follow the chosen style.  Advanced
-  sections like ``ADV`` are preserved.
+  vote over the file, or per grade for files that mix conventions), or
+  forced to letters or numbers.  Mixed patterns are reconciled so that
+  all values follow the chosen style.  Advanced sections like ``ADV``
+  are preserved.
 * **Nationality**: ``UAE``, ``United Arab Emirates`` and ``Emirati``
   are recorded simply as ``UAE``; any other value is kept as supplied
   (leading/trailing whitespace trimmed).  The citizenship status is
   derived: nationals are labelled ``UAE National`` and others
   ``Resident``.
+* **Emirate Id**: regrouped as ``784-YYYY-NNNNNNN-C`` and checked
+  against its check digit and the Date Of Birth year; the outcome is
+  recorded in an ``Emirate Id Status`` column (not exported).
+
+Which cleaner runs on which column, the derived fields and the import
+headers are declared in ``NORMALISATION_PLAN``; the batch CLI can load
+an adapted plan from JSON.
 
 Author: OpenAI ChatGPT
 """
 
+import difflib
+import gzip
+import hashlib
 import io
+import json
+import multiprocessing
+import os
 import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
 import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 import streamlit as st
 import xml.etree.ElementTree as ET
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+from pandas.io.parsers import TextParser
+
+try:  # optional: Arrow-backed strings (compact mode) and Parquet export
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:  # optional: Rust-based reader for the fast XLSX path
+    import python_calamine
+except ImportError:
+    python_calamine = None
 
 
 ###############################################################################
 # Helper functions for reading and parsing different file types
 ###############################################################################
 
+# WordprocessingML namespace
+_W_NS = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+_W = '{%s}' % _W_NS['w']
+
+
+def _table_rows(tbl: ET.Element) -> List[List[str]]:
+    """Return the cell texts of every row (``w:tr``) below a ``w:tbl`` element."""
+    ns = _W_NS
+    data_rows: List[List[str]] = []
+    for row in tbl.findall('.//w:tr', ns):
+        cells = row.findall('.//w:tc', ns)
+        row_data: List[str] = []
+        for cell in cells:
+            # extract all text in the cell
+            texts: List[str] = []
+            for paragraph in cell.findall('.//w:p', ns):
+                runs = paragraph.findall('.//w:t', ns)
+                run_texts = [r.text or '' for r in runs]
+                if run_texts:
+                    texts.append(''.join(run_texts))
+            cell_text = '\n'.join([t.strip() for t in texts if t.strip()])
+            row_data.append(cell_text)
+        data_rows.append(row_data)
+    return data_rows
+
+
+def _rows_to_dataframe(data_rows: List[List[str]]) -> pd.DataFrame:
+    """Build a DataFrame from table rows, using the first row as header."""
+    # Use the first row as header; pad shorter rows with empty strings
+    header = data_rows[0]
+    n_cols = len(header)
+    body = [r + [''] * (n_cols - len(r)) if len(r) < n_cols else r[:n_cols] for r in data_rows[1:]]
+    df = pd.DataFrame(body, columns=header)
+    return df
+
+
 def _docx_to_dataframe(file_bytes: bytes) -> Optional[pd.DataFrame]:
     """Extract the largest table from a DOCX file and return it as a DataFrame.
 
@@ -111,43 +197,381 @@ def _docx_to_dataframe(file_bytes: bytes) -> Optional[pd.DataFrame]:
         tree = ET.fromstring(xml_content)
     except ET.ParseError:
         return None
-    # WordprocessingML namespace
-    ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+    ns = _W_NS
     tables = tree.findall('.//w:tbl', ns)
     if not tables:
         return None
     # choose the table with the most rows
     best_tbl = max(tables, key=lambda tbl: len(tbl.findall('.//w:tr', ns)))
-    rows = best_tbl.findall('.//w:tr', ns)
-    if not rows:
+    data_rows = _table_rows(best_tbl)
+    if not data_rows:
         return None
-    data_rows: List[List[str]] = []
-    for row in rows:
-        cells = row.findall('.//w:tc', ns)
-        row_data: List[str] = []
-        for cell in cells:
-            # extract all text in the cell
-            texts: List[str] = []
-            for paragraph in cell.findall('.//w:p', ns):
-                runs = paragraph.findall('.//w:t', ns)
-                run_texts = [r.text or '' for r in runs]
-                if run_texts:
-                    texts.append(''.join(run_texts))
-            cell_text = '\n'.join([t.strip() for t in texts if t.strip()])
-            row_data.append(cell_text)
-        data_rows.append(row_data)
-    # Use the first row as header; pad shorter rows with empty strings
-    header = data_rows[0]
-    n_cols = len(header)
-    body = [r + [''] * (n_cols - len(r)) if len(r) < n_cols else r[:n_cols] for r in data_rows[1:]]
-    df = pd.DataFrame(body, columns=header)
-    return df
+    return _rows_to_dataframe(data_rows)
+
+
+def _docx_to_dataframe_streaming(source) -> Optional[pd.DataFrame]:
+    """Streaming equivalent of :func:`_docx_to_dataframe`.
 
+    ``word/document.xml`` is read once, straight from the zip member, with
+    ``ET.iterparse``.  Content outside tables is discarded as soon as it
+    has been parsed.  When an outermost table closes, it and any tables
+    nested in it are compared with the best candidate so far (most rows,
+    earliest on ties, exactly as ``max`` over ``findall`` would choose);
+    only the winner's cell texts are kept and the table is cleared.  Each
+    direct child of ``w:body`` is dropped once complete, so memory stays
+    proportional to one top-level block, i.e. one table.
 
-def _read_uploaded_file(file) -> Tuple[Optional[pd.DataFrame], str]:
+    Parameters
+    ----------
+    source : bytes, path or file-like
+        The DOCX file.
+
+    Returns
+    -------
+    pandas.DataFrame or None
+        The extracted table, or ``None`` if no table was detected or the
+        document could not be parsed.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    tbl_tag = _W + 'tbl'
+    best_count = -1
+    best_rows: List[List[str]] = []
+    open_tables = 0
+    depth = 0
+    body = None
+    try:
+        with zipfile.ZipFile(source) as z, z.open('word/document.xml') as doc_xml:
+            for event, elem in ET.iterparse(doc_xml, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if elem.tag == tbl_tag:
+                        open_tables += 1
+                    elif depth == 2:
+                        body = elem
+                    continue
+                depth -= 1
+                if elem.tag == tbl_tag:
+                    open_tables -= 1
+                    if open_tables == 0:
+                        # candidates in document order: this table, then nested ones
+                        for tbl in [elem] + elem.findall('.//w:tbl', _W_NS):
+                            count = len(tbl.findall('.//w:tr', _W_NS))
+                            if count > best_count:
+                                best_count = count
+                                best_rows = _table_rows(tbl)
+                        elem.clear()
+                if depth == 2:
+                    # a direct child of w:body is complete; nothing of it is needed
+                    body.clear()
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, OSError, RuntimeError,
+            NotImplementedError):
+        return None
+    if not best_rows:
+        return None
+    return _rows_to_dataframe(best_rows)
+
+
+# SpreadsheetML and package relationship namespaces
+_S = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_R_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+
+# Workbooks at least this large have their sheets parsed in parallel when
+# they hold more than one sheet (``sheet_workers=None``).
+XLSX_PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+# Start method of the sheet workers.  Forking copies the locks of the
+# threads the Streamlit server, the reader threads and pandas run, so a
+# child can deadlock; a fork server starts workers from a clean process.
+XLSX_POOL_CONTEXT = ('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                     else 'spawn')
+
+
+def _column_index(letters: str) -> int:
+    """Zero-based column index of column letters such as ``AB``."""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+class XlsxWorkbook:
+    """Minimal streaming reader for the cell values of an XLSX workbook.
+
+    Only what a student list needs is parsed: the sheet list, shared
+    strings, which cell styles are dates, and the ``sheetData`` of the
+    requested sheet, streamed with ``ET.iterparse`` one row at a time.
+    Values come out as ``pd.read_excel`` would hand them to its parser
+    (empty cells as ``''``, integral numbers as ``int``, date-formatted
+    numbers as ``datetime``).  Much faster than openpyxl, whose per-cell
+    objects dominate reading large workbooks.
+
+    ``data`` is the workbook file, or the parts returned by
+    :meth:`sheet_parts` for reading a single sheet.
+    """
+
+    def __init__(self, data) -> None:
+        if isinstance(data, dict):
+            self._zip, self._parts = None, data
+        else:
+            self._zip, self._parts = zipfile.ZipFile(io.BytesIO(data)), None
+        rels = {rel.get('Id'): rel for rel in ET.fromstring(
+            self._read('xl/_rels/workbook.xml.rels')).iter(_PKG_REL)}
+        workbook = ET.fromstring(self._read('xl/workbook.xml'))
+        self.sheets = {sheet.get('name'): self._part(rels[sheet.get(_R_ID)].get('Target'))
+                       for sheet in workbook.iter(_S + 'sheet')}
+        pr = workbook.find(_S + 'workbookPr')
+        date1904 = pr is not None and pr.get('date1904') in ('1', 'true')
+        self._epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+        targets = {rel.get('Type').rsplit('/', 1)[-1]: self._part(rel.get('Target'))
+                   for rel in rels.values()}
+        self._shared_strings_part = targets.get('sharedStrings')
+        self._styles_part = targets.get('styles')
+        self._shared = None
+        self._date_styles = None
+        self._common_parts = None
+
+    @staticmethod
+    def _part(target: str) -> str:
+        return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+
+    def _read(self, part: str) -> bytes:
+        return self._zip.read(part) if self._parts is None else self._parts[part]
+
+    def _open(self, part: str):
+        return self._zip.open(part) if self._parts is None else io.BytesIO(self._parts[part])
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+
+    def sheet_parts(self, sheet: str) -> Dict[str, bytes]:
+        """The parts needed to read ``sheet`` alone, uncompressed.
+
+        That is the sheet's XML plus the workbook, relationship, shared
+        string and style parts every sheet refers to; those are read from
+        the archive once and shared by the parts of all sheets.
+        """
+        if self._common_parts is None:
+            names = ['xl/_rels/workbook.xml.rels', 'xl/workbook.xml',
+                     self._shared_strings_part, self._styles_part]
+            self._common_parts = {name: self._read(name) for name in names if name}
+        parts = dict(self._common_parts)
+        parts[self.sheets[sheet]] = self._read(self.sheets[sheet])
+        return parts
+
+    def shared_strings(self) -> List[str]:
+        """The shared string table (phonetic runs excluded), read once."""
+        if self._shared is None:
+            self._shared = []
+            if self._shared_strings_part:
+                with self._open(self._shared_strings_part) as xml:
+                    for _, elem in ET.iterparse(xml):
+                        if elem.tag == _S + 'si':
+                            self._shared.append(''.join(
+                                t.text or '' for t in elem.iterfind(_S + 't')) + ''.join(
+                                t.text or '' for t in elem.iterfind(f'{_S}r/{_S}t')))
+                            elem.clear()
+        return self._shared
+
+    def date_styles(self) -> set:
+        """Indices of the cell formats (``cellXfs``) that display dates."""
+        if self._date_styles is None:
+            self._date_styles = set()
+            if self._styles_part:
+                styles = ET.fromstring(self._read(self._styles_part))
+                formats = dict(BUILTIN_FORMATS)
+                formats.update((int(fmt.get('numFmtId')), fmt.get('formatCode'))
+                               for fmt in styles.iter(_S + 'numFmt'))
+                xfs = styles.find(_S + 'cellXfs')
+                for index, xf in enumerate(xfs if xfs is not None else []):
+                    code = formats.get(int(xf.get('numFmtId', 0)))
+                    if code and is_date_format(code):
+                        self._date_styles.add(index)
+        return self._date_styles
+
+    def _value(self, cell: ET.Element):
+        kind = cell.get('t')
+        if kind == 'inlineStr':
+            return ''.join(t.text or '' for t in cell.iter(_S + 't'))
+        v = cell.find(_S + 'v')
+        text = v.text if v is not None else None
+        if text is None:
+            return ''
+        if kind == 's':
+            return self.shared_strings()[int(text)]
+        if kind == 'b':
+            return text == '1'
+        if kind in ('str', 'e', 'd'):
+            return text
+        number = float(text) if any(c in text for c in '.Ee') else int(text)
+        style = cell.get('s')
+        if style is not None and int(style) in self.date_styles():
+            return from_excel(number, self._epoch)
+        if isinstance(number, float) and number.is_integer():
+            return int(number)
+        return number
+
+    def rows(self, sheet: str):
+        """Yield the rows of ``sheet`` as lists of cell values.
+
+        Missing rows are yielded as empty lists and missing cells within a
+        row as ``''``; rows are not padded to a common width.  Only end
+        events are requested and cells are read from their completed row,
+        which halves the parser events per cell.
+        """
+        row_tag = _S + 'row'
+        columns: Dict[str, int] = {}
+        with self._open(self.sheets[sheet]) as xml:
+            expected = 1
+            for _, elem in ET.iterparse(xml):
+                if elem.tag != row_tag:
+                    continue
+                number = int(elem.get('r', expected))
+                for _ in range(number - expected):
+                    yield []
+                expected = number + 1
+                row = []
+                for cell in elem:
+                    ref = cell.get('r')
+                    if ref is not None:
+                        letters = ref.rstrip('0123456789')
+                        index = columns.get(letters)
+                        if index is None:
+                            index = columns[letters] = _column_index(letters)
+                        if index > len(row):
+                            row.extend([''] * (index - len(row)))
+                    row.append(self._value(cell))
+                elem.clear()
+                yield row
+
+
+def _read_xlsx_sheet(data, sheet: str, require_mapped: bool = True
+                     ) -> Optional[pd.DataFrame]:
+    """Read one worksheet with :class:`XlsxWorkbook`.
+
+    The rows are handed to pandas' ``TextParser`` as ``pd.read_excel(dtype=
+    str)`` would, so values match its output; unlike ``pd.read_excel``
+    the header is the first non-blank row, not the first row.  With
+    ``require_mapped`` a sheet whose header has no column known to
+    ``SYNONYMS`` (instructions, totals) is skipped after reading that row
+    and ``None`` is returned.  ``data`` is the workbook file or the
+    sheet's parts (see :meth:`XlsxWorkbook.sheet_parts`).  Top-level so
+    that it can run in a worker process.
+    """
+    workbook = XlsxWorkbook(data)
+    try:
+        rows = workbook.rows(sheet)
+        header = next((row for row in rows if any(v != '' for v in row)), None)
+        if header is None:
+            return None
+        if require_mapped and not _has_mapped_header(header):
+            return None
+        data_rows = [header]
+        data_rows.extend(rows)
+    finally:
+        workbook.close()
+    # like pandas: drop trailing blank cells and rows, pad to the widest row
+    for row in data_rows:
+        while row and row[-1] == '':
+            row.pop()
+    while not data_rows[-1]:
+        data_rows.pop()
+    width = max(len(row) for row in data_rows)
+    for row in data_rows:
+        row.extend([''] * (width - len(row)))
+    return TextParser(data_rows, header=0, dtype=str).read()
+
+
+def _has_mapped_header(columns) -> bool:
+    """Whether any column name maps to the internal schema via ``SYNONYMS``."""
+    return any(_column_key(col) in SYNONYMS for col in columns)
+
+
+def _read_xlsx_pandas(data: bytes, engine: str) -> List[pd.DataFrame]:
+    """All mapped sheets read with ``pd.read_excel`` and the given engine."""
+    sheets = pd.read_excel(io.BytesIO(data), sheet_name=None, dtype=str, engine=engine)
+    return [df for df in sheets.values() if _has_mapped_header(df.columns)]
+
+
+def _read_xlsx_fast(data: bytes, sheet_workers: Optional[int] = None) -> pd.DataFrame:
+    """Read every student-list sheet of a workbook into one DataFrame.
+
+    Schools often keep one grade per sheet, so all sheets are read and
+    those whose header maps to the internal schema via ``SYNONYMS`` are
+    concatenated in workbook order.  With several such sheets each one
+    is standardised first, so that ``Name`` on one sheet and ``Student
+    Name`` on another line up; a single sheet is returned as read.  When
+    no sheet has a known header the first non-empty sheet is returned,
+    as ``pd.read_excel`` would have done.
+
+    Sheets are read with the Rust ``calamine`` engine when
+    ``python-calamine`` is installed, otherwise streamed by
+    :class:`XlsxWorkbook` on ``sheet_workers`` processes (``None`` uses
+    one per sheet for workbooks of at least ``XLSX_PARALLEL_MIN_BYTES``;
+    1 is sequential).  The workers are started as ``XLSX_POOL_CONTEXT``
+    says, never forked from this threaded process, and each receives
+    only the parts of its own sheet.  Workbooks the streaming reader
+    cannot parse fall back to ``pd.read_excel`` with openpyxl.
+    """
+    if python_calamine is not None:
+        frames = _read_xlsx_pandas(data, 'calamine')
+    else:
+        try:
+            workbook = XlsxWorkbook(data)
+            names = list(workbook.sheets)
+            if sheet_workers is None:
+                sheet_workers = len(names) if len(data) >= XLSX_PARALLEL_MIN_BYTES else 1
+            if min(sheet_workers, len(names)) > 1:
+                try:
+                    parts = [workbook.sheet_parts(name) for name in names]
+                finally:
+                    workbook.close()
+                context = multiprocessing.get_context(XLSX_POOL_CONTEXT)
+                with ProcessPoolExecutor(max_workers=min(sheet_workers, len(names)),
+                                         mp_context=context) as pool:
+                    frames = list(pool.map(_read_xlsx_sheet, parts, names))
+            else:
+                workbook.close()
+                frames = [_read_xlsx_sheet(data, name) for name in names]
+            frames = [df for df in frames if df is not None]
+            if not frames:
+                frames = [df for df in (_read_xlsx_sheet(data, name, require_mapped=False)
+                                        for name in names) if df is not None][:1]
+        except (KeyError, ValueError, ET.ParseError, zipfile.BadZipFile):
+            frames = _read_xlsx_pandas(data, 'openpyxl')
+    if not frames:
+        return pd.read_excel(io.BytesIO(data), dtype=str, engine='openpyxl')
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat([_standardise_column_names(df) for df in frames], ignore_index=True)
+
+
+class _NamedBytes(io.BytesIO):
+    """Bytes standing in for a Streamlit ``UploadedFile`` outside the app.
+
+    Used by the batch CLI for local files, by the benchmarks and by the
+    tests; only the bits of ``UploadedFile`` the pipeline uses are there.
+    """
+
+    def __init__(self, data: bytes, name: str) -> None:
+        super().__init__(data)
+        self.name = name
+
+    @classmethod
+    def from_path(cls, path) -> '_NamedBytes':
+        """In-memory copy of the local file at ``path``."""
+        with open(path, 'rb') as f:
+            return cls(f.read(), os.path.basename(path))
+
+
+def _read_uploaded_file(file, sheet_workers: Optional[int] = None
+                        ) -> Tuple[Optional[pd.DataFrame], str]:
     """Read an uploaded file into a DataFrame.
 
-    The function supports CSV, XLSX and DOCX formats.  Legacy Excel files
+    The function supports CSV, XLSX and DOCX formats.  XLSX workbooks are
+    read with :func:`_read_xlsx_fast`, i.e. every sheet holding a student
+    list, not just the first one.  Legacy Excel files
     (``.xls``) are not supported because the required ``xlrd`` package is
     unavailable in the current environment.  PDF extraction is also not
     supported.  The returned string describes any issue encountered while
@@ -158,6 +582,9 @@ def _read_uploaded_file(file) -> Tuple[Optional[pd.DataFrame], str]:
     ----------
     file : UploadedFile
         The file uploaded via Streamlit.
+    sheet_workers : int, optional
+        Worker processes for the sheets of an XLSX workbook (see
+        :func:`_read_xlsx_fast`).
 
     Returns
     -------
@@ -174,15 +601,14 @@ def _read_uploaded_file(file) -> Tuple[Optional[pd.DataFrame], str]:
             df = pd.read_csv(file, dtype=str)
             return df, ''
         elif name_lower.endswith('.xlsx'):
-            # Use engine openpyxl to read XLSX
-            df = pd.read_excel(file, dtype=str, engine='openpyxl')
+            df = _read_xlsx_fast(file.getvalue(), sheet_workers=sheet_workers)
             return df, ''
         elif name_lower.endswith('.xls'):
             # Unsupported legacy Excel
             return None, 'Legacy .xls files are not supported; please save as .xlsx or .csv.'
         elif name_lower.endswith('.docx'):
             file_bytes = file.getvalue()
-            df = _docx_to_dataframe(file_bytes)
+            df = _docx_to_dataframe_streaming(file_bytes)
             if df is None:
                 return None, 'No table was detected in the DOCX file.'
             return df, ''
@@ -296,6 +722,11 @@ SYNONYMS = {
 }
 
 
+def _column_key(col) -> str:
+    """Return the ``SYNONYMS`` lookup key for a raw column name."""
+    return re.sub(r'\s+', ' ', str(col).strip().lower())
+
+
 def _standardise_column_names(df: pd.DataFrame) -> pd.DataFrame:
     """Map arbitrary column names to our internal standard.
 
@@ -316,8 +747,7 @@ def _standardise_column_names(df: pd.DataFrame) -> pd.DataFrame:
     """
     rename_map = {}
     for col in df.columns:
-        key = re.sub(r'\s+', ' ', str(col).strip().lower())
-        standard = SYNONYMS.get(key, None)
+        standard = SYNONYMS.get(_column_key(col), None)
         if standard:
             rename_map[col] = standard
     if rename_map:
@@ -329,18 +759,37 @@ def _standardise_column_names(df: pd.DataFrame) -> pd.DataFrame:
 # Normalisation helpers
 ###############################################################################
 
+# Titles stripped from the start of names, case-insensitively.  A title
+# counts only when followed by a full stop and/or whitespace ("Dr. Ali",
+# "Mr.Ali"), and consecutive titles ("Dr. Sheikh Ali") are all removed.
 HONORIFICS = [
-    'mr.', 'mr ', 'mrs.', 'mrs ', 'ms.', 'ms ', 'dr.', 'dr ', 'prof.', 'prof ',
-    'eng.', 'eng ', 'sheikh', 'sheik', 'sheikh ', 'sheik ', 'sheikha', 'sheikha ',
-    'miss ', 'sir ', 'madam ', 'engineer ', 'doctor '
+    'mr', 'mrs', 'ms', 'miss', 'dr', 'doctor', 'prof', 'eng', 'engineer',
+    'sheikh', 'sheik', 'sheikha', 'sir', 'madam',
 ]
 
+# One anchored alternation over all titles, longest first so that
+# "sheikha" is not read as "sheikh" followed by "a".
+_HONORIFIC_RE = re.compile(
+    r'^(?:(?:%s)(?:\.\s*|\s+|$))+'
+    % '|'.join(re.escape(h) for h in sorted(HONORIFICS, key=len, reverse=True)),
+    re.IGNORECASE,
+)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _title_name_parts(name: str) -> str:
+    """Capitalise every space- and hyphen-separated part of a name."""
+    return ' '.join('-'.join(part.capitalize() for part in word.split('-'))
+                    for word in name.split(' '))
+
 
 def _clean_name(name: str) -> str:
     """Normalise a person's name.
 
-    * Converts to title case.
-    * Removes common honourifics and extraneous whitespace.
+    * Converts to title case (each space- or hyphen-separated part is
+      capitalised, so ``o'neil`` becomes ``O'neil``).
+    * Removes leading honourifics (see ``HONORIFICS``) and extraneous
+      whitespace.
 
     Parameters
     ----------
@@ -354,22 +803,8 @@ def _clean_name(name: str) -> str:
     """
     if not name or not isinstance(name, str):
         return ''
-    name = name.strip()
-    name_lower = name.lower()
-    for hon in HONORIFICS:
-        if name_lower.startswith(hon):
-            # remove the honourific at the beginning
-            name = name[len(hon):].lstrip()
-            name_lower = name.lower()
-            break
-    # condense multiple spaces
-    name = re.sub(r'\s+', ' ', name)
-    # title case (handles apostrophes, hyphens)
-    def title_special(s: str) -> str:
-        return '-'.join(part.capitalize() for part in s.split('-'))
-    name_parts = name.split(' ')
-    cleaned_parts = [title_special(part) for part in name_parts]
-    return ' '.join(cleaned_parts)
+    name = _HONORIFIC_RE.sub('', name.strip())
+    return _title_name_parts(_WHITESPACE_RE.sub(' ', name))
 
 
 def _clean_date(value: str) -> Optional[str]:
@@ -416,6 +851,48 @@ def _extract_digits(s: str) -> str:
     return ''.join(ch for ch in s if ch.isdigit())
 
 
+_PHONE_SPLIT_RE = re.compile(r'[;,/\s]+')
+
+
+def _clean_phone_part(part: str) -> Optional[str]:
+    """Normalise one delimiter-separated part of a phone field.
+
+    Returns ``None`` when the part contains no digits (and does not start
+    with ``+``), meaning it should be skipped.  See :func:`_clean_phone`
+    for the rules.
+    """
+    part_stripped = part.strip()
+    # If already starts with +, assume valid international format
+    if part_stripped.startswith('+'):
+        # remove spaces and dashes
+        cleaned = re.sub(r'[^\d+]', '', part_stripped)
+        return cleaned
+    digits = _extract_digits(part_stripped)
+    if not digits:
+        return None
+    # UAE mobile: starts with 5 or 05
+    if digits.startswith('05'):
+        if len(digits) == 10:
+            # 05XXXXXXXX
+            return '+971' + digits[1:]
+    elif digits.startswith('5') and len(digits) == 9:
+        # 5XXXXXXXX
+        return '+971' + digits
+    # UAE landline: 02XXXXXXX or similar (leading 0)
+    elif digits.startswith('0') and len(digits) in {8, 9}:
+        # drop the leading zero
+        return '+971' + digits[1:]
+    # Already starts with 971 (without plus)
+    elif digits.startswith('971'):
+        return '+' + digits
+    # International number starting with country code (at least 9 digits)
+    elif len(digits) >= 9:
+        # Prepend + if missing
+        return '+' + digits
+    # Fallback: return digits as is with +
+    return '+' + digits
+
+
 def _clean_phone(value: str) -> Optional[str]:
     """Normalise a phone number string to E.164 where possible.
 
@@ -432,43 +909,27 @@ def _clean_phone(value: str) -> Optional[str]:
     if not value or not isinstance(value, str):
         return None
     # Split on common delimiters to support multiple phone numbers
-    parts = re.split(r'[;,/\s]+', value.strip())
-    for part in parts:
+    for part in _PHONE_SPLIT_RE.split(value.strip()):
         if not part:
             continue
-        part_stripped = part.strip()
-        # If already starts with +, assume valid international format
-        if part_stripped.startswith('+'):
-            # remove spaces and dashes
-            cleaned = re.sub(r'[^\d+]', '', part_stripped)
-            return cleaned
-        digits = _extract_digits(part_stripped)
-        if not digits:
-            continue
-        # UAE mobile: starts with 5 or 05
-        if digits.startswith('05'):
-            if len(digits) == 10:
-                # 05XXXXXXXX
-                return '+971' + digits[1:]
-        elif digits.startswith('5') and len(digits) == 9:
-            # 5XXXXXXXX
-            return '+971' + digits
-        # UAE landline: 02XXXXXXX or similar (leading 0)
-        elif digits.startswith('0') and len(digits) in {8, 9}:
-            # drop the leading zero
-            return '+971' + digits[1:]
-        # Already starts with 971 (without plus)
-        elif digits.startswith('971'):
-            return '+' + digits
-        # International number starting with country code (at least 9 digits)
-        elif len(digits) >= 9:
-            # Prepend + if missing
-            return '+' + digits
-        # Fallback: return digits as is with +
-        return '+' + digits
+        number = _clean_phone_part(part)
+        if number is not None:
+            return number
     return None
 
 
+def _clean_phones(value: str) -> List[str]:
+    """Return every number of a multi-number phone field, normalised.
+
+    Uses the same rules as :func:`_clean_phone`, whose result is the first
+    element of the list.
+    """
+    if not value or not isinstance(value, str):
+        return []
+    numbers = (_clean_phone_part(part) for part in _PHONE_SPLIT_RE.split(value.strip()) if part)
+    return [number for number in numbers if number is not None]
+
+
 def _clean_grade(value: str) -> Optional[int]:
     """Extract the numeric grade from diverse representations.
 
@@ -524,6 +985,20 @@ def _detect_section_pattern(values: List[str]) -> str:
     return 'numbers'
 
 
+def _detect_section_pattern_by_group(values: List[Optional[str]], groups) -> Dict[int, str]:
+    """Run :func:`_detect_section_pattern` separately over each group of values.
+
+    ``groups`` holds one integer key per value (see ``_section_group_keys``);
+    every key is mapped to the pattern voted by its own values.
+    """
+    members: Dict[int, List[str]] = {}
+    for value, group in zip(values, groups):
+        part = members.setdefault(int(group), [])
+        if pd.notna(value):
+            part.append(value)
+    return {group: _detect_section_pattern(part) for group, part in members.items()}
+
+
 def _convert_section(value: Optional[str], target_pattern: str) -> Optional[str]:
     """Convert a section value to the target pattern.
 
@@ -608,123 +1083,1233 @@ def _derive_cycle(grade: Optional[int]) -> Optional[str]:
     return None
 
 
-def _normalise_dataframe(df: pd.DataFrame, section_pattern_option: str) -> pd.DataFrame:
-    """Apply normalisation rules to the DataFrame.
+# Emirates ID numbers are ``784-YYYY-NNNNNNN-C``: the UAE country code, the
+# holder's birth year, a serial and a Luhn check digit over the first 14.
+# Spreadsheets often drop the hyphens or store the number as a float.
+# Separators and float suffix, spelled out so Python and Arrow (RE2) agree.
+_EMIRATES_ID_NOISE_RE = re.compile(r'[\t\n\v\f\r \-]+|\.0+$')
+_EMIRATES_ID_DIGITS_RE = re.compile(r'784[0-9]{12}')
+_EMIRATES_ID_PATTERN = r'784-[0-9]{4}-[0-9]{7}-[0-9]'
+# Values of the ``Emirate Id Status`` column; blank IDs get ``''``.
+EMIRATES_ID_STATUSES = ('valid', 'invalid format', 'invalid check digit',
+                        'birth year mismatch')
 
-    The function standardises column names, cleans individual fields,
-    derives additional columns and resolves sections to a consistent
-    pattern.  A new DataFrame is returned with columns relevant to
-    import.  Any extra columns from the input are preserved unless they
-    conflict with the import template.
 
-    Parameters
-    ----------
-    df : pandas.DataFrame
-        The raw DataFrame extracted from the uploaded file.
-    section_pattern_option : str
-        One of ``'auto'``, ``'letters'`` or ``'numbers'``.  ``'auto'``
-        performs a majority vote detection on the section column; the
-        others force conversion to the specified pattern.
+def _clean_emirates_id(value) -> str:
+    """Canonicalise an Emirates ID to ``784-YYYY-NNNNNNN-C``.
 
-    Returns
-    -------
-    pandas.DataFrame
-        A new DataFrame with normalised columns and values.
+    Whitespace and hyphens are dropped, as is a trailing ``.0`` left by a
+    numeric spreadsheet cell; 15 digits starting with ``784`` are then
+    regrouped.  Anything else is returned stripped but otherwise as given,
+    so that ``_emirates_id_status`` can report it.  Missing values yield
+    ``''``.
     """
-    # Rename columns based on synonyms
-    df = _standardise_column_names(df.copy())
-
-    # Ensure required columns exist; create empty ones if missing
-    required_internal_cols = [
-        'Student No', 'Student Name', 'Student Name (Arabic)', 'Grade',
-        'Section', 'Gender', 'Nationality', 'Citizenship Status', 'Date Of Birth',
-        'Parent Phone', 'Student Phone', 'Emirate Id', 'Passport',
-        'Home Address', 'Student Email', 'Parent Email', 'Email'
-    ]
-    for col in required_internal_cols:
-        if col not in df.columns:
-            df[col] = None
-
-    # Clean names
-    df['Student Name'] = df['Student Name'].apply(_clean_name)
-    if 'Student Name (Arabic)' in df.columns:
-        df['Student Name (Arabic)'] = df['Student Name (Arabic)'].fillna('').astype(str)
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    text = str(value).strip()
+    digits = _EMIRATES_ID_NOISE_RE.sub('', text)
+    if not _EMIRATES_ID_DIGITS_RE.fullmatch(digits):
+        return text
+    return f'{digits[:3]}-{digits[3:7]}-{digits[7:14]}-{digits[14]}'
+
+
+def _emirates_id_status(emirates_id: str, date_of_birth: Optional[str]) -> str:
+    """Validate a cleaned Emirates ID against its check digit and birth year.
+
+    Returns one of ``EMIRATES_ID_STATUSES``, or ``''`` for a blank ID.  The
+    birth year is only compared when the normalised ``date_of_birth``
+    (``YYYY-MM-DD``) is known.
+    """
+    if not emirates_id:
+        return ''
+    if not re.fullmatch(_EMIRATES_ID_PATTERN, emirates_id):
+        return 'invalid format'
+    digits = [int(c) for c in emirates_id.replace('-', '')]
+    total = sum(digits[0::2]) + sum(d * 2 - 9 if d > 4 else d * 2 for d in digits[1::2])
+    if total % 10:
+        return 'invalid check digit'
+    if isinstance(date_of_birth, str) and date_of_birth[:4] != emirates_id[4:8]:
+        return 'birth year mismatch'
+    return 'valid'
+
+
+###############################################################################
+# Vectorized normalisation helpers
+###############################################################################
+#
+# Whole-column counterparts of the scalar helpers above.  They rely on the
+# pandas ``.str`` accessor and NumPy masks instead of calling a Python
+# function per cell, and must return exactly what the scalar helpers would.
+# Unicode digits are the one place where regular expressions and the scalar
+# code disagree (``str.isdigit``/``int`` accept characters that ``\d`` or a
+# lookup table do not), so rows containing non‑ASCII text are recomputed
+# with the scalar helper where that matters.
+
+# Where ``str.title`` and per-part ``capitalize`` disagree (see _clean_name_series)
+_TITLE_MISMATCH_PATTERN = r'[^a-z \-][a-z]|[^\x00-\x7f]'
+_GRADE_PATTERN = r'(?:[Gg][- ]?)?(\d{1,2})'
+# A delimiter-separated phone token that starts with ``+`` or holds a digit,
+# i.e. a part ``_clean_phone`` would not skip.
+_PHONE_TOKEN_RE = re.compile(r'(?<![^;,/\s])(\+[^;,/\s]*|(?!\+)[^;,/\s]*\d[^;,/\s]*)')
+_NON_DIGIT_RE = re.compile(r'\D')
+_NON_PHONE_CHAR_RE = re.compile(r'[^\d+]')
+_NON_ASCII_PATTERN = r'[^\x00-\x7f]'
+_UAE_LABELS = ['uae', 'united arab emirates', 'emirati']
+_GENDER_LABELS = {'m': 'Male', 'male': 'Male', 'f': 'Female', 'female': 'Female'}
+_DIGIT_TO_LETTER = {str(n): chr(ord('A') + n - 1) for n in range(1, 10)}
+_LETTER_TO_NUMBER = {
+    **{chr(ord('A') + i): str(i + 1) for i in range(26)},
+    **{chr(ord('a') + i): str(i + 1) for i in range(26)},
+}
+
+
+def _text(values: pd.Series) -> pd.Series:
+    """Return ``values`` as an object Series that accepts the ``.str`` accessor.
+
+    Non-string cells already come back as ``NaN`` from ``.str`` methods,
+    which mirrors the ``isinstance(value, str)`` guard of the scalar
+    helpers.  A column without any strings (e.g. all integers) is rejected
+    by the accessor, so it is replaced by an all-missing Series.
+    """
+    s = values.astype(object)
+    if pd.api.types.infer_dtype(s, skipna=True) in {'string', 'empty', 'mixed', 'mixed-integer'}:
+        return s
+    return pd.Series(np.nan, index=s.index, dtype=object)
+
+
+def _with_none(values: pd.Series) -> pd.Series:
+    """Return an object Series where every missing value is ``None``."""
+    out = values.astype(object)
+    return out.where(out.notna(), None)
+
+
+def _scalar_fallback(result: pd.Series, source: pd.Series, func) -> pd.Series:
+    """Recompute rows of ``result`` whose ``source`` text is not pure ASCII.
+
+    ``func`` is the scalar helper applied to those rows only; for typical
+    rosters the selection is empty and the call is free.
+    """
+    mask = _text(source).str.contains(_NON_ASCII_PATTERN, regex=True, na=False).to_numpy()
+    if not mask.any():
+        return result
+    out = result.astype(object).to_numpy(copy=True)
+    out[mask] = [func(v) for v in source.to_numpy()[mask]]
+    return pd.Series(out, index=result.index, dtype=object)
+
+
+def _clean_name_series(values: pd.Series) -> pd.Series:
+    """Vectorized :func:`_clean_name`.
+
+    Honourifics and whitespace are handled with the compiled patterns
+    of the scalar helper.  Title casing uses ``str.title``, which only
+    differs from capitalising space- and hyphen-separated parts when a
+    letter follows another non-letter (``o'neil``, ``3rd``) or for
+    non-ASCII text; those rows go through :func:`_title_name_parts`.
+    """
+    s = _text(values).str.strip()
+    s = s.str.replace(_HONORIFIC_RE, '', regex=True)
+    s = s.str.replace(_WHITESPACE_RE, ' ', regex=True)
+    lowered = s.str.lower()
+    out = lowered.str.title()
+    mask = lowered.str.contains(_TITLE_MISMATCH_PATTERN, regex=True, na=False).to_numpy()
+    if mask.any():
+        out[mask] = [_title_name_parts(v) for v in s.to_numpy()[mask]]
+    return out.fillna('')
+
+
+def _clean_gender_series(values: pd.Series) -> pd.Series:
+    """Vectorized :func:`_clean_gender`."""
+    return _with_none(_text(values).str.strip().str.lower().map(_GENDER_LABELS))
+
+
+# Explicit formats tried by the column date engine.  Only day-first
+# orders are listed, as in ``_clean_date``; anything else is left to the
+# scalar helper.
+DATE_FORMATS = [
+    '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d', '%d %B %Y', '%d %b %Y', '%d-%b-%Y', '%B %d, %Y', '%b %d, %Y',
+]
+# Pseudo-format for Excel serial day numbers, which ``read_excel(dtype=str)``
+# returns for date cells stored as plain numbers.  Five digits cover
+# 1927-05-18 to 2173-10-14 and cannot be confused with a bare year.
+EXCEL_SERIAL = 'excel serial'
+_EXCEL_SERIAL_PATTERN = r'\d{5}(?:\.0+)?'
+_EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+# Number of distinct values inspected to pick the formats of a column.
+DATE_SAMPLE_SIZE = 1000
+
+
+def _parse_date_format(values: pd.Series, fmt: str) -> pd.Series:
+    """Parse ``values`` with one entry of ``DATE_FORMATS`` or ``EXCEL_SERIAL``."""
+    if fmt == EXCEL_SERIAL:
+        # Only matching values are converted: NaN days overflow the
+        # nanosecond arithmetic of ``to_timedelta``.
+        mask = values.str.fullmatch(_EXCEL_SERIAL_PATTERN, na=False).to_numpy(dtype=bool)
+        parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+        if mask.any():
+            days = pd.to_numeric(values[mask]).astype('int64')
+            parsed[mask] = _EXCEL_EPOCH + pd.to_timedelta(days, unit='D')
+        return parsed
+    return pd.to_datetime(values, format=fmt, errors='coerce')
+
+
+def _infer_date_formats(values: pd.Series, sample_size: int = DATE_SAMPLE_SIZE) -> List[str]:
+    """Return every date format, ordered by how much of ``values`` it parses.
+
+    Only a sample of ``values`` is inspected, so it decides the order and
+    nothing else: formats that parse part of the sample come first, most
+    common first, followed by the others.  Ties keep the ``DATE_FORMATS``
+    order, with ``EXCEL_SERIAL`` last.
+    """
+    sample = values.dropna()
+    if len(sample) > sample_size:
+        sample = sample.sample(sample_size, random_state=0)
+    formats = DATE_FORMATS + [EXCEL_SERIAL]
+    counts = {fmt: int(_parse_date_format(sample, fmt).notna().sum()) for fmt in formats}
+    return sorted(formats, key=lambda fmt: -counts[fmt])
+
+
+def _clean_date_series(values: pd.Series) -> pd.Series:
+    """Column form of :func:`_clean_date` driven by format inference.
+
+    The distinct values of the column are sampled to rank the formats,
+    then parsed with one vectorized ``pd.to_datetime`` call per format on
+    the values earlier formats left over, so a format missing from the
+    sample is still tried.  Only values no format accepts go through the
+    scalar helper.  Unlike the scalar helper, Excel serial numbers are
+    converted and ISO dates, with or without the time part Excel exports
+    add (``2010-05-06 00:00:00``), are always read as year-month-day; on
+    pandas 2 ``pd.to_datetime(value, dayfirst=True)`` swaps their day and
+    month whenever the day is 12 or less.
+
+    The number of rows matched by each format (plus ``'fallback'``,
+    ``'unparsed'`` and ``'missing'``) is stored in
+    ``result.attrs['date_formats']``.
+    """
+    s = _text(values).str.strip()
+    s = s.mask((s == '') | s.str.lower().isin(['nan', 'none', 'null']))
+    codes, uniques = pd.factorize(s)
+    distinct = pd.Series(uniques, dtype=object)
+    weights = np.bincount(codes[codes >= 0], minlength=len(distinct))
+
+    out = np.full(len(distinct), None, dtype=object)
+    remaining = np.ones(len(distinct), dtype=bool)
+    counts: Dict[str, int] = {}
+    for fmt in _infer_date_formats(distinct):
+        idx = np.flatnonzero(remaining)
+        if not len(idx):
+            break
+        parsed = _parse_date_format(distinct.iloc[idx], fmt)
+        ok = parsed.notna().to_numpy()
+        out[idx[ok]] = parsed[ok].dt.strftime('%Y-%m-%d').to_numpy()
+        remaining[idx[ok]] = False
+        if ok.any():
+            counts[fmt] = int(weights[idx[ok]].sum())
+
+    leftovers = np.flatnonzero(remaining)
+    out[leftovers] = [_clean_date(v) for v in distinct.iloc[leftovers]]
+    recovered = np.array([v is not None for v in out[leftovers]], dtype=bool)
+    counts['fallback'] = int(weights[leftovers[recovered]].sum())
+    counts['unparsed'] = int(weights[leftovers[~recovered]].sum())
+    counts['missing'] = int((codes < 0).sum())
+
+    result = pd.Series(np.append(out, None)[codes], index=values.index, dtype=object)
+    result.attrs['date_formats'] = counts
+    return result
+
+
+def _phone_tokens_to_e164(token: pd.Series) -> pd.Series:
+    """Apply the :func:`_clean_phone_part` rules to a Series of phone tokens."""
+    digits = token.str.replace(_NON_DIGIT_RE, '', regex=True)
+    n_digits = digits.str.len()
+    mobile_9 = digits.str.startswith('5', na=False) & (n_digits == 9)
+    drop_zero = (
+        (digits.str.startswith('05', na=False) & (n_digits == 10))
+        | (digits.str.startswith('0', na=False)
+           & ~digits.str.startswith('05', na=False)
+           & n_digits.isin([8, 9]))
+    )
+    out = ('+' + digits).mask(mobile_9, '+971' + digits)
+    out = out.mask(drop_zero, '+971' + digits.str[1:])
+    return out.mask(token.str.startswith('+', na=False),
+                    token.str.replace(_NON_PHONE_CHAR_RE, '', regex=True))
+
+
+def _clean_phone_series(values: pd.Series) -> pd.Series:
+    """Vectorized :func:`_clean_phone`.
+
+    The first delimiter-separated token that starts with ``+`` or contains
+    a digit decides the result, exactly like the loop in the scalar helper.
+    """
+    token = _text(values).str.strip().str.extract(_PHONE_TOKEN_RE, expand=False)
+    return _scalar_fallback(_with_none(_phone_tokens_to_e164(token)), values, _clean_phone)
+
+
+def _phone_numbers_by_position(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Return every normalised number of ``values`` with its row position.
+
+    Both arrays are ordered by row and, within a row, by appearance.
+    """
+    positional = _text(values).str.strip().reset_index(drop=True)
+    tokens = positional.str.extractall(_PHONE_TOKEN_RE)[0]
+    numbers = _phone_tokens_to_e164(tokens).to_numpy(dtype=object)
+    positions = tokens.index.get_level_values(0).to_numpy(dtype=np.intp)
+
+    non_ascii = positional.str.contains(_NON_ASCII_PATTERN, regex=True, na=False).to_numpy()
+    if non_ascii.any():
+        keep = ~non_ascii[positions]
+        redo = pd.Series([_clean_phones(v) for v in values.to_numpy()[non_ascii]],
+                         index=np.flatnonzero(non_ascii), dtype=object).explode().dropna()
+        positions = np.concatenate([positions[keep], redo.index.to_numpy(dtype=np.intp)])
+        numbers = np.concatenate([numbers[keep], redo.to_numpy(dtype=object)])
+        order = np.argsort(positions, kind='stable')
+        positions, numbers = positions[order], numbers[order]
+    return numbers, positions
+
+
+def _clean_phone_numbers_series(values: pd.Series) -> pd.Series:
+    """Vectorized :func:`_clean_phones` in exploded form.
+
+    Returns one row per number found, labelled with the index of the cell
+    it came from (like ``Series.explode``, without rows for cells that hold
+    no number).
+    """
+    numbers, positions = _phone_numbers_by_position(values)
+    return pd.Series(numbers, index=values.index[positions], dtype=object)
+
+
+def _clean_phone_lists_series(values: pd.Series) -> pd.Series:
+    """Vectorized :func:`_clean_phones` as a list column.
+
+    Extraction is done on the exploded form; only materialising one list
+    per row touches the rows individually.
+    """
+    numbers, positions = _phone_numbers_by_position(values)
+    bounds = np.searchsorted(positions, np.arange(1, len(values)))
+    out = np.empty(len(values), dtype=object)
+    out[:] = [chunk.tolist() for chunk in np.split(numbers, bounds)]
+    return pd.Series(out, index=values.index, dtype=object)
+
+
+def _clean_grade_series(values: pd.Series) -> pd.Series:
+    """Vectorized form of ``_clean_grade(str(v))`` for non-null ``v``."""
+    present = values.notna().to_numpy()
+    text = values[present].astype(str)
+    number = pd.to_numeric(text.str.strip().str.extract(_GRADE_PATTERN, expand=False),
+                           errors='coerce')
+    valid = number.between(1, 12).to_numpy()
+    out = np.full(len(values), None, dtype=object)
+    out[np.flatnonzero(present)[valid]] = number[valid].astype(int).astype(object).to_numpy()
+    result = pd.Series(out, index=values.index, dtype=object)
+    return _scalar_fallback(
+        result, values.where(present, ''),
+        lambda v: _clean_grade(str(v)) if pd.notnull(v) else None,
+    )
+
+
+def _clean_section_series(values: pd.Series) -> pd.Series:
+    """Vectorized form of ``_clean_section(str(v))`` for non-null ``v``."""
+    present = values.notna().to_numpy()
+    text = (values[present].astype(str).str.strip()
+            .str.replace('-', '', regex=False).str.replace(' ', '', regex=False))
+    out = np.full(len(values), None, dtype=object)
+    out[present] = text.str.upper().where(text != '', None).to_numpy()
+    return pd.Series(out, index=values.index, dtype=object)
+
+
+def _clean_nationality_series(values: pd.Series) -> pd.Series:
+    """Vectorized :func:`_clean_nationality`."""
+    s = _text(values).str.strip()
+    s = s.mask(s == '')
+    return _with_none(s.mask(s.str.lower().isin(_UAE_LABELS), 'UAE'))
+
+
+def _derive_citizenship_status_series(nationality: pd.Series) -> pd.Series:
+    """Vectorized :func:`_derive_citizenship_status`.
+
+    Expects the output of a nationality cleaner, where missing values are
+    always ``None``.
+    """
+    out = np.where(nationality.to_numpy() == 'UAE', 'UAE National', 'Resident').astype(object)
+    out[nationality.isna().to_numpy()] = None
+    return pd.Series(out, index=nationality.index, dtype=object)
+
+
+def _derive_cycle_series(grade: pd.Series) -> pd.Series:
+    """Vectorized :func:`_derive_cycle`."""
+    g = pd.to_numeric(grade, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    out = np.select(
+        [(g >= 1) & (g <= 4), (g >= 5) & (g <= 8), (g >= 9) & (g <= 12)],
+        ['C1', 'C2', 'C3'], default='',
+    ).astype(object)
+    out[out == ''] = None
+    return pd.Series(out, index=grade.index, dtype=object)
+
+
+# Positions of the 15 digits within ``784-YYYY-NNNNNNN-C``
+_EMIRATES_ID_DIGIT_COLUMNS = np.array([0, 1, 2, 4, 5, 6, 7, 9, 10, 11, 12, 13, 14, 15, 17])
+
+
+def _ascii_matrix(values: pd.Series, width: int) -> np.ndarray:
+    """View ASCII strings that are all ``width`` long as an ``(n, width)`` byte matrix."""
+    joined = ''.join(values.tolist()).encode('ascii')
+    return np.frombuffer(joined, dtype=np.uint8).reshape(-1, width)
+
+
+def _clean_emirates_id_series(values: pd.Series) -> pd.Series:
+    """Vectorized :func:`_clean_emirates_id`.
+
+    The string steps run as Arrow kernels when pyarrow is installed; the
+    15-digit IDs are then hyphenated as one byte matrix.
+    """
+    text = values.astype(object).where(values.notna(), '').astype(str)
+    if COMPACT_STRING_DTYPE is not None:
+        text = text.astype(COMPACT_STRING_DTYPE)
+    text = text.str.strip()
+    digits = text.str.replace(_EMIRATES_ID_NOISE_RE.pattern, '', regex=True)
+    match = digits.str.fullmatch(_EMIRATES_ID_DIGITS_RE.pattern)
+    rows = np.flatnonzero(match.to_numpy(dtype=bool, na_value=False))
+    out = text.to_numpy(dtype=object)
+    if len(rows):
+        canonical = np.full((len(rows), 18), ord('-'), dtype=np.uint8)
+        canonical[:, _EMIRATES_ID_DIGIT_COLUMNS] = _ascii_matrix(digits.iloc[rows], 15)
+        out[rows] = canonical.view('S18').ravel().astype(str)
+    return pd.Series(out, index=values.index, dtype=object)
+
+
+def _emirates_id_status_series(emirates_ids: pd.Series, dates_of_birth: pd.Series) -> pd.Series:
+    """Vectorized :func:`_emirates_id_status`.
+
+    The well-formed IDs are viewed as one ``(n, 18)`` byte matrix, so the
+    Luhn sums and the birth year check are NumPy column arithmetic over
+    the whole file.
+    """
+    ids = _text(emirates_ids).fillna('')
+    if COMPACT_STRING_DTYPE is not None:
+        ids = ids.astype(COMPACT_STRING_DTYPE)
+    match = ids.str.fullmatch(_EMIRATES_ID_PATTERN).to_numpy(dtype=bool, na_value=False)
+    status = np.where(match, 'valid', 'invalid format').astype(object)
+    status[(ids == '').to_numpy(dtype=bool)] = ''
+    rows = np.flatnonzero(match)
+    if len(rows):
+        chars = _ascii_matrix(ids.iloc[rows], 18)
+        digits = chars[:, _EMIRATES_ID_DIGIT_COLUMNS].astype(np.int64) - ord('0')
+        doubled = digits[:, 1::2] * 2
+        total = digits[:, 0::2].sum(axis=1) + (doubled - 9 * (doubled > 9)).sum(axis=1)
+        id_year = chars[:, 4:8].copy().view('S4').ravel().astype(str)
+        dob = _text(dates_of_birth).iloc[rows].fillna('')
+        if COMPACT_STRING_DTYPE is not None:
+            dob = dob.astype(COMPACT_STRING_DTYPE)
+        dob_year = dob.str[:4].to_numpy(dtype=str)
+        status[rows] = np.select(
+            [total % 10 != 0, (dob_year != '') & (dob_year != id_year)],
+            ['invalid check digit', 'birth year mismatch'], default='valid',
+        )
+    return pd.Series(status, index=emirates_ids.index, dtype=object)
+
+
+def _emirates_id_issues(status: pd.Series) -> Dict[str, int]:
+    """Count the IDs of an ``Emirate Id Status`` column that failed validation."""
+    counts = status.value_counts()
+    return {label: int(counts.get(label, 0)) for label in EMIRATES_ID_STATUSES[1:]
+            if counts.get(label, 0)}
+
+
+def _section_votes(sections: pd.Series) -> pd.DataFrame:
+    """Flag the single-letter and single-digit values of a cleaned section column."""
+    s = _text(sections)
+    return pd.DataFrame({'letters': s.str.fullmatch(r'[A-Z]', na=False).to_numpy(),
+                         'numbers': s.str.fullmatch(r'\d', na=False).to_numpy()})
+
+
+def _section_pattern_counts(sections: pd.Series) -> Tuple[int, int]:
+    """Count single-letter and single-digit values of a cleaned section column.
+
+    The counts are additive, so a file read in chunks can be voted on as a
+    whole.
+    """
+    votes = _section_votes(sections)
+    return int(votes['letters'].sum()), int(votes['numbers'].sum())
+
+
+def _detect_section_pattern_series(sections: pd.Series) -> str:
+    """Vectorized :func:`_detect_section_pattern` over a cleaned section column."""
+    letter_count, number_count = _section_pattern_counts(sections)
+    return 'letters' if letter_count >= number_count else 'numbers'
+
+
+def _section_group_keys(grades: pd.Series) -> np.ndarray:
+    """Group key of every row for per-grade section voting: the grade, or -1 if missing."""
+    return pd.to_numeric(grades, errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+
+
+def _section_group_counts(sections: pd.Series, groups: np.ndarray) -> pd.DataFrame:
+    """Letter and digit counts of a cleaned section column per group key.
+
+    One ``groupby`` pass; like ``_section_pattern_counts`` the counts are
+    additive across chunks (``DataFrame.add(..., fill_value=0)``).
+    """
+    return _section_votes(sections).groupby(np.asarray(groups)).sum()
+
+
+def _section_patterns_from_counts(counts: pd.DataFrame) -> Dict[int, str]:
+    """Resolve per-group counts to a pattern per group key, ties going to letters."""
+    letters = counts['letters'] >= counts['numbers']
+    return dict(zip(counts.index.tolist(), np.where(letters, 'letters', 'numbers').tolist()))
+
+
+def _detect_section_pattern_by_group_series(sections: pd.Series, groups: np.ndarray
+                                            ) -> Dict[int, str]:
+    """Vectorized :func:`_detect_section_pattern_by_group`."""
+    return _section_patterns_from_counts(_section_group_counts(sections, groups))
+
+
+def _convert_section_series(sections: pd.Series, target_pattern: str) -> pd.Series:
+    """Vectorized :func:`_convert_section`."""
+    s = _text(sections)
+    if target_pattern == 'letters':
+        mapped = s.map(_DIGIT_TO_LETTER)
+        out = mapped.where(mapped.notna(), s.str.upper())
+    elif target_pattern == 'numbers':
+        mapped = s.map(_LETTER_TO_NUMBER)
+        out = mapped.where(mapped.notna(), s)
     else:
-        df['Student Name (Arabic)'] = ''
+        out = s
+    out = out.mask(s.str.upper() == 'ADV', 'ADV')
+    result = pd.Series(out.to_numpy(dtype=object), index=sections.index, dtype=object)
+    result[sections.isna().to_numpy()] = None
+    return _scalar_fallback(result, sections.where(sections.notna(), ''),
+                            lambda v: _convert_section(v, target_pattern))
 
-    # Clean gender
-    df['Gender'] = df['Gender'].apply(_clean_gender)
 
-    # Clean date of birth
-    df['Date Of Birth'] = df['Date Of Birth'].apply(_clean_date)
+def _convert_section_by_group_series(sections: pd.Series, groups: np.ndarray,
+                                     patterns: Dict[int, str]) -> pd.Series:
+    """Convert each section to the pattern of its group (``'letters'`` if unknown).
 
-    # Clean grade
-    df['Grade'] = df['Grade'].apply(lambda v: _clean_grade(str(v)) if pd.notnull(v) else None)
+    The rows are split by target pattern and each part is converted with
+    :func:`_convert_section_series`.
+    """
+    numbers = pd.Series(groups).map(patterns).eq('numbers').to_numpy()
+    out = np.empty(len(sections), dtype=object)
+    for target, rows in (('letters', ~numbers), ('numbers', numbers)):
+        if rows.any():
+            out[rows] = _convert_section_series(sections[rows], target).to_numpy()
+    return pd.Series(out, index=sections.index, dtype=object)
+
+
+# Rules resolving ``Import Email``, tried in order; the first rule whose
+# column holds a non-empty email wins.  A rule with domains only matches
+# emails ending in one of them (compared in lower case).  The defaults
+# prefer a student's government address, then any student, parent or
+# generic email.
+IMPORT_EMAIL_RULES: List[Tuple[str, Tuple[str, ...]]] = [
+    ('Student Email', ('@ese.gov.ae',)),
+    ('Student Email', ()),
+    ('Parent Email', ()),
+    ('Email', ()),
+]
 
-    # Clean section (basic normalisation)
-    df['Section'] = df['Section'].apply(lambda v: _clean_section(str(v)) if pd.notnull(v) else None)
 
-    # Clean nationality
-    df['Nationality'] = df['Nationality'].apply(_clean_nationality)
+def _choose_import_email(df: pd.DataFrame,
+                         rules: List[Tuple[str, Tuple[str, ...]]] = IMPORT_EMAIL_RULES
+                         ) -> pd.Series:
+    """Pick the import email of every row by priority over cleaned email columns.
+
+    Replaces a row-wise ``apply``: each rule becomes a boolean mask and
+    ``np.select`` takes, per row, the value of the first matching rule
+    (``''`` when none match).  Columns missing from ``df`` never match.
+    Domains are compared in lower case, but the value picked is the
+    column's own.
+    """
+    conditions, choices = [], []
+    for column, domains in rules:
+        if column not in df.columns:
+            continue
+        values = _text(df[column])
+        match = values.ne('') & values.notna()
+        if domains:
+            suffixes = tuple(d.lower() for d in domains)
+            match &= values.str.lower().str.endswith(suffixes, na=False)
+        conditions.append(match.to_numpy(dtype=bool))
+        choices.append(values.to_numpy(dtype=object))
+    chosen = np.select(conditions, choices, default='') if conditions else ''
+    return pd.Series(chosen, index=df.index, dtype=object)
+
+
+def _clean_text_series(values: pd.Series) -> pd.Series:
+    """Free text kept as typed; missing values become ``''``."""
+    return values.fillna('').astype(str)
+
+
+def _clean_stripped_series(values: pd.Series) -> pd.Series:
+    """Free text without surrounding whitespace (e.g. passport numbers)."""
+    return _clean_text_series(values).str.strip()
+
+
+def _clean_email_series(values: pd.Series) -> pd.Series:
+    """Email addresses, stripped and lower-cased."""
+    return _clean_stripped_series(values).str.lower()
+
+
+# Column-level implementations of the cleaning rules used by
+# ``_normalise_dataframe``.  ``'scalar'`` applies the helpers above cell by
+# cell and is kept as the reference implementation; ``'vectorized'`` works
+# on whole columns and produces identical values, except for the ISO and
+# Excel dates described in ``_clean_date_series``.
+NORMALISATION_ENGINES = {
+    'scalar': {
+        'name': lambda s: s.apply(_clean_name),
+        'gender': lambda s: s.apply(_clean_gender),
+        'date': lambda s: s.apply(_clean_date),
+        'grade': lambda s: s.apply(lambda v: _clean_grade(str(v)) if pd.notnull(v) else None),
+        'section': lambda s: s.apply(lambda v: _clean_section(str(v)) if pd.notnull(v) else None),
+        'nationality': lambda s: s.apply(_clean_nationality),
+        'phone': lambda s: s.apply(_clean_phone),
+        'phone_list': lambda s: s.apply(_clean_phones),
+        'citizenship': lambda s: s.apply(_derive_citizenship_status),
+        'cycle': lambda s: s.apply(_derive_cycle),
+        'emirates_id': lambda s: s.apply(_clean_emirates_id),
+        'emirates_id_status': lambda s, dob: pd.Series(
+            [_emirates_id_status(e, d) for e, d in zip(s, dob)], index=s.index, dtype=object),
+        'text': _clean_text_series,
+        'strip': _clean_stripped_series,
+        'email': _clean_email_series,
+        'detect_section': lambda s: _detect_section_pattern(s.dropna().tolist()),
+        'convert_section': lambda s, p: s.apply(lambda v: _convert_section(v, p)),
+        'detect_section_by_group': lambda s, g: _detect_section_pattern_by_group(s.tolist(), g),
+        'convert_section_by_group': lambda s, g, p: pd.Series(
+            [_convert_section(v, p.get(int(k), 'letters')) for v, k in zip(s, g)],
+            index=s.index, dtype=object),
+    },
+    'vectorized': {
+        'name': _clean_name_series,
+        'gender': _clean_gender_series,
+        'date': _clean_date_series,
+        'grade': _clean_grade_series,
+        'section': _clean_section_series,
+        'nationality': _clean_nationality_series,
+        'phone': _clean_phone_series,
+        'phone_list': _clean_phone_lists_series,
+        'citizenship': _derive_citizenship_status_series,
+        'cycle': _derive_cycle_series,
+        'emirates_id': _clean_emirates_id_series,
+        'emirates_id_status': _emirates_id_status_series,
+        'text': _clean_text_series,
+        'strip': _clean_stripped_series,
+        'email': _clean_email_series,
+        'detect_section': _detect_section_pattern_series,
+        'convert_section': _convert_section_series,
+        'detect_section_by_group': _detect_section_pattern_by_group_series,
+        'convert_section_by_group': _convert_section_by_group_series,
+    },
+}
+
+
+###############################################################################
+# Per-stage profiling
+###############################################################################
+
+class StageProfiler:
+    """Record wall time, rows and memory of pipeline stages per file.
+
+    Stages are flat: reading, column mapping, every engine cleaner (via
+    :meth:`wrap`), import-email selection, import formatting and CSV
+    export.  Repeated calls of a stage for the same file (chunks of a
+    streamed CSV, the two phone columns) are summed into one record.
+    Work served from a ``CleanerCache`` is included in the cleaner's
+    time; files served from a ``ResultCache`` record nothing.
+
+    With ``trace_memory`` each stage runs under ``tracemalloc``, which
+    reports the memory still allocated at the end of the stage
+    (``mem_delta_mb``) and its peak (``peak_mb``) but slows Python-level
+    allocation noticeably; without it both are ``None``.  ``tracemalloc``
+    is process-wide, so memory figures are only meaningful while one
+    thread at a time runs stages.
+
+    The current file (see :meth:`file`) is kept per thread, so stages run
+    on reader threads are attributed to the file they work on.
+    """
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self._local = threading.local()
+        self._records: 'OrderedDict[Tuple[str, str], dict]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @contextmanager
+    def file(self, name: str):
+        """Attribute the stages run inside the block to file ``name``."""
+        previous = getattr(self._local, 'file', '')
+        self._local.file = name
+        try:
+            yield
+        finally:
+            self._local.file = previous
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0):
+        """Time the block as stage ``name``.
+
+        Yields a dict whose ``'rows'`` may be updated inside the block when
+        the row count is only known afterwards (e.g. after reading).
+        """
+        info = {'rows': rows}
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            yield info
+        finally:
+            seconds = time.perf_counter() - started
+            delta = peak = None
+            if tracing:
+                delta, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            self._add(name, seconds, info['rows'], delta, peak)
+
+    def _add(self, name: str, seconds: float, rows: int,
+             delta: Optional[int], peak: Optional[int]) -> None:
+        file = getattr(self._local, 'file', '')
+        with self._lock:
+            record = self._records.setdefault((file, name), {
+                'file': file, 'stage': name, 'calls': 0, 'seconds': 0.0,
+                'rows': 0, 'mem_delta_mb': None, 'peak_mb': None,
+            })
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['rows'] += rows
+            if delta is not None:
+                record['mem_delta_mb'] = (record['mem_delta_mb'] or 0.0) + delta / 2 ** 20
+                record['peak_mb'] = max(record['peak_mb'] or 0.0, peak / 2 ** 20)
+
+    def wrap(self, cleaners: dict) -> dict:
+        """Return a copy of an engine table that records each entry as ``clean:<field>``."""
+        def timed(field, func):
+            def run(values, *args):
+                with self.stage(f'clean:{field}', len(values)):
+                    return func(values, *args)
+            return run
+        return {field: timed(field, func) for field, func in cleaners.items()}
+
+    def records(self) -> List[dict]:
+        """One dict per (file, stage), in the order stages first ran."""
+        with self._lock:
+            return [dict(record) for record in self._records.values()]
+
+    def frame(self) -> pd.DataFrame:
+        """Records as a DataFrame, with throughput in rows per second."""
+        df = pd.DataFrame(self.records(), columns=['file', 'stage', 'calls', 'seconds', 'rows',
+                                                   'mem_delta_mb', 'peak_mb'])
+        df.insert(5, 'rows_per_s', (df['rows'] / df['seconds']).where(df['seconds'] > 0))
+        return df
+
+    def to_json(self, **kwargs) -> str:
+        """Records as a JSON array (extra keyword arguments go to ``json.dumps``)."""
+        return json.dumps(self.records(), **kwargs)
+
+
+def _profile_stage(profiler: Optional[StageProfiler], name: str, rows: int = 0):
+    """``profiler.stage(name, rows)``, or a no-op context when not profiling."""
+    return profiler.stage(name, rows) if profiler is not None else nullcontext({'rows': rows})
+
+
+###############################################################################
+# Memoization of cleaner results
+###############################################################################
+
+# Default number of (engine, field, raw value) results kept by a ``CleanerCache``.
+CLEANER_CACHE_SIZE = 200_000
+
+# Engine entries that map each value independently and can be memoized.
+_MEMOIZED_FIELDS = (
+    'name', 'gender', 'date', 'grade', 'section', 'nationality', 'phone',
+    'citizenship',
+)
+
+
+class CleanerCache:
+    """Bounded LRU memo of cleaner results keyed by engine, field and raw value.
+
+    Each column is factorized; only distinct string values missing from the
+    cache are passed to the engine's column cleaner, and the results are
+    broadcast back through the factorization codes.  Cleaning cost thus
+    scales with the number of distinct values instead of rows, and a
+    single instance may be shared by every file of a batch.
+
+    Missing cells are cleaned once per column.  Other non-string cells
+    (rare with ``dtype=str`` readers) bypass the cache because values such
+    as ``5`` and ``5.0`` compare equal but do not clean alike.  Reports a
+    cleaner attaches to ``Series.attrs`` (such as ``date_formats``) only
+    describe the values that were actually cleaned, not cache hits.
+
+    The engine is part of every key, since the engines may clean a value
+    differently (see ``NORMALISATION_ENGINES``).  Instances are not
+    thread-safe: keep each one to a single thread, as the app (whose
+    prefetch threads only read files) and the batch worker processes do.
+    """
+
+    def __init__(self, max_entries: int = CLEANER_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, str, str], object]' = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clean(self, field: str, cleaner, values: pd.Series,
+              engine: str = 'vectorized') -> pd.Series:
+        """Clean ``values`` with ``cleaner``, reusing cached results of ``engine``."""
+        arr = values.to_numpy(dtype=object)
+        missing = pd.isna(arr)
+        if pd.api.types.infer_dtype(arr, skipna=True) in {'string', 'empty'}:
+            keyed = ~missing
+        else:
+            keyed = np.fromiter((isinstance(v, str) for v in arr), dtype=bool, count=len(arr))
+        codes, uniques = pd.factorize(arr[keyed])
+
+        results = np.empty(len(uniques), dtype=object)
+        todo = []
+        for i, value in enumerate(uniques):
+            key = (engine, field, value)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                results[i] = self._entries[key]
+            else:
+                todo.append(i)
+        attrs = {}
+        if todo:
+            fresh_series = cleaner(pd.Series(uniques[todo], dtype=object))
+            attrs = fresh_series.attrs
+            fresh = fresh_series.to_numpy(dtype=object)
+            results[todo] = fresh
+            for i, result in zip(todo, fresh):
+                self._entries[(engine, field, uniques[i])] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        out = np.empty(len(arr), dtype=object)
+        out[keyed] = results[codes]
+        calls = len(todo)
+        if missing.any():
+            out[missing] = cleaner(values[missing][:1]).iloc[0]
+            calls += 1
+        other = ~keyed & ~missing
+        if other.any():
+            out[other] = cleaner(values[other]).to_numpy(dtype=object)
+            calls += int(other.sum())
+
+        stats = self._stats.setdefault(field, {'rows': 0, 'distinct': 0, 'hits': 0, 'calls': 0})
+        stats['rows'] += len(arr)
+        stats['distinct'] += len(uniques)
+        stats['hits'] += len(uniques) - len(todo)
+        stats['calls'] += calls
+        result = pd.Series(out, index=values.index, dtype=object)
+        result.attrs.update(attrs)
+        return result
+
+    def wrap(self, cleaners: dict, engine: str) -> dict:
+        """Return a copy of ``engine``'s table whose per-value cleaners use this cache."""
+        wrapped = dict(cleaners)
+        for field in _MEMOIZED_FIELDS:
+            wrapped[field] = lambda s, f=field, c=cleaners[field]: self.clean(f, c, s, engine)
+        convert = cleaners['convert_section']
+        wrapped['convert_section'] = lambda s, p: self.clean(
+            f'convert_section:{p}', lambda v: convert(v, p), s, engine)
+        return wrapped
+
+    def stats_frame(self) -> pd.DataFrame:
+        """Summarise usage per field.
+
+        ``hit_rate`` is the share of distinct values answered from the
+        cache; ``calls_saved`` is the share of rows that did not need their
+        own cleaner evaluation.
+        """
+        rows = []
+        for field, s in self._stats.items():
+            rows.append({
+                'field': field,
+                'rows': s['rows'],
+                'distinct': s['distinct'],
+                'hits': s['hits'],
+                'calls': s['calls'],
+                'hit_rate': s['hits'] / s['distinct'] if s['distinct'] else 0.0,
+                'calls_saved': 1 - s['calls'] / s['rows'] if s['rows'] else 0.0,
+            })
+        return pd.DataFrame(rows, columns=['field', 'rows', 'distinct', 'hits', 'calls',
+                                           'hit_rate', 'calls_saved'])
+
+
+def _engine_cleaners(engine: str, cache: Optional[CleanerCache] = None,
+                     profiler: Optional[StageProfiler] = None) -> dict:
+    """Look up an engine table, wrapped by ``cache`` and ``profiler`` when given."""
+    try:
+        cleaners = NORMALISATION_ENGINES[engine]
+    except KeyError:
+        raise ValueError(f'Unknown normalisation engine: {engine!r}') from None
+    if cache is not None:
+        cleaners = cache.wrap(cleaners, engine)
+    if profiler is not None:
+        cleaners = profiler.wrap(cleaners)
+    return cleaners
+
+
+###############################################################################
+# Declarative normalisation plan
+###############################################################################
+
+# The cleaning rules as data, in import column order.  Each rule produces
+# the normalised column ``column`` with the engine cleaner ``cleaner``
+# (a key of ``NORMALISATION_ENGINES``; none passes the value through)
+# applied to either the raw input column ``source`` (after ``SYNONYMS``)
+# or the already cleaned ``derive`` columns of other rules.  ``header``
+# names the column in the import file, written per ``format``: ``'text'``
+# (the default; missing values become ``''``), ``'str'`` (any value as
+# text) or ``'integer'``.  Rules with an ``option`` only run when the
+# caller enables it.  ``'import_email'`` is the one cleaner that is not an
+# engine entry: it applies the ``email_rules`` to its ``derive`` columns.
+# The same list can be read from a JSON file with ``_load_rule_plan``.
+NORMALISATION_PLAN: List[dict] = [
+    {'column': 'Student No', 'source': 'Student No', 'header': 'Student No', 'format': 'str'},
+    {'column': 'Student Name', 'source': 'Student Name', 'cleaner': 'name',
+     'header': 'Student Name'},
+    {'column': 'Student Name (Arabic)', 'source': 'Student Name (Arabic)', 'cleaner': 'text',
+     'header': 'Student Name (Arabic)'},
+    {'column': 'Grade', 'source': 'Grade', 'cleaner': 'grade', 'header': 'Grade',
+     'format': 'integer'},
+    {'column': 'Section', 'source': 'Section', 'cleaner': 'section',
+     'header': 'Section / Home Room'},
+    {'column': 'Gender', 'source': 'Gender', 'cleaner': 'gender', 'header': 'Gender'},
+    {'column': 'Citizenship Status', 'derive': ['Nationality'], 'cleaner': 'citizenship',
+     'header': 'Nationality Group / Citizenship Status'},
+    {'column': 'Nationality', 'source': 'Nationality', 'cleaner': 'nationality',
+     'header': 'Nationality'},
+    {'column': 'Date Of Birth', 'source': 'Date Of Birth', 'cleaner': 'date',
+     'header': 'Date Of Birth'},
+    {'column': 'Parent Phone', 'source': 'Parent Phone', 'cleaner': 'phone',
+     'header': 'Parent Phone'},
+    {'column': 'Student Phone', 'source': 'Student Phone', 'cleaner': 'phone',
+     'header': 'Student Phone'},
+    {'column': 'Emirate Id', 'source': 'Emirate Id', 'cleaner': 'emirates_id',
+     'header': 'Emirate Id'},
+    {'column': 'Passport', 'source': 'Passport', 'cleaner': 'strip', 'header': 'Passport'},
+    {'column': 'Home Address', 'source': 'Home Address', 'cleaner': 'strip',
+     'header': 'Home Address'},
+    {'column': 'Student Email', 'source': 'Student Email', 'cleaner': 'email'},
+    {'column': 'Parent Email', 'source': 'Parent Email', 'cleaner': 'email'},
+    {'column': 'Email', 'source': 'Email', 'cleaner': 'email'},
+    {'column': 'Import Email', 'derive': ['Student Email', 'Parent Email', 'Email'],
+     'cleaner': 'import_email', 'header': 'Email'},
+    {'column': 'Emirate Id Status', 'derive': ['Emirate Id', 'Date Of Birth'],
+     'cleaner': 'emirates_id_status'},
+    {'column': 'Cycle', 'derive': ['Grade'], 'cleaner': 'cycle'},
+    {'column': 'Parent Phone Numbers', 'source': 'Parent Phone', 'cleaner': 'phone_list',
+     'option': 'keep_all_phones'},
+    {'column': 'Student Phone Numbers', 'source': 'Student Phone', 'cleaner': 'phone_list',
+     'option': 'keep_all_phones'},
+]
 
-    # Derive citizenship status from nationality
-    df['Citizenship Status'] = df['Nationality'].apply(_derive_citizenship_status)
+IMPORT_COLUMN_FORMATS = ('text', 'str', 'integer')
 
-    # Clean phones: Parent and Student
-    df['Parent Phone'] = df['Parent Phone'].apply(_clean_phone)
-    df['Student Phone'] = df['Student Phone'].apply(_clean_phone)
 
-    # Clean email fields
-    df['Student Email'] = df['Student Email'].fillna('').astype(str).str.strip().str.lower()
-    df['Parent Email'] = df['Parent Email'].fillna('').astype(str).str.strip().str.lower()
-    df['Email'] = df['Email'].fillna('').astype(str).str.strip().str.lower()
+def _load_rule_plan(path) -> List[dict]:
+    """Read a rule plan shaped like ``NORMALISATION_PLAN`` from a JSON file.
 
-    # Clean Emirate Id, Passport, Home Address (remove whitespace)
-    df['Emirate Id'] = df['Emirate Id'].fillna('').astype(str).str.strip()
-    df['Passport'] = df['Passport'].fillna('').astype(str).str.strip()
-    df['Home Address'] = df['Home Address'].fillna('').astype(str).str.strip()
+    Only the structure is checked here; ``_compile_rule_plan`` validates
+    the rules themselves.
+    """
+    with open(path, encoding='utf-8') as f:
+        plan = json.load(f)
+    if not isinstance(plan, list) or not all(isinstance(rule, dict) for rule in plan):
+        raise ValueError(f'{path}: a rule plan must be a JSON list of objects')
+    return plan
+
+
+def _rule_plan_digest(plan: List[dict]) -> str:
+    """Short digest of a rule plan, to key cached results cleaned with it."""
+    text = json.dumps(plan, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _compile_rule_plan(plan: List[dict], columns, cleaners: dict,
+                       options=()) -> List[Tuple[dict, str]]:
+    """Order the rules of ``plan`` for an input frame with ``columns``.
+
+    Rules whose ``option`` is not in ``options`` are dropped and the rest
+    are sorted so that every column is cleaned once, before the rules
+    deriving from it; otherwise the declared order is kept.  Each rule is
+    paired with how it runs: ``'source'`` on its input column,
+    ``'missing'`` when that column is absent (the cleaner then runs on a
+    single missing value whose result fills the column) or ``'derive'``.
+
+    Raises
+    ------
+    ValueError
+        For malformed rules, unknown cleaners or formats, two rules
+        producing the same column, derivations from columns that no rule
+        produces and circular derivations.
+    """
+    rules = [rule for rule in plan if rule.get('option') is None or rule['option'] in options]
+    produced = set()
+    for rule in rules:
+        column = rule.get('column')
+        if not column:
+            raise ValueError(f'Rule without a column: {rule!r}')
+        if column in produced:
+            raise ValueError(f'Column {column!r} is produced by more than one rule')
+        produced.add(column)
+        if ('source' in rule) == ('derive' in rule):
+            raise ValueError(f'Rule for {column!r} needs exactly one of source and derive')
+        cleaner = rule.get('cleaner')
+        if cleaner is not None and cleaner != 'import_email' and cleaner not in cleaners:
+            raise ValueError(f'Unknown cleaner {cleaner!r} for {column!r}')
+        if 'derive' in rule and cleaner is None:
+            raise ValueError(f'Derived column {column!r} needs a cleaner')
+        if rule.get('format', 'text') not in IMPORT_COLUMN_FORMATS:
+            raise ValueError(f'Unknown import format {rule["format"]!r} for {column!r}')
+    for rule in rules:
+        unknown = [c for c in rule.get('derive', ()) if c not in produced]
+        if unknown:
+            raise ValueError(f'{rule["column"]!r} derives from {unknown}, which no rule produces')
+
+    present = set(columns)
+    steps, done, pending = [], set(), list(rules)
+    while pending:
+        ready = next((rule for rule in pending
+                      if all(c in done for c in rule.get('derive', ()))), None)
+        if ready is None:
+            raise ValueError('Circular derivation between '
+                             + ', '.join(repr(rule['column']) for rule in pending))
+        pending.remove(ready)
+        done.add(ready['column'])
+        if 'derive' in ready:
+            steps.append((ready, 'derive'))
+        else:
+            steps.append((ready, 'source' if ready['source'] in present else 'missing'))
+    return steps
+
+
+def _clean_dataframe(df: pd.DataFrame, engine: str = 'vectorized',
+                     cache: Optional[CleanerCache] = None,
+                     keep_all_phones: bool = False,
+                     email_rules: List[Tuple[str, Tuple[str, ...]]] = IMPORT_EMAIL_RULES,
+                     profiler: Optional[StageProfiler] = None,
+                     plan: List[dict] = NORMALISATION_PLAN) -> pd.DataFrame:
+    """Option-independent stage of ``_normalise_dataframe``.
+
+    Runs every rule that does not depend on the section pattern option;
+    ``Section`` is cleaned but not yet converted (see
+    ``_apply_section_pattern``).  The result can therefore be cached and
+    reused when only the option changes.
+
+    The rules come from ``plan`` (see ``NORMALISATION_PLAN``), compiled by
+    ``_compile_rule_plan``.  Every cleaner result is collected first and
+    the frame is assembled once: input columns keep their position (with
+    cleaned values where a rule produces them) and new columns follow in
+    plan order.  Columns missing from the input are not materialised
+    before cleaning, only filled with the cleaner's value for a missing
+    cell.
+    """
+    cleaners = _engine_cleaners(engine, cache, profiler)
+    options = ('keep_all_phones',) if keep_all_phones else ()
 
+    # Rename columns based on synonyms
+    with _profile_stage(profiler, 'standardise_columns', len(df)):
+        df = _standardise_column_names(df.copy(deep=False))
+    steps = _compile_rule_plan(plan, df.columns, cleaners, options)
+
+    cleaned: Dict[str, pd.Series] = {}
+    attrs = dict(df.attrs)
+    for rule, mode in steps:
+        cleaner = rule.get('cleaner')
+        if mode == 'derive':
+            args = [cleaned[column] for column in rule['derive']]
+            if cleaner == 'import_email':
+                with _profile_stage(profiler, 'import_email', len(df)):
+                    emails = pd.DataFrame({column: values.to_numpy()
+                                           for column, values in zip(rule['derive'], args)},
+                                          index=df.index)
+                    values = _choose_import_email(emails, email_rules)
+            else:
+                values = cleaners[cleaner](*args)
+        elif mode == 'source':
+            values = df[rule['source']]
+            if cleaner is not None:
+                values = cleaners[cleaner](values)
+        else:
+            value = None
+            if cleaner is not None:
+                value = cleaners[cleaner](pd.Series([None], dtype=object)).iloc[0]
+            if isinstance(value, list):  # a list per row, not one shared by all rows
+                values = pd.Series([list(value) for _ in range(len(df))], index=df.index,
+                                   dtype=object)
+            else:
+                values = pd.Series([value] * len(df), index=df.index, dtype=object)
+        attrs.update(values.attrs)
+        cleaned[rule['column']] = values
+
+    data = {}
+    for position, column in enumerate(df.columns):
+        data.setdefault(column, df.iloc[:, position])
+    data.update(cleaned)
+    result = pd.DataFrame({column: values.array for column, values in data.items()},
+                          index=df.index, copy=False)
+    result.attrs = attrs
+    return result
+
+
+# Scopes of the ``'auto'`` section vote: one vote over the whole file, or
+# one per grade for files that mix conventions (e.g. letters in Cycle 1 and
+# numbers in Cycle 3).  Rows without a grade vote together.
+SECTION_SCOPES = ('file', 'grade')
+
+
+def _apply_section_pattern(df: pd.DataFrame, section_pattern_option,
+                           engine: str = 'vectorized',
+                           cache: Optional[CleanerCache] = None,
+                           profiler: Optional[StageProfiler] = None,
+                           section_scope: str = 'file') -> pd.DataFrame:
+    """Option-dependent stage of ``_normalise_dataframe``.
+
+    Resolves the section pattern on an output of ``_clean_dataframe`` and
+    converts ``Section`` to it.  A shallow copy is returned and ``df`` is
+    left untouched, so one cleaned frame serves every option.  With
+    ``section_scope='grade'`` the ``'auto'`` vote is held per grade; a dict
+    option gives such per-grade patterns directly (see
+    ``_stream_csv_to_import``).  When a rule plan leaves out ``Grade``, the
+    vote is held over the whole column and a dict option applies its
+    pattern for rows without a grade to every row.
+    """
+    cleaners = _engine_cleaners(engine, cache, profiler)
+    df = df.copy(deep=False)
+    if 'Section' not in df.columns:
+        return df  # a rule plan without sections
+    has_grade = 'Grade' in df.columns
+    if isinstance(section_pattern_option, dict) or (
+            section_pattern_option == 'auto' and section_scope == 'grade' and has_grade):
+        groups = (_section_group_keys(df['Grade']) if has_grade
+                  else np.full(len(df), -1, dtype=np.int64))
+        patterns = section_pattern_option
+        if not isinstance(patterns, dict):
+            patterns = cleaners['detect_section_by_group'](df['Section'], groups)
+        df['Section'] = cleaners['convert_section_by_group'](df['Section'], groups, patterns)
+        return df
     # Determine section pattern
-    section_values = df['Section'].dropna().tolist()
     if section_pattern_option == 'auto':
-        pattern = _detect_section_pattern(section_values)
+        pattern = cleaners['detect_section'](df['Section'])
     elif section_pattern_option == 'letters':
         pattern = 'letters'
     else:
         pattern = 'numbers'
     # Convert section values
-    df['Section'] = df['Section'].apply(lambda v: _convert_section(v, pattern))
-
-    # Derive cycle
-    df['Cycle'] = df['Grade'].apply(_derive_cycle)
-
-    # Determine import email: prioritise Student Email ending with @ese.gov.ae
-    def choose_email(row):
-        student_email = row.get('Student Email') or ''
-        parent_email = row.get('Parent Email') or ''
-        generic_email = row.get('Email') or ''
-        # prefer government email for student
-        if student_email and student_email.endswith('@ese.gov.ae'):
-            return student_email
-        # if student email exists (non-gov), use it
-        if student_email:
-            return student_email
-        # else use parent email
-        if parent_email:
-            return parent_email
-        # else use generic email if provided
-        if generic_email:
-            return generic_email
-        return ''
-    df['Import Email'] = df.apply(choose_email, axis=1)
+    df['Section'] = cleaners['convert_section'](df['Section'], pattern)
+    return df
+
+
+def _normalise_dataframe(df: pd.DataFrame, section_pattern_option: str,
+                         engine: str = 'vectorized',
+                         cache: Optional[CleanerCache] = None,
+                         keep_all_phones: bool = False,
+                         email_rules: List[Tuple[str, Tuple[str, ...]]] = IMPORT_EMAIL_RULES,
+                         profiler: Optional[StageProfiler] = None,
+                         compact: bool = False,
+                         section_scope: str = 'file',
+                         plan: List[dict] = NORMALISATION_PLAN) -> pd.DataFrame:
+    """Apply normalisation rules to the DataFrame.
 
+    The function standardises column names, cleans individual fields,
+    derives additional columns and resolves sections to a consistent
+    pattern.  A new DataFrame is returned with columns relevant to
+    import.  Any extra columns from the input are preserved unless they
+    conflict with the import template.  It chains ``_clean_dataframe`` and
+    ``_apply_section_pattern``, which callers may use separately to reuse
+    the cleaned frame when only the section option changes.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The raw DataFrame extracted from the uploaded file.
+    section_pattern_option : str
+        One of ``'auto'``, ``'letters'`` or ``'numbers'``.  ``'auto'``
+        performs a majority vote detection on the section column; the
+        others force conversion to the specified pattern.  A dict maps
+        grade keys to already resolved patterns (see
+        ``_apply_section_pattern``).
+    engine : str, optional
+        Key of ``NORMALISATION_ENGINES``.  ``'vectorized'`` (the default)
+        cleans whole columns at once; ``'scalar'`` applies the reference
+        helpers cell by cell.
+    cache : CleanerCache, optional
+        Memo shared across calls (typically every file of a batch); when
+        given, each cleaner only sees distinct values it has not cleaned
+        before.
+    keep_all_phones : bool, optional
+        Also add ``Parent Phone Numbers`` and ``Student Phone Numbers``
+        list columns holding every number of multi-number cells (the
+        ``Phone`` columns keep only the first one, as the import expects).
+    email_rules : list of (column, domains), optional
+        Priority rules for ``Import Email``; see ``IMPORT_EMAIL_RULES``.
+    profiler : StageProfiler, optional
+        Records the time (and memory) of column mapping and each cleaner.
+    compact : bool, optional
+        Return compact dtypes (see ``_compact_dataframe``) instead of
+        ``object`` columns.  The finished frame is converted, so this
+        shrinks the frames kept afterwards, not the peak memory while
+        normalising.
+    section_scope : str, optional
+        One of ``SECTION_SCOPES``.  ``'grade'`` holds the ``'auto'`` vote
+        separately for every grade instead of once for the file.
+    plan : list of dict, optional
+        The cleaning rules; see ``NORMALISATION_PLAN``.
+
+    Returns
+    -------
+    pandas.DataFrame
+        A new DataFrame with normalised columns and values.
+    """
+    df = _apply_section_pattern(
+        _clean_dataframe(df, engine=engine, cache=cache, keep_all_phones=keep_all_phones,
+                         email_rules=email_rules, profiler=profiler, plan=plan),
+        section_pattern_option, engine=engine, cache=cache, profiler=profiler,
+        section_scope=section_scope,
+    )
+    if compact:
+        with _profile_stage(profiler, 'compact', len(df)):
+            df = _compact_dataframe(df)
     return df
 
 
-def _to_import_format(df: pd.DataFrame) -> pd.DataFrame:
+def _import_column(values: pd.Series, fmt: str = 'text'):
+    """One import column in ``fmt`` (see ``IMPORT_COLUMN_FORMATS``).
+
+    ``'text'`` columns of ``object`` dtype come back as arrays that share
+    memory with ``values`` unless blanks had to be filled in.
+    """
+    if fmt == 'integer':
+        # via Int64: a column mixing grades and None may have been upcast to float
+        numbers = pd.to_numeric(values).astype('Int64')
+        return numbers.astype(str).where(numbers.notna(), '').array
+    if fmt == 'str':
+        return _fill_blank(values).astype(str).array
+    if values.dtype != object:
+        return _fill_blank(values).array
+    text = values.to_numpy()
+    missing = pd.isna(text)
+    if missing.any():
+        text = np.where(missing, '', text)
+    return text
+
+
+def _to_import_format(df: pd.DataFrame, compact: bool = False,
+                      plan: List[dict] = NORMALISATION_PLAN) -> pd.DataFrame:
     """Create a DataFrame in the exact format required for system import.
 
-    The output columns and their sources are:
+    The output columns are the ``header`` of the rules in ``plan`` that
+    have one, in order; with ``NORMALISATION_PLAN`` they and their sources
+    are:
 
     * ``Student No`` ← Student No
     * ``Student Name`` ← Student Name
@@ -742,42 +2327,1323 @@ def _to_import_format(df: pd.DataFrame) -> pd.DataFrame:
     * ``Home Address`` ← Home Address
     * ``Email`` ← Import Email
 
-    Missing or null values are filled with empty strings.
+    Missing or null values are filled with empty strings, as are columns
+    absent from ``df``.  The frame is built in one go and text columns
+    without blanks are not copied, so the result may share memory with
+    ``df``.
 
     Parameters
     ----------
     df : pandas.DataFrame
-        The normalised DataFrame.
+        The normalised DataFrame, in object or compact dtypes.
+    compact : bool, optional
+        Return the columns in compact dtypes (see ``_compact_dataframe``);
+        the CSV written from the result is the same either way.
+    plan : list of dict, optional
+        The rules ``df`` was normalised with.
 
     Returns
     -------
     pandas.DataFrame
         The DataFrame formatted for import.
     """
-    import_df = pd.DataFrame()
-    import_df['Student No'] = df['Student No'].fillna('').astype(str)
-    import_df['Student Name'] = df['Student Name'].fillna('')
-    import_df['Student Name (Arabic)'] = df['Student Name (Arabic)'].fillna('')
-    # Grade: convert None to blank string
-    import_df['Grade'] = df['Grade'].apply(lambda g: str(g) if pd.notnull(g) else '')
-    import_df['Section / Home Room'] = df['Section'].fillna('')
-    import_df['Gender'] = df['Gender'].fillna('')
-    import_df['Nationality Group / Citizenship Status'] = df['Citizenship Status'].fillna('')
-    import_df['Nationality'] = df['Nationality'].fillna('')
-    import_df['Date Of Birth'] = df['Date Of Birth'].fillna('')
-    import_df['Parent Phone'] = df['Parent Phone'].fillna('')
-    import_df['Student Phone'] = df['Student Phone'].fillna('')
-    import_df['Emirate Id'] = df['Emirate Id'].fillna('')
-    import_df['Passport'] = df['Passport'].fillna('')
-    import_df['Home Address'] = df['Home Address'].fillna('')
-    import_df['Email'] = df['Import Email'].fillna('')
+    data = {}
+    for rule in plan:
+        if rule.get('header'):
+            if rule['column'] in df.columns:
+                data[rule['header']] = _import_column(df[rule['column']],
+                                                      rule.get('format', 'text'))
+            else:
+                data[rule['header']] = np.full(len(df), '', dtype=object)
+    import_df = pd.DataFrame(data, index=df.index, copy=False)
+    if compact:
+        import_df = _compact_dataframe(import_df)
     return import_df
 
 
+###############################################################################
+# Compact in-memory representation
+###############################################################################
+
+# Low-cardinality text columns (normalised and import names) kept as
+# categoricals in compact mode.
+COMPACT_CATEGORY_COLUMNS = (
+    'Gender', 'Nationality', 'Citizenship Status', 'Cycle', 'Section', 'Grade',
+    'Emirate Id Status',
+    'Section / Home Room', 'Nationality Group / Citizenship Status',
+)
+# Dtype for the remaining text columns in compact mode: Arrow-backed strings
+# when pyarrow is installed; without it text columns stay ``object``.
+COMPACT_STRING_DTYPE = pd.StringDtype('pyarrow') if pa is not None else None
+
+
+def _fill_blank(values: pd.Series) -> pd.Series:
+    """``values.fillna('')`` that also works on categoricals without a ``''`` category."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        if not values.isna().any():
+            return values
+        if '' not in values.cat.categories:
+            values = values.cat.add_categories([''])
+    return values.fillna('')
+
+
+def _compact_series(name: str, values: pd.Series) -> pd.Series:
+    """Compact dtype for one column, or ``values`` itself when it should stay as is."""
+    if values.dtype != object:
+        return values
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if name == 'Grade' and kind in ('integer', 'floating', 'mixed-integer-float'):
+        return pd.to_numeric(values).astype('Int8')
+    if kind not in ('string', 'empty'):
+        return values  # e.g. the phone list columns
+    if name in COMPACT_CATEGORY_COLUMNS:
+        return values.astype('category')
+    if COMPACT_STRING_DTYPE is not None:
+        return values.astype(COMPACT_STRING_DTYPE)
+    return values
+
+
+def _compact_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """Return ``df`` with compact column dtypes.
+
+    Columns named in ``COMPACT_CATEGORY_COLUMNS`` become categoricals,
+    the integer ``Grade`` of a normalised frame becomes a nullable
+    ``Int8`` and other text columns use ``COMPACT_STRING_DTYPE``.  Every
+    string cell of an ``object`` column is a separate Python object, so
+    this typically shrinks a normalised roster several times over;
+    ``_to_import_format`` and ``to_csv`` produce the same output from
+    either form.
+
+    The bytes saved per column are listed in
+    ``result.attrs['compact_report']`` (see ``_compact_report_frame``).
+    Only finished frames are converted: the cleaners still work on
+    ``object`` columns, so the peak memory of normalising a roster is
+    unchanged and what shrinks is the frames held afterwards (the
+    ``ResultCache`` entries and the sources of consolidated exports).
+    """
+    out = df.copy(deep=False)
+    report = []
+    for i, name in enumerate(df.columns):
+        before = df.iloc[:, i]
+        after = _compact_series(name, before)
+        if after is before:
+            continue
+        out.isetitem(i, after)
+        bytes_before = int(before.memory_usage(index=False, deep=True))
+        bytes_after = int(after.memory_usage(index=False, deep=True))
+        report.append({
+            'column': name, 'dtype_before': str(before.dtype), 'dtype_after': str(after.dtype),
+            'bytes_before': bytes_before, 'bytes_after': bytes_after,
+            'bytes_saved': bytes_before - bytes_after,
+        })
+    out.attrs['compact_report'] = report
+    return out
+
+
+def _compact_report_frame(report: List[dict]) -> pd.DataFrame:
+    """``attrs['compact_report']`` as a DataFrame with a total row."""
+    columns = ['column', 'dtype_before', 'dtype_after', 'bytes_before', 'bytes_after',
+               'bytes_saved']
+    frame = pd.DataFrame(report, columns=columns)
+    total = {'column': 'total', 'dtype_before': '', 'dtype_after': ''}
+    for key in ('bytes_before', 'bytes_after', 'bytes_saved'):
+        total[key] = int(frame[key].sum())
+    return pd.concat([frame, pd.DataFrame([total])], ignore_index=True)
+
+
+###############################################################################
+# Cross-file deduplication
+###############################################################################
+
+# Import columns identifying a student.  Records sharing a value in any of
+# them (directly or through other records) are the same student, unless
+# their Student Nos differ.  Only full, valid Emirates IDs count.
+DEDUPE_KEYS = ['Student No', 'Emirate Id']
+
+DEDUPE_CONFLICT_COLUMNS = ['Student No', 'Emirate Id', 'Field', 'Kept Value', 'Kept From',
+                           'Other Values']
+
+
+def _read_streamed_import(source) -> pd.DataFrame:
+    """Read an import CSV written by the streaming path back as strings."""
+    source.seek(0)
+    return pd.read_csv(source, dtype=str, keep_default_na=False)
+
+
+def _comparable_key(values: pd.Series, column: str) -> pd.Series:
+    """Comparable form of a key column; empty keys become ``NaN``.
+
+    Emirates IDs are compared by their digits (``784-2010-1234567-1`` and
+    ``784201012345671`` match), student numbers case-insensitively with
+    surrounding whitespace removed.  With pyarrow the string operations
+    run as Arrow kernels, several times faster than on object columns.
+    """
+    key = _text(values.astype(object))
+    if COMPACT_STRING_DTYPE is not None:
+        key = key.astype(COMPACT_STRING_DTYPE)
+    if column == 'Emirate Id':
+        key = key.str.replace(r'\D', '', regex=True)
+    else:
+        key = key.str.strip().str.upper()
+    return key.where(key != '')
+
+
+def _dedupe_key(values: pd.Series, column: str,
+                status: Optional[pd.Series] = None) -> pd.Series:
+    """Key column as used to match records; unusable keys become ``NaN``.
+
+    As :func:`_comparable_key`, except that an Emirates ID only counts
+    when its digits form a full ``784`` number, so placeholders such as
+    ``0`` or ``N/A`` typed for unknown IDs match nothing.  When the
+    ``Emirate Id Status`` column is given as ``status``, the ID must also
+    be ``'valid'``.
+    """
+    key = _comparable_key(values, column)
+    if column != 'Emirate Id':
+        return key
+    usable = key.str.fullmatch(_EMIRATES_ID_DIGITS_RE.pattern).to_numpy(dtype=bool, na_value=False)
+    if status is not None:
+        usable &= (status.astype(object) == 'valid').to_numpy(dtype=bool)
+    return key.where(usable)
+
+
+def _without_shared_keys(key: pd.Series, student_no: pd.Series) -> pd.Series:
+    """Drop the ``key`` values held by records of different Student Nos.
+
+    Two records whose non-empty Student Nos differ are different students
+    even when they share an Emirates ID; linking them through it would
+    merge them, so such a value is not used as a key at all.  Records
+    without a Student No keep the value when every record holding it
+    has the same Student No (or none).
+    """
+    if not key.notna().any():
+        return key
+    owners = student_no.groupby(key).transform('nunique')
+    return key.where(owners.to_numpy(dtype=float, na_value=0) <= 1)
+
+
+def _student_clusters(keys: List[pd.Series]) -> np.ndarray:
+    """Group rows that share any non-empty key, transitively.
+
+    Each row starts labelled with its own position; every pass gives all
+    rows of a key value the smallest label among them and then follows
+    labels to their own label (pointer jumping), until nothing changes.
+    A pass is one hash group-by per key, and chains through both keys
+    are rare, so this stays linear in practice.  Returns, for every row,
+    the position of the first row of its cluster.
+    """
+    labels = np.arange(len(keys[0]))
+    codes = [pd.factorize(key)[0] for key in keys]
+    while True:
+        before = labels
+        for code in codes:
+            valid = code >= 0
+            if valid.any():
+                group_min = pd.Series(labels[valid]).groupby(code[valid]).transform('min')
+                labels = labels.copy()
+                labels[valid] = group_min.to_numpy()
+        labels = labels[labels]
+        if np.array_equal(labels, before):
+            return labels
+
+
+def _deduplicate_students(frames: List[pd.DataFrame], sources: List[str],
+                          priority: Optional[List[str]] = None,
+                          keys: List[str] = DEDUPE_KEYS) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Merge records of the same student across import frames.
+
+    Records are matched through hash indexes on the ``keys`` columns (see
+    :func:`_student_clusters`), ignoring placeholder Emirates IDs (see
+    :func:`_dedupe_key`) and never joining records with different
+    non-empty Student Nos, and each group is merged field by field:
+    the first non-empty value wins, taking records from sources listed in
+    ``priority`` first (in that order), then the remaining sources in the
+    order given, and records of one source in row order.  Every student
+    keeps the position of its first record, so frames without duplicates
+    come back exactly as concatenated.
+
+    Parameters
+    ----------
+    frames : list of pandas.DataFrame
+        Import frames (see ``_to_import_format``) with the same columns.
+    sources : list of str
+        A label for each frame, typically its file name.
+    priority : list of str, optional
+        Source labels whose values are preferred, most preferred first.
+    keys : list of str, optional
+        Identifying columns, ``DEDUPE_KEYS`` by default.
+
+    Returns
+    -------
+    tuple
+        ``(merged_df, conflicts)``: the deduplicated frame, and one row per
+        student and field where the records held different non-empty
+        values, with the value kept, its source and the values dropped.
+    """
+    priority = list(priority or [])
+    ranks = [priority.index(source) if source in priority else len(priority) + i
+             for i, source in enumerate(sources)]
+    combined = pd.concat(frames, ignore_index=True)
+    rank = np.repeat(ranks, [len(df) for df in frames])
+    source = np.repeat(np.array(sources, dtype=object), [len(df) for df in frames])
+    conflicts = pd.DataFrame(columns=DEDUPE_CONFLICT_COLUMNS)
+    if combined.empty:
+        return combined, conflicts
+    status = combined.get('Emirate Id Status')
+    key_values = [_dedupe_key(combined[key], key, status) for key in keys]
+    if 'Student No' in keys:
+        student_no = key_values[keys.index('Student No')]
+        key_values = [value if key == 'Student No' else _without_shared_keys(value, student_no)
+                      for key, value in zip(keys, key_values)]
+    labels = _student_clusters(key_values)
+    sizes = np.bincount(labels, minlength=len(labels))
+    duplicated = sizes[labels] > 1
+    if not duplicated.any():
+        return combined, conflicts
+
+    # Duplicate records in merge order: by student, source priority, row
+    positions = np.flatnonzero(duplicated)
+    order = positions[np.lexsort((positions, rank[positions], labels[positions]))]
+    records = combined.take(order).astype(object)
+    records = records.where(records != '')
+    group = labels[order]
+    merged = records.groupby(group, sort=False).first()
+    merged = merged.reindex(columns=combined.columns)
+    for col in merged.columns:
+        merged[col] = merged[col].fillna('')
+
+    singles = combined[~duplicated]
+    first_rows = np.flatnonzero(labels == np.arange(len(labels)))
+    result = pd.concat([singles, merged]).reindex(first_rows).reset_index(drop=True)
+
+    # Conflicts: fields with more than one distinct non-empty value (keys
+    # in their comparable form, so a reformatted Emirates ID is no conflict)
+    report = []
+    record_source = source[order]
+    for col in combined.columns:
+        compared = _comparable_key(records[col], col) if col in keys else records[col]
+        counts = compared.groupby(group, sort=False).nunique()
+        clashing = counts.index[counts.to_numpy() > 1]
+        if clashing.empty:
+            continue
+        rows = np.isin(group, clashing) & compared.notna().to_numpy()
+        values = pd.DataFrame({'group': group[rows], 'value': records[col].to_numpy()[rows],
+                               'compared': compared.to_numpy()[rows],
+                               'source': record_source[rows]})
+        values = values.drop_duplicates(['group', 'compared'])
+        kept = ~values['group'].duplicated()
+        dropped = values[~kept]
+        others = (dropped['value'].astype(str) + ' (' + dropped['source'] + ')'
+                  ).groupby(dropped['group'], sort=False).agg('; '.join)
+        kept = values[kept].set_index('group')
+        report.append(pd.DataFrame({
+            'Student No': merged.loc[kept.index, 'Student No'].to_numpy(),
+            'Emirate Id': merged.loc[kept.index, 'Emirate Id'].to_numpy(),
+            'Field': col,
+            'Kept Value': kept['value'].to_numpy(),
+            'Kept From': kept['source'].to_numpy(),
+            'Other Values': others.reindex(kept.index).to_numpy(),
+        }))
+    if report:
+        conflicts = pd.concat(report, ignore_index=True)
+    return result, conflicts
+
+
+###############################################################################
+# Fuzzy duplicate detection
+###############################################################################
+
+# Name similarity (``difflib`` ratio of the folded names, see
+# ``_name_keys``) from which two compatible records are reported
+# as possible duplicates.
+FUZZY_MATCH_THRESHOLD = 0.85
+# Each record is compared with the next ``FUZZY_WINDOW - 1`` records of its
+# block in name (or date) order, which bounds the work per record.
+FUZZY_WINDOW = 5
+
+FUZZY_REPORT_COLUMNS = ['Cluster', 'Row', 'Score', 'Student Name', 'Date Of Birth', 'Grade',
+                        'Gender', 'Student No', 'Emirate Id']
+
+
+def _blank_to_na(values: pd.Series) -> pd.Series:
+    """Object Series with empty strings as missing values."""
+    values = values.astype(object)
+    return values.where(values.notna() & (values != ''))
+
+
+_NON_LETTER_RE = re.compile(r'[^a-z]')
+_REPEAT_RE = re.compile(r'(?<=(.))\1+')  # the repeats after a character's first copy
+_FOLD_VOWELS = str.maketrans('eiou', 'aaaa')
+_DROP_SOFT_LETTERS = str.maketrans('', '', 'aeiouhwy')
+
+
+def _name_keys(names: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Folded name and phonetic key of every name, computed once per distinct name.
+
+    * The folded name keeps the lower-case letters with every vowel as
+      ``a`` and repeated letters collapsed, so spelling variants of one
+      transliteration (``mohammed``, ``muhammad``) compare as equal and the
+      similarity score measures real differences.  Spacing and hyphens
+      are ignored.
+    * The phonetic key is the consonant skeleton: the first letter, then
+      the other letters without vowels and ``h``/``w``/``y``, repeats
+      collapsed.  ``Mohammed Al Ali``, ``Mohamed Alali`` and ``Muhammad
+      Al-Ali`` all become ``mhmdl``.
+
+    Names without Latin letters (an Arabic name in the English column)
+    use their lower-cased text without spaces for both.
+    """
+    codes, uniques = pd.factorize(_text(names).fillna(''))
+    folded, phonetic = [], []
+    for name in uniques:
+        lowered = str(name).lower()
+        letters = _NON_LETTER_RE.sub('', lowered) or ''.join(lowered.split())
+        folded.append(_REPEAT_RE.sub('', letters.translate(_FOLD_VOWELS)))
+        phonetic.append(_REPEAT_RE.sub('', letters[:1] + letters[1:].translate(_DROP_SOFT_LETTERS)))
+    folded = np.array(folded + [''], dtype=object)
+    phonetic = np.array(phonetic + [''], dtype=object)
+    # code -1 (no name) picks the trailing ''
+    return folded[codes], phonetic[codes]
+
+
+def _window_pairs(block: np.ndarray, sort_key: np.ndarray,
+                  window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Candidate pairs of the sorted-neighbourhood method within blocks.
+
+    Rows with ``block`` code -1 have no block.  Rows are sorted by block
+    and ``sort_key`` and each is paired with the following ``window - 1``
+    rows of the same block, so a block of any size costs linear work.
+    """
+    rows = np.flatnonzero(block >= 0)
+    rows = rows[np.lexsort((sort_key[rows], block[rows]))]
+    sorted_block = block[rows]
+    left, right = [], []
+    for offset in range(1, window):
+        same = sorted_block[:-offset] == sorted_block[offset:]
+        left.append(rows[:-offset][same])
+        right.append(rows[offset:][same])
+    return np.concatenate(left), np.concatenate(right)
+
+
+def _pair_clusters(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Connected components of ``n`` rows linked by pairs, as smallest row."""
+    labels = np.arange(n)
+    while True:
+        before = labels
+        low = np.minimum(labels[left], labels[right])
+        labels = labels.copy()
+        np.minimum.at(labels, left, low)
+        np.minimum.at(labels, right, low)
+        labels = labels[labels]
+        if np.array_equal(labels, before):
+            return labels
+
+
+def _fuzzy_duplicate_candidates(df: pd.DataFrame, threshold: float = FUZZY_MATCH_THRESHOLD,
+                                window: int = FUZZY_WINDOW) -> pd.DataFrame:
+    """Find clusters of records that are probably the same student.
+
+    Meant for rosters without reliable IDs, where ``_deduplicate_students``
+    cannot match ``Mohammed Al Ali`` with ``Mohamed Alali``.  Comparing
+    every pair is quadratic, so candidate pairs come from two blocking
+    passes: records with the same Date Of Birth, in order of their
+    phonetic name key, and records with the same phonetic key (see
+    :func:`_name_keys`), in order of birth date; within a block
+    each record meets the next ``window - 1`` records only.  Candidates
+    must be compatible (Date Of Birth, Gender and Grade equal or missing
+    on either side, and no two different Student Nos or Emirates IDs) and
+    their folded names (see :func:`_name_keys`) must reach
+    ``threshold`` in ``difflib``'s ratio, whose cheap upper bounds are
+    checked first.
+
+    Works on normalised and on import frames (empty strings count as
+    missing).
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per record of a candidate cluster (``FUZZY_REPORT_COLUMNS``):
+        the cluster number, the record's 1-based row in ``df``, its best
+        score against another record of the cluster and its identifying
+        fields.  Empty when no duplicates are suspected.
+    """
+    n = len(df)
+    report = pd.DataFrame(columns=FUZZY_REPORT_COLUMNS)
+    if n < 2:
+        return report
+    folded, phonetic = _name_keys(df['Student Name'])
+    codes = {col: pd.factorize(_blank_to_na(df[col]))[0]
+             for col in ('Date Of Birth', 'Gender', 'Grade')}
+    status = df.get('Emirate Id Status')
+    for key in DEDUPE_KEYS:
+        codes[key] = pd.factorize(_dedupe_key(df[key], key, status))[0]
+    phonetic_code = pd.factorize(np.where(phonetic != '', phonetic, None))[0]
+    name_order = pd.factorize(phonetic + ' ' + folded, sort=True)[0]
+    dob_order = pd.factorize(_blank_to_na(df['Date Of Birth']), sort=True)[0]
+
+    pairs = [_window_pairs(codes['Date Of Birth'], name_order, window),
+             _window_pairs(phonetic_code, dob_order, window)]
+    left = np.concatenate([p[0] for p in pairs])
+    right = np.concatenate([p[1] for p in pairs])
+    left, right = np.minimum(left, right), np.maximum(left, right)
+    pair_ids = np.sort(left.astype(np.int64) * n + right)
+    pair_ids = pair_ids[np.r_[True, pair_ids[1:] != pair_ids[:-1]]]
+    left, right = pair_ids // n, pair_ids % n
+
+    compatible = np.ones(len(left), dtype=bool)
+    for col in ('Date Of Birth', 'Gender', 'Grade'):
+        a, b = codes[col][left], codes[col][right]
+        compatible &= (a == b) | (a < 0) | (b < 0)
+    for key in DEDUPE_KEYS:
+        a, b = codes[key][left], codes[key][right]
+        compatible &= (a == b) | (a < 0) | (b < 0)
+    # ratio <= 2 * min(len) / (len_a + len_b), checked for all pairs at once
+    lengths = np.fromiter(map(len, folded), dtype=np.int64, count=n)
+    la, lb = lengths[left], lengths[right]
+    compatible &= 2 * np.minimum(la, lb) >= threshold * np.maximum(la + lb, 1)
+    left, right = left[compatible], right[compatible]
+
+    names = folded
+    scores = np.zeros(len(left))
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    for i, (a, b) in enumerate(zip(names[left], names[right])):
+        if a == b:
+            scores[i] = 1.0
+            continue
+        matcher.set_seq2(a)
+        matcher.set_seq1(b)
+        if matcher.quick_ratio() >= threshold:
+            scores[i] = matcher.ratio()
+    matched = scores >= threshold
+    if not matched.any():
+        return report
+    left, right, scores = left[matched], right[matched], scores[matched]
+
+    labels = _pair_clusters(n, left, right)
+    best = np.zeros(n)
+    np.maximum.at(best, left, scores)
+    np.maximum.at(best, right, scores)
+    rows = np.flatnonzero(best > 0)
+    report = df.iloc[rows].reindex(columns=FUZZY_REPORT_COLUMNS[3:]).reset_index(drop=True)
+    report.insert(0, 'Score', best[rows].round(3))
+    report.insert(0, 'Row', rows + 1)
+    report.insert(0, 'Cluster', pd.factorize(labels[rows])[0] + 1)
+    return report.sort_values(['Cluster', 'Row'], kind='stable').reset_index(drop=True)
+
+
+###############################################################################
+# Delta imports against the previous export
+###############################################################################
+
+# Columns of the change report of ``_import_delta``.
+DELTA_REPORT_COLUMNS = ['Change', 'Student No', 'Emirate Id', 'Student Name',
+                        'Changed Fields']
+
+
+def _read_previous_import(source) -> Tuple[Optional[pd.DataFrame], str]:
+    """Read an earlier import file (CSV, gzip CSV or Parquet) as strings.
+
+    ``source`` is a path or a named file object; the format follows the
+    file name.  Returns ``(df, error_message)``.
+    """
+    name = str(getattr(source, 'name', source))
+    try:
+        if name.lower().endswith('.parquet'):
+            df = pd.read_parquet(source)
+            return df.astype(object).where(df.notna(), '').astype(str), ''
+        compression = 'gzip' if name.lower().endswith('.gz') else None
+        return pd.read_csv(source, dtype=str, keep_default_na=False,
+                           compression=compression), ''
+    except Exception as exc:
+        return None, f'Failed to read previous import {name}: {exc}'
+
+
+def _column_text(values: pd.Series) -> np.ndarray:
+    """Values of an import column as an object array of strings."""
+    if values.dtype != object:
+        values = values.astype(str)
+    return values.to_numpy(dtype=object)
+
+
+def _match_previous_rows(previous: pd.DataFrame, current: pd.DataFrame,
+                         keys: List[str] = DEDUPE_KEYS) -> np.ndarray:
+    """Position of each ``current`` row's record in ``previous``, or -1.
+
+    Keys are tried in order on the rows still unmatched on both sides, so
+    ``Emirate Id`` only pairs students whose ``Student No`` did not.  Each
+    pass is a hash lookup (see :func:`_dedupe_key`); when a key repeats,
+    its first occurrences are paired.
+    """
+    match = np.full(len(current), -1, dtype=np.int64)
+    taken = np.zeros(len(previous), dtype=bool)
+    for column in keys:
+        if column not in previous.columns or column not in current.columns:
+            continue
+        prev_key = _dedupe_key(previous[column], column, previous.get('Emirate Id Status'))
+        cur_key = _dedupe_key(current[column], column, current.get('Emirate Id Status'))
+        prev_rows = np.flatnonzero(prev_key.notna().to_numpy() & ~taken)
+        cur_rows = np.flatnonzero(cur_key.notna().to_numpy() & (match < 0))
+        values = prev_key.iloc[prev_rows]
+        first = ~values.duplicated().to_numpy()
+        found = pd.Index(values.to_numpy(dtype=object)[first]).get_indexer(
+            cur_key.iloc[cur_rows].to_numpy(dtype=object))
+        hit = found >= 0
+        targets = prev_rows[first][found[hit]]
+        claimed = ~pd.Series(targets).duplicated().to_numpy()
+        match[cur_rows[hit][claimed]] = targets[claimed]
+        taken[targets[claimed]] = True
+    return match
+
+
+def _import_delta(previous: pd.DataFrame, current: pd.DataFrame,
+                  keys: List[str] = DEDUPE_KEYS
+                  ) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, int]]:
+    """Students that are new, changed or removed since the previous import.
+
+    Rows are paired by ``Student No``, then by ``Emirate Id`` (see
+    :func:`_match_previous_rows`), and a paired row counts as changed when
+    any column both frames share differs.  Pairing goes through hash
+    indexes and the columns are compared as whole arrays over the pairs,
+    so the diff is linear in the number of rows.
+
+    Parameters
+    ----------
+    previous : pandas.DataFrame
+        The last import sent for the school, as strings (see
+        ``_read_previous_import``).
+    current : pandas.DataFrame
+        The new import frame (see ``_to_import_format``).
+    keys : list of str, optional
+        Identifying columns, ``DEDUPE_KEYS`` by default.
+
+    Returns
+    -------
+    tuple
+        ``(delta_df, report, summary)``: the new and changed rows of
+        ``current`` in their order, one ``DELTA_REPORT_COLUMNS`` row per new,
+        changed or removed student, and the number of ``new``, ``changed``,
+        ``unchanged`` and ``removed`` students.
+    """
+    columns = [col for col in current.columns if col in previous.columns]
+    match = _match_previous_rows(previous, current, keys)
+    matched = np.flatnonzero(match >= 0)
+    differs = np.empty((len(matched), len(columns)), dtype=bool)
+    for j, column in enumerate(columns):
+        differs[:, j] = (_column_text(current[column])[matched]
+                         != _column_text(previous[column])[match[matched]])
+    changed = np.zeros(len(current), dtype=bool)
+    changed[matched] = differs.any(axis=1)
+    new = match < 0
+    removed = np.ones(len(previous), dtype=bool)
+    removed[match[matched]] = False
+
+    rows = np.flatnonzero(changed)
+    names = np.array(columns, dtype=object)
+    fields = [', '.join(names[row]) for row in differs[changed[matched]]]
+
+    def entries(change: str, frame: pd.DataFrame, changed_fields) -> pd.DataFrame:
+        part = frame.reindex(columns=DELTA_REPORT_COLUMNS[1:4]).reset_index(drop=True)
+        part.insert(0, 'Change', change)
+        part['Changed Fields'] = changed_fields
+        return part
+
+    report = pd.concat([
+        entries('new', current[new], ''),
+        entries('changed', current.iloc[rows], fields),
+        entries('removed', previous[removed], ''),
+    ], ignore_index=True)
+    summary = {'new': int(new.sum()), 'changed': len(rows),
+               'unchanged': len(matched) - len(rows), 'removed': int(removed.sum())}
+    return current[new | changed].reset_index(drop=True), report, summary
+
+
+###############################################################################
+# Streaming pipeline for large CSV inputs
+###############################################################################
+
+# Rows per chunk when streaming CSV files.
+CSV_CHUNK_SIZE = 50_000
+# Streamed import files stay in memory up to this size, then spill to disk.
+STREAM_SPOOL_BYTES = 32 * 1024 * 1024
+
+
+def _detect_csv_section_pattern(source, start: int, chunksize: int,
+                                engine: str = 'vectorized',
+                                sample_rows: Optional[int] = None,
+                                section_scope: str = 'file'):
+    """Run the ``'auto'`` section vote over a CSV without loading it.
+
+    Only the column that maps to ``Section`` is read, chunk by chunk, and
+    the letter/number counts are summed, which gives the same answer as
+    voting over the whole file.  ``sample_rows`` limits the pass to the
+    first rows of the file for a cheaper estimate.  With
+    ``section_scope='grade'`` the ``Grade`` column is read as well and a
+    dict of pattern per grade key (see ``_section_group_keys``) is
+    returned instead of a single pattern.
+    """
+    header = pd.read_csv(source, dtype=str, nrows=0).columns
+    section_cols = [col for col in header if SYNONYMS.get(_column_key(col)) == 'Section']
+    if not section_cols:
+        return 'letters'
+    grade_cols = [col for col in header if SYNONYMS.get(_column_key(col)) == 'Grade']
+    by_grade = section_scope == 'grade' and bool(grade_cols)
+    if hasattr(source, 'seek'):
+        source.seek(start)
+    cleaners = NORMALISATION_ENGINES[engine]
+    letter_count = number_count = 0
+    counts = None
+    usecols = [section_cols[0]] + (grade_cols[:1] if by_grade else [])
+    for chunk in pd.read_csv(source, dtype=str, usecols=usecols,
+                             chunksize=chunksize, nrows=sample_rows):
+        sections = cleaners['section'](chunk[section_cols[0]])
+        if by_grade:
+            groups = _section_group_keys(cleaners['grade'](chunk[grade_cols[0]]))
+            chunk_counts = _section_group_counts(sections, groups)
+            counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+            continue
+        letters, numbers = _section_pattern_counts(sections)
+        letter_count += letters
+        number_count += numbers
+    if by_grade:
+        return _section_patterns_from_counts(counts) if counts is not None else {}
+    return 'letters' if letter_count >= number_count else 'numbers'
+
+
+def _stream_csv_to_import(source, output, section_pattern_option: str,
+                          chunksize: int = CSV_CHUNK_SIZE, engine: str = 'vectorized',
+                          cache: Optional[CleanerCache] = None, header: bool = True,
+                          section_sample_rows: Optional[int] = None,
+                          profiler: Optional[StageProfiler] = None,
+                          section_scope: str = 'file',
+                          plan: List[dict] = NORMALISATION_PLAN
+                          ) -> Tuple[Optional[dict], str]:
+    """Normalise a CSV chunk by chunk and append the import rows to ``output``.
+
+    Each chunk goes through ``_normalise_dataframe`` and
+    ``_to_import_format`` and is written straight away, so memory stays
+    bounded by ``chunksize`` whatever the file size.  The section pattern
+    is resolved once for the whole file beforehand (see
+    :func:`_detect_csv_section_pattern`) and then forced on every chunk.
+
+    Parameters
+    ----------
+    source : path or file-like
+        The CSV to read; file objects must be seekable.
+    output : file-like
+        Text or binary handle receiving the import CSV.
+    section_pattern_option : str
+        As for ``_normalise_dataframe``.
+    chunksize : int, optional
+        Rows read per chunk.
+    engine, cache
+        Passed to ``_normalise_dataframe``; a cache is created if none is
+        given so that repeated values are cleaned once per file.
+    header : bool, optional
+        Write the header row (disable when appending to an existing file).
+    section_sample_rows : int, optional
+        Limit the section auto-detection pass to the first rows.
+    section_scope : str, optional
+        As for ``_normalise_dataframe``; with ``'grade'`` the detection
+        pass resolves one pattern per grade and ``section_pattern`` in
+        the summary is that dict.
+    profiler : StageProfiler, optional
+        Records the detection pass plus reading, normalising and writing,
+        summed over the chunks.
+    plan : list of dict, optional
+        The cleaning rules; see ``NORMALISATION_PLAN``.
+
+    Returns
+    -------
+    tuple
+        ``(summary, error_message)``.  ``summary`` holds ``rows``,
+        ``chunks``, ``section_pattern``, summed ``date_formats`` and
+        ``emirates_id`` issue counts and a ``preview`` of the first
+        import rows; it is ``None`` on failure, in which case anything
+        already written to a seekable ``output`` is truncated away again.
+    """
+    cache = cache if cache is not None else CleanerCache()
+    start = source.tell() if hasattr(source, 'tell') else 0
+    output_start = output.tell() if hasattr(output, 'tell') else None
+    try:
+        if section_pattern_option == 'auto':
+            if not any(rule['column'] == 'Grade' for rule in plan):
+                section_scope = 'file'  # no grades to vote by (see _apply_section_pattern)
+            with _profile_stage(profiler, 'section_pass'):
+                pattern = _detect_csv_section_pattern(source, start, chunksize, engine,
+                                                      section_sample_rows, section_scope)
+            if hasattr(source, 'seek'):
+                source.seek(start)
+        else:
+            pattern = section_pattern_option
+        summary = {'rows': 0, 'chunks': 0, 'section_pattern': pattern,
+                   'date_formats': {}, 'emirates_id': {}, 'preview': None}
+        reader = pd.read_csv(source, dtype=str, chunksize=chunksize)
+        while True:
+            with _profile_stage(profiler, 'read') as stage:
+                chunk = next(reader, None)
+                stage['rows'] = len(chunk) if chunk is not None else 0
+            if chunk is None:
+                break
+            normalised = _normalise_dataframe(chunk, pattern, engine=engine, cache=cache,
+                                              profiler=profiler, plan=plan)
+            with _profile_stage(profiler, 'import_format', len(normalised)):
+                import_df = _to_import_format(normalised, plan=plan)
+            with _profile_stage(profiler, 'export', len(import_df)):
+                import_df.to_csv(output, index=False, header=header, encoding='utf-8')
+            header = False
+            if summary['preview'] is None:
+                summary['preview'] = import_df.head(10)
+            summary['rows'] += len(import_df)
+            summary['chunks'] += 1
+            for fmt, count in normalised.attrs.get('date_formats', {}).items():
+                summary['date_formats'][fmt] = summary['date_formats'].get(fmt, 0) + count
+            if 'Emirate Id Status' in normalised.columns:
+                for label, count in _emirates_id_issues(normalised['Emirate Id Status']).items():
+                    summary['emirates_id'][label] = summary['emirates_id'].get(label, 0) + count
+    except Exception as exc:
+        if output_start is not None:
+            output.seek(output_start)
+            output.truncate()
+        return None, f'Failed to stream {getattr(source, "name", source)}: {exc}'
+    if summary['preview'] is None:
+        # header-only file: still emit the import header
+        empty = _to_import_format(_normalise_dataframe(pd.DataFrame(), pattern, engine=engine,
+                                                       plan=plan), plan=plan)
+        if header:
+            empty.to_csv(output, index=False, encoding='utf-8')
+        summary['preview'] = empty
+    return summary, ''
+
+
+###############################################################################
+# Export of consolidated import files
+###############################################################################
+
+# Export format -> (file name suffix, MIME type).
+EXPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def _available_export_formats() -> List[str]:
+    """Export formats usable here (Parquet needs pyarrow)."""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or pa is not None]
+
+
+def _export_file_name(school: str, fmt: str = 'csv') -> str:
+    return f'{school}_Import{EXPORT_FORMATS[fmt][0]}'
+
+
+class ImportWriter:
+    """Incrementally write import rows to a binary file in one export format.
+
+    Sources are appended one at a time: import DataFrames, or binary CSV
+    files (file objects or paths) that start with a header row (such as
+    the output of ``_stream_csv_to_import``).  Paths are only opened
+    while they are copied.  Rows go straight to ``output`` without a
+    ``pd.concat`` of the parts or an intermediate ``str``; only the first
+    header is written.  For ``'csv'`` and ``'csv.gz'`` CSV sources are
+    copied byte for byte, for ``'parquet'`` they are parsed back in
+    chunks and each part becomes a row group of string columns.  Use as a
+    context manager or call :meth:`close`; ``output`` itself stays open.
+    """
+
+    def __init__(self, output, fmt: str = 'csv') -> None:
+        if fmt not in _available_export_formats():
+            raise ValueError(f'Unsupported export format: {fmt!r}')
+        self.fmt = fmt
+        self._output = output
+        self._gzip = gzip.GzipFile(fileobj=output, mode='wb', mtime=0) if fmt == 'csv.gz' else None
+        self._parquet = None
+        self._header_written = False
+
+    def __enter__(self) -> 'ImportWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, source) -> None:
+        """Append a DataFrame, a binary CSV file object or a CSV file path."""
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                self.write(f)
+        elif isinstance(source, pd.DataFrame):
+            self._write_frame(source)
+        elif self.fmt == 'parquet':
+            source.seek(0)
+            for chunk in pd.read_csv(source, dtype=str, keep_default_na=False,
+                                     chunksize=CSV_CHUNK_SIZE):
+                self._write_frame(chunk)
+        else:
+            source.seek(0)
+            if self._header_written:
+                source.readline()
+            self._header_written = True
+            shutil.copyfileobj(source, self._gzip or self._output)
+
+    def _write_frame(self, df: pd.DataFrame) -> None:
+        if self.fmt == 'parquet':
+            schema = pa.schema([(str(col), pa.string()) for col in df.columns])
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self._output, schema)
+            table = pa.Table.from_pandas(df, preserve_index=False).cast(schema)
+            self._parquet.write_table(table)
+        else:
+            df.to_csv(self._gzip or self._output, index=False,
+                      header=not self._header_written, encoding='utf-8')
+            self._header_written = True
+
+    def close(self) -> None:
+        if self._gzip is not None:
+            self._gzip.close()
+            self._gzip = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+
+def _export_to_buffer(sources: list, fmt: str = 'csv') -> io.BytesIO:
+    """Write ``sources`` through an ``ImportWriter`` into a rewound buffer.
+
+    ``st.download_button`` keeps the bytes of every download in memory
+    anyway and does not accept spooled temporary files, so the export is
+    built in a ``BytesIO`` it can take as is.
+    """
+    output = io.BytesIO()
+    with ImportWriter(output, fmt) as writer:
+        for source in sources:
+            writer.write(source)
+    output.seek(0)
+    return output
+
+
+def _write_zip_bundle(output, schools, fmt: str = 'csv') -> None:
+    """Write every school's import file into one zip archive on ``output``.
+
+    ``schools`` maps a school name to its sources (as accepted by
+    :meth:`ImportWriter.write`), or is an iterable of ``(school, sources)``
+    pairs, which is consumed one school at a time.  Each member is
+    streamed into the archive in turn, so only one part is processed at a
+    time.  CSV members are deflated; gzip and Parquet members, already
+    compressed, are stored.
+    """
+    compression = zipfile.ZIP_DEFLATED if fmt == 'csv' else zipfile.ZIP_STORED
+    if isinstance(schools, dict):
+        schools = schools.items()
+    with zipfile.ZipFile(output, 'w', compression=compression) as bundle:
+        for school, sources in schools:
+            # member size is unknown up front: allow it to exceed 2 GiB
+            with bundle.open(_export_file_name(school, fmt), 'w', force_zip64=True) as member:
+                with ImportWriter(member, fmt) as writer:
+                    for source in sources:
+                        writer.write(source)
+
+
+###############################################################################
+# Content-hash caching of per-file results across reruns
+###############################################################################
+
+# Total size of the DataFrames a ``ResultCache`` may hold before evicting.
+RESULT_CACHE_BYTES = 512 * 1024 * 1024
+# Values per object column sampled when sizing a cached DataFrame.
+RESULT_SIZE_SAMPLE = 1000
+# Default location and size cap of the on-disk cache of cleaned rosters.
+DISK_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sjjp_normalizer')
+DISK_CACHE_BYTES = 2 * 1024 ** 3
+# Part of every on-disk cache key: bump it whenever a cleaning rule changes
+# its output, so entries written by older rules are no longer found.
+NORMALISATION_RULES_VERSION = 2
+
+
+def _file_digest(file) -> str:
+    """Hash of an uploaded file's content, used as its cache identity."""
+    return hashlib.blake2b(file.getvalue(), digest_size=16).hexdigest()
+
+
+def _path_digest(path, block_size: int = 1024 * 1024) -> str:
+    """``_file_digest`` of a file on disk, read in blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_extension(filename: str) -> str:
+    """Lower-case extension (with the dot), which selects the reader."""
+    match = re.search(r'\.[^.]+$', filename)
+    return match.group(0).lower() if match else ''
+
+
+def _frame_nbytes(df: pd.DataFrame) -> int:
+    """Approximate memory of ``df``.
+
+    Object columns are sized from an evenly spaced sample of about
+    ``RESULT_SIZE_SAMPLE`` values; a full ``deep=True`` scan of a large
+    frame costs more than the section stage this cache is meant to
+    make cheap.
+    """
+    total = int(df.memory_usage(index=True, deep=False).sum())
+    step = max(1, len(df) // RESULT_SIZE_SAMPLE)
+    for col in range(df.shape[1]):
+        values = df.iloc[::step, col]
+        if values.dtype == object:
+            extra = values.memory_usage(index=False, deep=True) - values.memory_usage(index=False)
+            total += int(extra) * step
+    return total
+
+
+def _result_nbytes(value) -> int:
+    """Approximate memory held by a cached result (DataFrames only)."""
+    values = value if isinstance(value, tuple) else (value,)
+    return sum(_frame_nbytes(v) for v in values if isinstance(v, pd.DataFrame))
+
+
+def _new_file_mode() -> int:
+    """Permissions ``open()`` gives a new file under the process umask.
+
+    The umask can only be read by setting it, which races with threads
+    creating files, so this runs once at import.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+_NEW_FILE_MODE = _new_file_mode()
+
+
+class DiskCache:
+    """Persistent, size-bounded LRU of cleaned rosters stored as Parquet files.
+
+    Entries hold the output of ``_clean_dataframe``, which does not depend
+    on the section option.  They are keyed by content digest, file
+    extension, engine and ``NORMALISATION_RULES_VERSION``, so a roster
+    that is sent again unchanged is neither parsed nor cleaned.  Recency
+    is the file modification time, refreshed on every hit; after each
+    write the least recently used files are deleted until the directory
+    fits in ``max_bytes``.  Files are written under a temporary name and
+    renamed into place, so batch workers and app sessions can share a
+    directory; they get the usual permissions of new files, not the
+    owner-only ones of ``tempfile.mkstemp``.  Without pyarrow every
+    lookup misses and nothing is stored.
+    """
+
+    def __init__(self, directory: str = DISK_CACHE_DIR,
+                 max_bytes: int = DISK_CACHE_BYTES) -> None:
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: tuple) -> str:
+        name = '-'.join(str(part).lstrip('.') for part in key)
+        return os.path.join(self.directory, f'{name}-r{NORMALISATION_RULES_VERSION}.parquet')
+
+    def _files(self) -> List[Tuple[str, os.stat_result]]:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.parquet'):
+                try:
+                    files.append((entry.path, entry.stat()))
+                except OSError:  # removed by another process meanwhile
+                    continue
+        return files
+
+    def __len__(self) -> int:
+        return len(self._files())
+
+    def __contains__(self, key: tuple) -> bool:
+        return os.path.exists(self._path(key))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(stat.st_size for _, stat in self._files())
+
+    def get(self, key: tuple) -> Optional[pd.DataFrame]:
+        """Return the cleaned frame stored under ``key``, or ``None``."""
+        path = self._path(key)
+        if pq is None or not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)
+        except (OSError, ValueError, pa.ArrowException):  # evicted meanwhile or truncated
+            self.misses += 1
+            return None
+        self.hits += 1
+        if 'Grade' in df.columns:
+            # Parquet brings a nullable integer column back as floats
+            grade = df['Grade'].astype('Int64')
+            df['Grade'] = grade.astype(object).where(grade.notna(), None)
+        return df
+
+    def put(self, key: tuple, df: pd.DataFrame) -> bool:
+        """Store ``df`` under ``key``; returns whether it could be written."""
+        if pq is None:
+            return False
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                df.to_parquet(out, index=False)
+            os.chmod(tmp, _NEW_FILE_MODE)
+            os.replace(tmp, self._path(key))
+        except (OSError, ValueError, TypeError, pa.ArrowException):
+            # e.g. an extra input column mixing numbers and text
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+        self._evict()
+        return True
+
+    def _evict(self) -> None:
+        files = sorted(self._files(), key=lambda item: item[1].st_mtime)
+        total = sum(stat.st_size for _, stat in files)
+        for path, stat in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= stat.st_size
+
+
+class ResultCache:
+    """Byte-bounded LRU of per-file results keyed by content hash and options.
+
+    Streamlit reruns the whole script on every widget interaction; with
+    this cache a rerun only reads and normalises files whose bytes or
+    options changed.  Entries are evicted least recently used first once
+    their DataFrames exceed ``max_bytes``; a single result larger than the
+    cap is returned but not stored.  Cached frames are shared between
+    reruns and must not be modified in place.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[tuple, Tuple[object, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(self, key: tuple, compute):
+        """Return the cached value for ``key``, calling ``compute()`` on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        value = compute()
+        size = _result_nbytes(value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+        return value
+
+    @staticmethod
+    def _read(file, profiler: Optional[StageProfiler] = None
+              ) -> Tuple[Optional[pd.DataFrame], str]:
+        file.seek(0)
+        with _profile_stage(profiler, 'read') as stage:
+            df, err = _read_uploaded_file(file)
+            stage['rows'] = len(df) if df is not None else 0
+        return df, err
+
+    def read(self, file, digest: str,
+             profiler: Optional[StageProfiler] = None) -> Tuple[Optional[pd.DataFrame], str]:
+        """Cached ``_read_uploaded_file``."""
+        return self.get_or_compute(('read', digest, _file_extension(file.name)),
+                                   lambda: self._read(file, profiler))
+
+    def prefetch(self, file, digest: str, engine: str = 'vectorized',
+                 profiler: Optional[StageProfiler] = None,
+                 disk: Optional[DiskCache] = None
+                 ) -> Optional[Tuple[Optional[pd.DataFrame], str]]:
+        """Read ``file`` ahead of :meth:`clean`, unless it will not need it.
+
+        Meant for reader threads running ahead of :meth:`normalise` (see
+        ``_prefetch_files``).  Returns ``(df, error_message)`` for the
+        caller to hand to :meth:`normalise` as ``prefetched``, or ``None``
+        when the cleaned frame is cached here or in ``disk`` or the file
+        was read before.  The frame is not stored in the cache, so it is
+        freed once cleaned.
+        """
+        key = (digest, _file_extension(file.name), engine)
+        with self._lock:
+            if ('clean',) + key in self._entries or ('read',) + key[:2] in self._entries:
+                return None
+        if disk is not None and key in disk:
+            return None
+        return self._read(file, profiler)
+
+    def clean(self, file, digest: str, engine: str = 'vectorized',
+              cache: Optional[CleanerCache] = None,
+              profiler: Optional[StageProfiler] = None,
+              disk: Optional[DiskCache] = None,
+              prefetched: Optional[Tuple[Optional[pd.DataFrame], str]] = None
+              ) -> Tuple[Optional[pd.DataFrame], str]:
+        """Cached read and ``_clean_dataframe`` (independent of the section option).
+
+        On a miss the ``disk`` cache, when given, is tried before the file
+        is read, and a freshly cleaned frame is written to it.  A result of
+        :meth:`prefetch` given as ``prefetched`` stands in for the read.
+        """
+        disk_key = (digest, _file_extension(file.name), engine)
+
+        def compute():
+            if disk is not None:
+                with _profile_stage(profiler, 'disk_cache:get') as stage:
+                    cleaned = disk.get(disk_key)
+                    stage['rows'] = len(cleaned) if cleaned is not None else 0
+                if cleaned is not None:
+                    return cleaned, ''
+            df, err = prefetched if prefetched is not None else self.read(file, digest, profiler)
+            if df is None:
+                return None, err
+            cleaned = _clean_dataframe(df, engine=engine, cache=cache, profiler=profiler)
+            if disk is not None:
+                with _profile_stage(profiler, 'disk_cache:put', len(cleaned)):
+                    disk.put(disk_key, cleaned)
+            return cleaned, ''
+        return self.get_or_compute(('clean',) + disk_key, compute)
+
+    def normalise(self, file, digest: str, section_pattern_option: str,
+                  engine: str = 'vectorized', cache: Optional[CleanerCache] = None,
+                  profiler: Optional[StageProfiler] = None, compact: bool = False,
+                  section_scope: str = 'file', disk: Optional[DiskCache] = None,
+                  prefetched: Optional[Tuple[Optional[pd.DataFrame], str]] = None
+                  ) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame], str]:
+        """Cached ``_normalise_dataframe`` and ``_to_import_format``.
+
+        Built on :meth:`clean`, so switching the section option or scope only
+        re-runs ``_apply_section_pattern`` and the import conversion.
+        With ``compact`` both frames are stored in compact dtypes;
+        ``disk`` and ``prefetched`` are passed on to :meth:`clean`.
+        Returns ``(normalised_df, import_df, error_message)``; failed
+        reads are cached too, so a broken file is not re-read on every
+        rerun.
+        """
+        def compute():
+            cleaned, err = self.clean(file, digest, engine=engine, cache=cache,
+                                      profiler=profiler, disk=disk, prefetched=prefetched)
+            if cleaned is None:
+                return None, None, err
+            normalised = _apply_section_pattern(cleaned, section_pattern_option,
+                                                engine=engine, cache=cache, profiler=profiler,
+                                                section_scope=section_scope)
+            if compact:
+                with _profile_stage(profiler, 'compact', len(normalised)):
+                    normalised = _compact_dataframe(normalised)
+            with _profile_stage(profiler, 'import_format', len(normalised)):
+                import_df = _to_import_format(normalised, compact=compact)
+            return normalised, import_df, ''
+        return self.get_or_compute(
+            ('normalise', digest, _file_extension(file.name), section_pattern_option,
+             section_scope, engine, compact),
+            compute)
+
+
+@st.cache_resource
+def _result_cache() -> ResultCache:
+    """Process-wide ``ResultCache`` that survives Streamlit reruns."""
+    return ResultCache()
+
+
+@st.cache_resource
+def _disk_cache() -> DiskCache:
+    """``DiskCache`` in ``DISK_CACHE_DIR``, shared by every session of the app."""
+    return DiskCache()
+
+
+###############################################################################
+# Pipelined ingestion
+###############################################################################
+
+# Pipelined mode: files decoded ahead of the one being normalised (each
+# holds its decoded frame until the consumer gets to it, outside the
+# ResultCache), and the threads decoding them.
+PREFETCH_FILES = 2
+PREFETCH_WORKERS = 2
+
+
+def _prefetch_files(files, prefetch, max_pending: int = PREFETCH_FILES,
+                    workers: int = PREFETCH_WORKERS):
+    """Yield ``(file, prefetch(file))`` in order, running ``prefetch`` ahead.
+
+    ``prefetch`` (typically decoding a file, see ``ResultCache.prefetch``)
+    runs on a pool of ``workers`` threads while the caller processes the
+    files yielded before.  A file is only submitted once an earlier one
+    has been handed over, so besides the one the caller holds at most
+    ``max_pending`` results are being decoded or waiting at any time: a
+    slow consumer holds the readers back instead of piling up frames.
+    Decompression and pandas' parsers release the GIL for much of their
+    work, which is what the overlap gains; with ``max_pending`` 0 each
+    file is prefetched just before it is yielded.
+    Files still queued are cancelled when the caller stops early.
+    """
+    files = iter(files)
+    if max_pending < 1:
+        for file in files:
+            yield file, prefetch(file)
+        return
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sjjp-read') as pool:
+        try:
+            for file in files:
+                pending.append((file, pool.submit(prefetch, file)))
+                if len(pending) == max_pending:
+                    break
+            while pending:
+                file, future = pending.popleft()
+                result = future.result()
+                following = next(files, None)
+                if following is not None:
+                    pending.append((following, pool.submit(prefetch, following)))
+                yield file, result
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
 ###############################################################################
 # Streamlit application entry point
 ###############################################################################
 
+def _show_emirates_id_issues(issues: Dict[str, int],
+                             normalised_df: Optional[pd.DataFrame] = None) -> None:
+    """Warn about Emirates IDs that failed validation and list their rows."""
+    if not issues:
+        return
+    st.warning("Emirate Id problems: " + ", ".join(
+        f"{label} ({count})" for label, count in issues.items()
+    ))
+    if normalised_df is not None:
+        flagged = normalised_df['Emirate Id Status'].isin(list(issues)).to_numpy()
+        with st.expander("Rows with Emirate Id problems"):
+            st.dataframe(normalised_df.loc[flagged, [
+                'Student No', 'Student Name', 'Date Of Birth', 'Emirate Id', 'Emirate Id Status',
+            ]])
+
+
 def main() -> None:
     st.set_page_config(page_title="SJJP Student List Normalizer", layout="wide")
     st.title("SJJP Student List Normalizer and Import Tool")
@@ -806,58 +3672,316 @@ def main() -> None:
         }[opt]
     )
 
+    section_scope = st.selectbox(
+        "Section detection scope", options=list(SECTION_SCOPES), index=0,
+        disabled=section_pattern_option != 'auto',
+        format_func=lambda scope: {
+            'file': 'Whole file (one vote)',
+            'grade': 'Per grade (one vote per grade)',
+        }[scope]
+    )
+
+    export_format = st.selectbox(
+        "Export format", options=_available_export_formats(), index=0,
+        format_func=lambda fmt: {
+            'csv': 'CSV',
+            'csv.gz': 'CSV, gzip-compressed',
+            'parquet': 'Parquet',
+        }[fmt]
+    )
+
+    stream_csv = st.checkbox(
+        "Stream CSV files in chunks (bounded memory for very large files)", value=False
+    )
+
+    compact = st.checkbox(
+        "Compact in-memory representation (categoricals, Int8, Arrow strings)", value=False
+    )
+
+    trace_memory = st.checkbox(
+        "Trace memory per pipeline stage (slows processing down)", value=False
+    )
+
+    pipelined = st.checkbox(
+        "Decode the next files while the current one is normalised (pipelined ingestion)",
+        value=False, disabled=trace_memory,
+        help="Not available while tracing memory, which only works one stage at a time.",
+    ) and not trace_memory
+
+    dedupe = st.checkbox(
+        "Merge duplicate students across files (same Student No or Emirate Id)", value=False,
+        help="Only valid Emirates IDs are matched, so placeholders such as 0 are ignored; "
+             "records with different Student Nos are never merged.",
+    )
+
+    fuzzy = st.checkbox(
+        "Flag possible duplicates by similar names (for rosters without IDs)", value=False
+    )
+
+    delta = st.checkbox(
+        "Delta import: export only students that are new or changed since a previous import",
+        value=False,
+    )
+
+    use_disk_cache = st.checkbox(
+        "Keep cleaned files in an on-disk cache (re-sent rosters skip parsing and cleaning)",
+        value=False, disabled=pq is None,
+        help=None if pq is not None else "Requires pyarrow.",
+    )
+
     if not uploaded_files:
+        st.session_state.pop('process_files', None)
         st.info("Please upload at least one file to begin.")
         return
 
-    # Process each file upon button click
+    priority = []
+    if dedupe:
+        priority = st.multiselect(
+            "Prefer values from these files when merging (most preferred first; "
+            "other files follow in upload order)",
+            options=[file.name for file in uploaded_files],
+        )
+
+    previous_imports = {}
+    if delta:
+        previous_files = st.file_uploader(
+            "Previous import file of each school (named <school>_Import.csv, .csv.gz or "
+            ".parquet; a single file is used for a single school)",
+            type=["csv", "gz", "parquet"],
+            accept_multiple_files=True,
+            key="previous_imports",
+        )
+        previous_imports = {file.name: file for file in previous_files or []}
+
+    # Process files once the button has been clicked.  The flag keeps the
+    # results on screen across later reruns (editing a school name, adding
+    # a file); unchanged files are then served from the result cache.
     if st.button("Process Files"):
-        consolidated_outputs = []  # list of (school_name, import_df)
-        error_messages = []
-        for file in uploaded_files:
-            filename = file.name
-            with st.spinner(f"Processing {filename}…"):
-                df, err = _read_uploaded_file(file)
-                if df is None:
-                    error_messages.append(f"{filename}: {err}")
-                    continue
-                # Ask the user for the school name (optional)
-                # Use filename (without extension) as default
+        st.session_state['process_files'] = True
+    if not st.session_state.get('process_files'):
+        return
+    result_cache = _result_cache()
+    disk_cache = _disk_cache() if use_disk_cache else None
+    # (school_name, filename, import frame or streamed CSV file), in upload order
+    outputs = []
+    error_messages = []
+    # Shared by every file so repeated values are cleaned only once
+    cleaner_cache = CleanerCache()
+    # Per-file, per-stage timings shown in the "Pipeline profile" panel
+    profiler = StageProfiler(trace_memory=trace_memory)
+    # Bytes saved per column by compact dtypes, one frame per file
+    compact_reports = []
+
+    def prefetch(file):
+        # Runs on a reader thread in pipelined mode: no Streamlit calls here
+        if stream_csv and file.name.lower().endswith('.csv'):
+            return None, None
+        digest = _file_digest(file)
+        if not pipelined:
+            return digest, None
+        with profiler.file(file.name):
+            return digest, result_cache.prefetch(file, digest, profiler=profiler,
+                                                 disk=disk_cache)
+
+    for file, (digest, prefetched) in _prefetch_files(
+            uploaded_files, prefetch, max_pending=PREFETCH_FILES if pipelined else 0):
+        filename = file.name
+        with st.spinner(f"Processing {filename}…"), profiler.file(filename):
+            if stream_csv and filename.lower().endswith('.csv'):
                 default_school = re.sub(r'\.[^.]+$', '', filename)
                 school_name = st.text_input(
                     f"School name for {filename}", value=default_school,
                     key=f"school_{filename}"
                 )
-                # Apply normalisation rules
-                normalised_df = _normalise_dataframe(df, section_pattern_option)
-                # Convert to import format
-                import_df = _to_import_format(normalised_df)
-                # Preview
+                out = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_BYTES)
+                summary, err = _stream_csv_to_import(
+                    file, out, section_pattern_option, cache=cleaner_cache, profiler=profiler,
+                    section_scope=section_scope,
+                )
+                if summary is None:
+                    error_messages.append(f"{filename}: {err}")
+                    continue
+                outputs.append((school_name, filename, out))
                 st.subheader(f"Preview of normalised data for {filename} ({school_name})")
-                st.dataframe(import_df.head(10))
-                # Save for consolidation
-                consolidated_outputs.append((school_name, import_df))
-        # Report errors if any
-        if error_messages:
-            st.error("\n".join(error_messages))
-        # Prepare consolidated outputs
-        if consolidated_outputs:
-            # Group by school and concatenate
-            grouped = {}
-            for school, df_out in consolidated_outputs:
-                grouped.setdefault(school, []).append(df_out)
-            for school, dfs in grouped.items():
-                full_df = pd.concat(dfs, ignore_index=True)
-                # Create CSV in memory
-                csv_buffer = io.StringIO()
-                full_df.to_csv(csv_buffer, index=False)
-                csv_data = csv_buffer.getvalue().encode('utf-8')
-                st.download_button(
-                    label=f"Download {school}_Import.csv",
-                    data=csv_data,
-                    file_name=f"{school}_Import.csv",
-                    mime='text/csv',
+                st.dataframe(summary['preview'])
+                st.caption(f"{summary['rows']} rows streamed in {summary['chunks']} chunks")
+                _show_emirates_id_issues(summary['emirates_id'])
+                continue
+            normalised_df, import_df, err = result_cache.normalise(
+                file, digest, section_pattern_option, cache=cleaner_cache,
+                profiler=profiler, compact=compact, section_scope=section_scope,
+                disk=disk_cache, prefetched=prefetched,
+            )
+            if import_df is None:
+                error_messages.append(f"{filename}: {err}")
+                continue
+            # Ask the user for the school name (optional)
+            # Use filename (without extension) as default
+            default_school = re.sub(r'\.[^.]+$', '', filename)
+            school_name = st.text_input(
+                f"School name for {filename}", value=default_school,
+                key=f"school_{filename}"
+            )
+            # Preview
+            st.subheader(f"Preview of normalised data for {filename} ({school_name})")
+            st.dataframe(import_df.head(10))
+            if compact:
+                report = _compact_report_frame(normalised_df.attrs.get('compact_report', []))
+                report.insert(0, 'file', filename)
+                compact_reports.append(report)
+            date_formats = normalised_df.attrs.get('date_formats')
+            if date_formats:
+                st.caption("Date Of Birth formats: " + ", ".join(
+                    f"{fmt} ({count})" for fmt, count in date_formats.items() if count
+                ))
+            _show_emirates_id_issues(_emirates_id_issues(normalised_df['Emirate Id Status']),
+                                     normalised_df)
+            # Save for consolidation
+            if stream_csv:
+                out = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_BYTES)
+                with profiler.stage('export', len(import_df)):
+                    import_df.to_csv(out, index=False, encoding='utf-8')
+                outputs.append((school_name, filename, out))
+            else:
+                outputs.append((school_name, filename, import_df))
+    # Report errors if any
+    if error_messages:
+        st.error("\n".join(error_messages))
+    if compact_reports:
+        with st.expander("Memory saved by compact dtypes"):
+            st.dataframe(pd.concat(compact_reports, ignore_index=True))
+    with st.expander("Cache statistics"):
+        st.caption(
+            f"Result cache: {len(result_cache)} entries, "
+            f"{result_cache.nbytes / 2**20:.1f} MB, "
+            f"{result_cache.hits} hits, {result_cache.misses} misses"
+        )
+        if disk_cache is not None:
+            st.caption(
+                f"Disk cache ({disk_cache.directory}): {len(disk_cache)} files, "
+                f"{disk_cache.nbytes / 2**20:.1f} MB, "
+                f"{disk_cache.hits} hits, {disk_cache.misses} misses since the app started"
+            )
+        if len(cleaner_cache):
+            st.dataframe(cleaner_cache.stats_frame())
+    # Group outputs by school: import frames, or streamed CSV files
+    grouped = {}
+    for school, filename, part in outputs:
+        grouped.setdefault(school, []).append((filename, part))
+    if dedupe or fuzzy or delta:
+        for school, parts in grouped.items():
+            frames = [part if isinstance(part, pd.DataFrame) else _read_streamed_import(part)
+                      for _, part in parts]
+            if dedupe:
+                with profiler.file(school), profiler.stage('dedupe', sum(map(len, frames))):
+                    merged, conflicts = _deduplicate_students(
+                        frames, [filename for filename, _ in parts], priority)
+                st.caption(
+                    f"{school}: {sum(map(len, frames)) - len(merged)} duplicate rows merged, "
+                    f"{len(conflicts)} conflicting fields"
+                )
+                if len(conflicts):
+                    with st.expander(f"Merge conflicts for {school}"):
+                        st.dataframe(conflicts)
+                        st.download_button(
+                            label="Download conflicts as CSV",
+                            data=conflicts.to_csv(index=False).encode('utf-8'),
+                            file_name=f"{school}_Merge_Conflicts.csv",
+                            mime='text/csv',
+                            key=f"conflicts_{school}",
+                        )
+                grouped[school] = [(None, merged)]
+                frames = [merged]
+            if fuzzy:
+                combined = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+                with profiler.file(school), profiler.stage('fuzzy_duplicates', len(combined)):
+                    candidates = _fuzzy_duplicate_candidates(combined)
+                clusters = candidates['Cluster'].nunique()
+                st.caption(f"{school}: {clusters} groups of possible duplicates "
+                           f"({len(candidates)} rows)")
+                if clusters:
+                    with st.expander(f"Possible duplicates in {school}"):
+                        st.caption("Row is the data row in the import file; "
+                                   "nothing has been merged.")
+                        st.dataframe(candidates)
+                        st.download_button(
+                            label="Download possible duplicates as CSV",
+                            data=candidates.to_csv(index=False).encode('utf-8'),
+                            file_name=f"{school}_Possible_Duplicates.csv",
+                            mime='text/csv',
+                            key=f"fuzzy_{school}",
+                        )
+            if delta:
+                names = [_export_file_name(school, fmt) for fmt in EXPORT_FORMATS]
+                previous_file = next(
+                    (previous_imports[name] for name in names if name in previous_imports), None)
+                if previous_file is None and len(previous_imports) == 1 and len(grouped) == 1:
+                    previous_file = next(iter(previous_imports.values()))
+                if previous_file is None:
+                    st.caption(f"{school}: no previous import uploaded, exporting every row")
+                    continue
+                previous_file.seek(0)
+                previous, err = _read_previous_import(previous_file)
+                if previous is None:
+                    st.error(f"{school}: {err}")
+                    continue
+                combined = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+                with profiler.file(school), profiler.stage('delta', len(combined)):
+                    changes, report, summary = _import_delta(previous, combined)
+                st.caption(
+                    f"{school} against {previous_file.name}: {summary['new']} new, "
+                    f"{summary['changed']} changed, {summary['removed']} removed, "
+                    f"{summary['unchanged']} unchanged students"
                 )
+                if len(report):
+                    with st.expander(f"Changes for {school}"):
+                        st.caption("Removed students are listed here only; "
+                                   "the import file holds new and changed rows.")
+                        st.dataframe(report)
+                        st.download_button(
+                            label="Download changes as CSV",
+                            data=report.to_csv(index=False).encode('utf-8'),
+                            file_name=f"{school}_Import_Changes.csv",
+                            mime='text/csv',
+                            key=f"delta_{school}",
+                        )
+                grouped[school] = [(None, changes)]
+    grouped = {school: [part for _, part in parts] for school, parts in grouped.items()}
+    # Each school's file is written part by part (no concat, no str copy)
+    mime = EXPORT_FORMATS[export_format][1]
+    for school, sources in grouped.items():
+        file_name = _export_file_name(school, export_format)
+        rows = sum(len(part) for part in sources if isinstance(part, pd.DataFrame))
+        with profiler.file(file_name), profiler.stage('export', rows):
+            data = _export_to_buffer(sources, export_format)
+        st.download_button(
+            label=f"Download {file_name}",
+            data=data,
+            file_name=file_name,
+            mime=mime,
+        )
+    if len(grouped) > 1:
+        with profiler.file("All_Schools_Import.zip"), profiler.stage('export'):
+            bundle = io.BytesIO()
+            _write_zip_bundle(bundle, grouped, export_format)
+            bundle.seek(0)
+        st.download_button(
+            label="Download all schools (zip)",
+            data=bundle,
+            file_name="All_Schools_Import.zip",
+            mime='application/zip',
+        )
+    if len(profiler):
+        with st.expander("Pipeline profile"):
+            st.caption("Stages of files served from the result cache are not re-run "
+                       "and do not appear.")
+            st.dataframe(profiler.frame())
+            st.download_button(
+                label="Download profile as JSON",
+                data=profiler.to_json(indent=2),
+                file_name="pipeline_profile.json",
+                mime='application/json',
+            )
 
 
 # Run the app if executed as a script
@@ -0,0 +1,77 @@
+"""
+Tests for ``sjjp_batch_normalizer.py``.
+
+Run from this directory with ``python -m pytest``.  The CLI runs
+in-process (``-j 1``) on synthetic rosters written to a temporary
+directory.
+"""
+
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+import sjjp_batch_normalizer as batch
+import sjjp_student_normalizer_app as app
+from sjjp_benchmark import make_roster, roster_to_csv, roster_to_docx
+
+
+@pytest.fixture(scope='module')
+def inputs(tmp_path_factory) -> dict:
+    """Input files of two schools, one of them sent as two files."""
+    folder = tmp_path_factory.mktemp('inputs')
+    files = {
+        'Al Noor.csv': roster_to_csv(make_roster(300, seed=1)),
+        'Al Noor.docx': roster_to_docx(make_roster(200, seed=2)),
+        'Zayed.csv': roster_to_csv(make_roster(250, seed=3)),
+    }
+    for name, data in files.items():
+        (folder / name).write_bytes(data)
+    return {name: folder / name for name in files}
+
+
+def _expected_import(*paths) -> str:
+    """Import CSV of ``paths`` run through the app one by one."""
+    frames = []
+    for path in paths:
+        df, err = app._read_uploaded_file(app._NamedBytes.from_path(path))
+        assert err == ''
+        frames.append(app._to_import_format(app._normalise_dataframe(df, 'auto')))
+    return pd.concat(frames, ignore_index=True).to_csv(index=False)
+
+
+def test_cli_writes_one_import_file_per_school(inputs, tmp_path):
+    out = tmp_path / 'out'
+    folder = str(inputs['Zayed.csv'].parent)
+    assert batch.main([folder, '-o', str(out), '-j', '1']) == 0
+    assert sorted(p.name for p in out.iterdir()) == ['Al Noor_Import.csv', 'Zayed_Import.csv']
+    assert ((out / 'Al Noor_Import.csv').read_text(encoding='utf-8')
+            == _expected_import(inputs['Al Noor.csv'], inputs['Al Noor.docx']))
+    assert ((out / 'Zayed_Import.csv').read_text(encoding='utf-8')
+            == _expected_import(inputs['Zayed.csv']))
+
+
+def test_cli_zip_bundle_matches_the_school_files(inputs, tmp_path):
+    folder = str(inputs['Zayed.csv'].parent)
+    assert batch.main([folder, '-o', str(tmp_path / 'out'), '-j', '1']) == 0
+    bundle = tmp_path / 'imports.zip'
+    assert batch.main([folder, '-o', str(tmp_path / 'unused'), '-j', '1',
+                       '--zip', str(bundle)]) == 0
+    with zipfile.ZipFile(bundle) as z:
+        assert sorted(z.namelist()) == ['Al Noor_Import.csv', 'Zayed_Import.csv']
+        for name in z.namelist():
+            assert z.read(name) == (tmp_path / 'out' / name).read_bytes()
+
+
+def test_cli_dedupe_merges_the_files_of_a_school(inputs, tmp_path):
+    out = tmp_path / 'out'
+    copy = tmp_path / 'Al Noor.csv'
+    copy.write_bytes(inputs['Al Noor.csv'].read_bytes())
+    paths = sorted([inputs['Al Noor.csv'], inputs['Al Noor.docx'], copy])
+    assert batch.main([str(p) for p in paths] + ['-o', str(out), '-j', '1', '--dedupe']) == 0
+    frames = [pd.read_csv(io.StringIO(_expected_import(p)), dtype=str, keep_default_na=False)
+              for p in paths]
+    merged, _ = app._deduplicate_students(frames, [p.name for p in paths])
+    assert len(merged) < sum(map(len, frames)) - 300
+    assert (out / 'Al Noor_Import.csv').read_text(encoding='utf-8') == merged.to_csv(index=False)
@@ -0,0 +1,165 @@
+"""
+Tests for ``sjjp_normalizer_service.py``.
+
+Run from this directory with ``python -m pytest``.  Each test serves a
+``NormalisationService`` on a free local port from a background thread
+and talks to it over HTTP.  Tests that need jobs to stay queued or
+running hold the dispatchers at a gate before they run a job.
+"""
+
+import http.client
+import io
+import json
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import pandas as pd
+import pytest
+
+import sjjp_normalizer_service as service_module
+import sjjp_student_normalizer_app as app
+from sjjp_benchmark import make_roster, roster_to_csv
+
+_SCHOOL = 'مدرسة النور'
+
+
+@pytest.fixture(scope='module')
+def roster_csv() -> bytes:
+    return roster_to_csv(make_roster(300, seed=1))
+
+
+@contextmanager
+def _serving(tmp_path, gate: threading.Event = None, max_upload_bytes: int = 1024 ** 2,
+             **kwargs):
+    """Yield ``(service, port)``; with ``gate`` jobs only run once it is set."""
+    service = service_module.NormalisationService(tmp_path, workers=1, **kwargs)
+    if gate is not None:
+        run = service._run
+        service._run = lambda job: (gate.wait(), run(job))
+    server = service_module.make_server(service, port=0, max_upload_bytes=max_upload_bytes,
+                                        quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield service, server.server_port
+    finally:
+        server.shutdown()
+        server.server_close()
+        if gate is not None:
+            gate.set()
+        service.close()
+
+
+def _request(port: int, method: str, path: str, body: bytes = None):
+    """``(status, headers, body)`` of one request."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        connection.close()
+
+
+def _submit(port: int, data: bytes, query: str = 'filename=roster.csv'):
+    status, _, body = _request(port, 'POST', f'/jobs?{query}', data)
+    return status, json.loads(body)
+
+
+def _wait(port: int, job_id: str, statuses=('done', 'failed'), timeout: float = 60) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        status, _, body = _request(port, 'GET', f'/jobs/{job_id}')
+        assert status == 200
+        job = json.loads(body)
+        if job['status'] in statuses:
+            return job
+        assert time.monotonic() < deadline, job
+        time.sleep(0.05)
+
+
+def test_result_of_an_arabic_school_name_round_trips(tmp_path, roster_csv):
+    with _serving(tmp_path) as (_, port):
+        query = f'filename=roster.csv&school={quote(_SCHOOL)}&section_pattern=letters'
+        status, job = _submit(port, roster_csv, query)
+        assert status == 202 and job['status'] in ('queued', 'running')
+        job = _wait(port, job['id'])
+        assert job['status'] == 'done' and job['rows'] == 300
+        status, headers, body = _request(port, 'GET', job['result_url'])
+    assert status == 200
+    name = app._export_file_name(_SCHOOL, 'csv')
+    disposition = headers['Content-Disposition']
+    assert disposition.endswith(f"; filename*=UTF-8''{quote(name, safe='')}")
+    assert disposition.startswith('attachment; filename="') and disposition.isascii()
+    df = pd.read_csv(io.BytesIO(roster_csv), dtype=str)
+    expected = app._to_import_format(app._normalise_dataframe(df, 'letters'))
+    assert body.decode('utf-8') == expected.to_csv(index=False)
+
+
+def test_jobs_can_be_polled_and_results_wait_for_them(tmp_path, roster_csv):
+    gate = threading.Event()
+    with _serving(tmp_path, gate=gate) as (_, port):
+        _, job = _submit(port, roster_csv)
+        running = _wait(port, job['id'], statuses=('running',))
+        assert running['started'] is not None and running['finished'] is None
+        status, _, body = _request(port, 'GET', f"/jobs/{job['id']}/result")
+        assert status == 409 and json.loads(body)['error'].endswith('is running')
+        status, _, body = _request(port, 'GET', '/jobs')
+        assert status == 200 and [j['id'] for j in json.loads(body)] == [job['id']]
+        gate.set()
+        done = _wait(port, job['id'])
+        assert done['status'] == 'done' and done['result_url'].endswith('/result')
+        assert _request(port, 'GET', '/jobs/unknown')[0] == 404
+
+
+def test_uploads_over_the_size_limit_are_refused(tmp_path, roster_csv):
+    with _serving(tmp_path, max_upload_bytes=len(roster_csv) - 1) as (service, port):
+        status, body = _submit(port, roster_csv)
+        assert status == 413 and 'limited' in body['error']
+        assert service.status() == []
+        status, body = _submit(port, roster_csv[:len(roster_csv) // 2])
+        assert status == 202
+
+
+def test_a_full_queue_answers_503(tmp_path, roster_csv):
+    gate = threading.Event()
+    with _serving(tmp_path, gate=gate, queue_size=1) as (service, port):
+        _, running = _submit(port, roster_csv)
+        _wait(port, running['id'], statuses=('running',))
+        status, queued = _submit(port, roster_csv)
+        assert status == 202 and queued['status'] == 'queued'
+        status, _, body = _request(port, 'POST', '/jobs?filename=roster.csv', roster_csv)
+        assert status == 503 and json.loads(body)['error'] == 'The job queue is full'
+        assert len(service.status()) == 2
+        # the refused upload left nothing behind
+        assert sorted(p.name for p in tmp_path.iterdir()) == sorted([running['id'],
+                                                                     queued['id']])
+
+
+def test_close_cancels_queued_jobs_and_finishes_running_ones(tmp_path, roster_csv):
+    gate = threading.Event()
+    with _serving(tmp_path, gate=gate, queue_size=2) as (service, port):
+        _, running = _submit(port, roster_csv)
+        _wait(port, running['id'], statuses=('running',))
+        queued = [_submit(port, roster_csv)[1] for _ in range(2)]
+        assert _submit(port, roster_csv)[0] == 503
+
+        # a full queue must not block close()
+        closing = threading.Thread(target=service.close)
+        closing.start()
+        deadline = time.monotonic() + 30
+        while any(service.status(job['id'])['status'] != 'cancelled' for job in queued):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        assert not any((tmp_path / job['id']).exists() for job in queued)
+        assert service.status(running['id'])['status'] == 'running'
+        # no new jobs once closing, even with room in the queue
+        status, body = _submit(port, roster_csv)
+        assert status == 503
+        assert sorted(p.name for p in tmp_path.iterdir()) == [running['id']]
+        gate.set()
+        closing.join(60)
+        assert not closing.is_alive()
+        assert service.status(running['id'])['status'] == 'done'
@@ -0,0 +1,635 @@
+"""
+Tests for ``sjjp_student_normalizer_app.py``.
+
+Run from this directory with ``python -m pytest``.  Rosters come from
+the benchmark's synthetic generator, so the engines are compared on the
+same messy values the benchmarks time; the workbooks and documents of
+the reader tests are built by hand to hit specific cell layouts.
+"""
+
+import datetime
+import io
+import random
+import re
+import time
+import warnings
+import zipfile
+
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+
+import sjjp_student_normalizer_app as app
+import sjjp_benchmark
+from sjjp_benchmark import make_roster, roster_to_csv
+
+# Raw dates the vectorized engine reads differently from the scalar
+# reference by design: ISO dates (which pandas swaps under dayfirst) and
+# Excel serial numbers (which the scalar helper does not convert).
+_ISO_OR_SERIAL = r'^\s*(?:\d{4}-|\d+\s*$)'
+
+
+def _comparable(values: pd.Series, grades: bool = False) -> list:
+    """Return ``values`` as a list with missing cells as ``None``.
+
+    With ``grades`` the values are compared as integers: the scalar engine
+    leaves grades as floats.
+    """
+    out = [None if not isinstance(v, list) and pd.isna(v) else v for v in values]
+    if grades:
+        out = [None if v is None else int(v) for v in out]
+    return out
+
+
+@pytest.fixture(scope='module')
+def roster() -> pd.DataFrame:
+    return make_roster(2_000, seed=1)
+
+
+@pytest.mark.parametrize('option', ['auto', 'letters', 'numbers'])
+def test_engines_agree_on_synthetic_roster(roster, option):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        scalar = app._normalise_dataframe(roster, option, engine='scalar')
+    vectorized = app._normalise_dataframe(roster, option, engine='vectorized')
+
+    assert list(scalar.columns) == list(vectorized.columns)
+    dob = app._standardise_column_names(roster.copy())['Date Of Birth']
+    same_dates = ~dob.str.contains(_ISO_OR_SERIAL, na=False).to_numpy()
+    assert same_dates.sum() > len(roster) // 2
+    for column in scalar.columns:
+        expected, actual = scalar[column], vectorized[column]
+        if column == 'Date Of Birth':
+            expected, actual = expected[same_dates], actual[same_dates]
+        grades = column == 'Grade'
+        assert _comparable(expected, grades) == _comparable(actual, grades), column
+
+    rows = same_dates.nonzero()[0]
+    assert (app._to_import_format(scalar).iloc[rows].to_csv(index=False)
+            == app._to_import_format(vectorized).iloc[rows].to_csv(index=False))
+
+
+@pytest.mark.parametrize('field', [f for f in sjjp_benchmark._FIELD_INPUTS if f != 'date'])
+def test_engine_entries_agree_on_benchmark_inputs(roster, field):
+    column, use_cleaned = sjjp_benchmark._FIELD_INPUTS[field]
+    cleaned = app._clean_dataframe(roster)
+    values = (cleaned if use_cleaned else app._standardise_column_names(roster.copy()))[column]
+    args = sjjp_benchmark._field_args(field, values, cleaned)
+    expected = app.NORMALISATION_ENGINES['scalar'][field](*args)
+    actual = app.NORMALISATION_ENGINES['vectorized'][field](*args)
+    if isinstance(expected, pd.Series):
+        grades = field == 'grade'
+        expected, actual = _comparable(expected, grades), _comparable(actual, grades)
+    assert expected == actual
+
+
+@pytest.mark.parametrize('cache', [False, True])
+def test_cleaner_cache_does_not_change_results(roster, cache):
+    expected = app._normalise_dataframe(roster, 'auto', engine='vectorized')
+    cleaner_cache = app.CleanerCache(max_entries=100) if cache else None
+    for _ in range(2):
+        actual = app._normalise_dataframe(roster, 'auto', engine='vectorized',
+                                          cache=cleaner_cache)
+        pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_cleaner_cache_keeps_engines_apart():
+    cache = app.CleanerCache()
+    values = pd.Series(['a', 'b', 'a'])
+    assert cache.clean('name', lambda s: s.str.upper(), values, 'scalar').tolist() == \
+        ['A', 'B', 'A']
+    assert cache.clean('name', lambda s: s + '!', values, 'vectorized').tolist() == \
+        ['a!', 'b!', 'a!']
+    assert len(cache) == 4
+
+
+def _day_first_column(n: int) -> list:
+    """Return ``n`` distinct day-first dates, enough to outnumber the sample."""
+    days = pd.date_range('2005-01-01', periods=n, freq='D')
+    return list(days.strftime('%d/%m/%Y'))
+
+
+@pytest.mark.parametrize('size', [10, app.DATE_SAMPLE_SIZE * 5])
+def test_rare_date_formats_are_parsed_whatever_the_column_holds(size):
+    values = pd.Series(_day_first_column(size) + ['2010-05-06', '40000', ' 6 May 2010 '])
+    cleaned = app._clean_date_series(values)
+    assert cleaned.iloc[-3:].tolist() == ['2010-05-06', '2009-07-06', '2010-05-06']
+    assert cleaned.iloc[0] == '2005-01-01'
+    formats = cleaned.attrs['date_formats']
+    assert formats['%d/%m/%Y'] == size
+    assert formats['%Y-%m-%d'] == formats[app.EXCEL_SERIAL] == 1
+    assert formats['fallback'] == formats['unparsed'] == 0
+
+
+def test_excel_serials_parse_without_overflow_warnings():
+    values = pd.Series(['40000', '40000.0', '6/5/2010', None, '123456', 'x'])
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        parsed = app._parse_date_format(values, app.EXCEL_SERIAL)
+    assert parsed.iloc[:2].tolist() == [pd.Timestamp('2009-07-06')] * 2
+    assert parsed.iloc[2:].isna().all()
+
+
+def test_date_formats_are_ranked_by_the_sample():
+    values = pd.Series(['2010-05-06'] * 3 + ['06/05/2010'])
+    formats = app._infer_date_formats(values)
+    assert formats[:2] == ['%Y-%m-%d', '%d/%m/%Y']
+    assert sorted(formats) == sorted(app.DATE_FORMATS + [app.EXCEL_SERIAL])
+
+
+def _import_frame(rows: list) -> pd.DataFrame:
+    """Import frame of ``(student_no, emirate_id, name)`` rows."""
+    df = pd.DataFrame(rows, columns=['Student No', 'Emirate Id', 'Student Name'])
+    df['Emirate Id'] = app._clean_emirates_id_series(df['Emirate Id'])
+    df['Emirate Id Status'] = app._emirates_id_status_series(
+        df['Emirate Id'], pd.Series([None] * len(df), dtype=object))
+    return df
+
+
+_VALID_ID = '784-2010-1234567-0'
+
+
+def test_valid_id_fixture_is_valid():
+    assert app._emirates_id_status(_VALID_ID, None) == 'valid'
+
+
+def test_dedupe_merges_students_across_files():
+    first = _import_frame([('1', _VALID_ID, 'Ahmed Ali'), ('2', '', 'Sara Khan')])
+    second = _import_frame([('', ' 784201012345670.0', ''), ('2', '', 'Sara Khan')])
+    merged, conflicts = app._deduplicate_students([first, second], ['a.csv', 'b.csv'])
+    assert merged['Student Name'].tolist() == ['Ahmed Ali', 'Sara Khan']
+    assert merged['Student No'].tolist() == ['1', '2']
+    assert conflicts.empty
+
+
+@pytest.mark.parametrize('placeholder', ['0', '000', 'N/A', '784', '784-0000-0000000-0'])
+def test_dedupe_ignores_placeholder_emirates_ids(placeholder):
+    frame = _import_frame([('', placeholder, 'Ahmed Ali'), ('', placeholder, 'Sara Khan'),
+                           ('3', placeholder, 'Omar Haddad')])
+    merged, _ = app._deduplicate_students([frame], ['a.csv'])
+    assert merged['Student Name'].tolist() == ['Ahmed Ali', 'Sara Khan', 'Omar Haddad']
+
+
+def test_dedupe_requires_a_valid_status_when_present():
+    bad_check_digit = '784-2010-1234567-1'
+    frame = _import_frame([('', bad_check_digit, 'Ahmed Ali'), ('', bad_check_digit, 'Sara Khan')])
+    assert frame['Emirate Id Status'].tolist() == ['invalid check digit'] * 2
+    merged, _ = app._deduplicate_students([frame], ['a.csv'])
+    assert len(merged) == 2
+    merged, _ = app._deduplicate_students([frame.drop(columns='Emirate Id Status')], ['a.csv'])
+    assert len(merged) == 1
+
+
+def test_dedupe_never_joins_different_student_nos():
+    # 1 and 2 share an Emirates ID, and the ID-only record would chain them
+    frame = _import_frame([('1', _VALID_ID, 'Ahmed Ali'), ('2', _VALID_ID, 'Sara Khan'),
+                           ('', _VALID_ID, 'Omar Haddad'), ('1', '', '')])
+    merged, _ = app._deduplicate_students([frame], ['a.csv'])
+    assert merged['Student No'].tolist() == ['1', '2', '']
+    assert merged['Student Name'].tolist() == ['Ahmed Ali', 'Sara Khan', 'Omar Haddad']
+
+
+@pytest.mark.parametrize('engine', ['scalar', 'vectorized'])
+def test_missing_phone_column_gives_each_row_its_own_list(engine):
+    raw = pd.DataFrame({'Student Name': ['ahmed ali', 'sara khan']})
+    df = app._normalise_dataframe(raw, 'auto', engine=engine, keep_all_phones=True)
+    numbers = df['Parent Phone Numbers']
+    assert numbers.tolist() == [[], []]
+    numbers.iloc[0].append('+971501234567')
+    assert numbers.iloc[1] == []
+
+
+@pytest.mark.parametrize('option, expected', [('auto', ['1', '2', '1']),
+                                              ({-1: 'letters', 5: 'numbers'}, ['A', 'B', 'A'])])
+def test_section_scope_grade_without_a_grade_column(option, expected):
+    plan = [rule for rule in app.NORMALISATION_PLAN
+            if 'Grade' not in (rule['column'], *rule.get('derive', []))]
+    cleaned = app._clean_dataframe(pd.DataFrame({'Section': ['1', '2', 'A']}), plan=plan)
+    assert 'Grade' not in cleaned.columns
+    df = app._apply_section_pattern(cleaned, option, section_scope='grade')
+    assert df['Section'].tolist() == expected
+
+
+@pytest.mark.skipif(app.pq is None, reason='the disk cache needs pyarrow')
+def test_disk_cache_files_get_default_permissions(tmp_path):
+    cache = app.DiskCache(str(tmp_path / 'cache'))
+    assert cache.put(('digest', '.csv', 'vectorized'), pd.DataFrame({'Grade': ['5']}))
+    (tmp_path / 'plain').write_bytes(b'')
+    modes = {path.stat().st_mode & 0o777 for path in (tmp_path / 'cache').iterdir()}
+    assert modes == {(tmp_path / 'plain').stat().st_mode & 0o777}
+
+
+def test_prefetched_frames_are_not_kept_in_the_result_cache(roster):
+    upload = app._NamedBytes(roster_to_csv(roster), 'roster.csv')
+    digest = app._file_digest(upload)
+    cache = app.ResultCache()
+    prefetched = cache.prefetch(upload, digest)
+    assert prefetched[0] is not None and len(cache) == 0
+    _, import_df, _ = cache.normalise(upload, digest, 'auto', prefetched=prefetched)
+    assert {key[0] for key in cache._entries} == {'clean', 'normalise'}
+    assert cache.prefetch(upload, digest) is None
+    expected = app.ResultCache().normalise(upload, digest, 'auto')[1]
+    pd.testing.assert_frame_equal(import_df, expected)
+
+
+def test_import_email_domains_are_compared_in_lower_case():
+    df = pd.DataFrame({'Student Email': ['Sara.Khan@ESE.gov.ae', 'omar@gmail.com', ''],
+                       'Parent Email': ['parent@gmail.com', 'p@gmail.com', 'P@Hotmail.com']})
+    rules = [('Student Email', ('@ese.gov.ae',)), ('Parent Email', ())]
+    chosen = app._choose_import_email(df, rules)
+    assert chosen.tolist() == ['Sara.Khan@ESE.gov.ae', 'p@gmail.com', 'P@Hotmail.com']
+
+
+@pytest.mark.parametrize('option', ['auto', 'letters'])
+def test_streamed_csv_matches_the_whole_file_pipeline(roster, option):
+    data = roster_to_csv(roster)
+    output = io.StringIO()
+    summary, err = app._stream_csv_to_import(io.BytesIO(data), output, option, chunksize=300)
+    assert err == '' and summary['rows'] == len(roster) and summary['chunks'] == 7
+    df = pd.read_csv(io.BytesIO(data), dtype=str)
+    expected = app._to_import_format(app._normalise_dataframe(df, option))
+    assert output.getvalue() == expected.to_csv(index=False)
+
+
+def test_streamed_header_only_csv_writes_the_import_header():
+    output = io.StringIO()
+    summary, err = app._stream_csv_to_import(io.BytesIO(b'Student Name,Grade,Section\n'),
+                                             output, 'auto')
+    assert err == '' and summary['rows'] == 0
+    assert output.getvalue() == summary['preview'].to_csv(index=False)
+    assert output.getvalue().count('\n') == 1
+
+
+def test_streamed_csv_failure_truncates_the_output(roster, monkeypatch):
+    to_import_format = app._to_import_format
+    calls = []
+
+    def fail_on_third_chunk(df, **kwargs):
+        calls.append(len(df))
+        if len(calls) == 3:
+            raise ValueError('boom')
+        return to_import_format(df, **kwargs)
+
+    monkeypatch.setattr(app, '_to_import_format', fail_on_third_chunk)
+    output = io.StringIO()
+    output.write('kept\n')
+    summary, err = app._stream_csv_to_import(io.BytesIO(roster_to_csv(roster)), output,
+                                             'letters', chunksize=300)
+    assert summary is None and 'boom' in err
+    assert output.getvalue() == 'kept\n'
+
+
+def _docx(body: str) -> bytes:
+    """Word document whose ``w:body`` holds ``body``."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as z:
+        z.writestr('[Content_Types].xml', sjjp_benchmark._DOCX_CONTENT_TYPES)
+        z.writestr('_rels/.rels', sjjp_benchmark._DOCX_RELS)
+        z.writestr('word/document.xml',
+                   f'<w:document xmlns:w="{app._W_NS["w"]}"><w:body>{body}</w:body>'
+                   '</w:document>')
+    return buffer.getvalue()
+
+
+def _tc(*paragraphs: str, props: str = '') -> str:
+    return (f'<w:tc>{props}' + ''.join(f'<w:p><w:r><w:t>{p}</w:t></w:r></w:p>'
+                                        for p in paragraphs) + '</w:tc>')
+
+
+def _tbl(*rows) -> str:
+    return '<w:tbl>' + ''.join('<w:tr>' + ''.join(row) + '</w:tr>' for row in rows) + '</w:tbl>'
+
+
+_HEADER = [_tc('Student Name'), _tc('Grade'), _tc('Section')]
+_DOCX_BODIES = {
+    'merged cells': _tbl(
+        _HEADER,
+        [_tc('Ahmed Ali'), _tc('5', props='<w:tcPr><w:vMerge w:val="restart"/></w:tcPr>'),
+         _tc('A')],
+        [_tc('Sara Khan'), '<w:tc><w:tcPr><w:vMerge/></w:tcPr><w:p/></w:tc>', _tc('B')],
+        [_tc('Both sections', props='<w:tcPr><w:gridSpan w:val="3"/></w:tcPr>')]),
+    'empty cells': _tbl(
+        _HEADER,
+        [_tc('Ahmed Ali'), '<w:tc><w:p/></w:tc>', _tc(' ')],
+        [_tc('Sara', ' ', 'Khan'), _tc('6'), _tc('C'), _tc('extra')]),
+    'multiple tables': '<w:p><w:r><w:t>Students</w:t></w:r></w:p>' + _tbl(
+        _HEADER, [_tc('Ahmed Ali'), _tc('5'), _tc('A')]) + _tbl(
+        _HEADER, [_tc('Sara Khan'), _tc('6'), _tc('B')],
+        [_tc('Omar Haddad'), _tc('7'), _tc(_tbl([_tc('nested')]))]) + _tbl(
+        _HEADER, [_tc('Tie'), _tc('8'), _tc('C')], [_tc('Tie'), _tc('9'), _tc('D')]),
+    'nested table': _tbl([_tc('outer')], [_tc(_tbl(
+        _HEADER, [_tc('Ahmed Ali'), _tc('5'), _tc('A')], [_tc('Sara Khan'), _tc('6'), _tc('B')],
+        [_tc('Omar Haddad'), _tc('7'), _tc('C')]))]),
+    'no table': '<w:p><w:r><w:t>No students</w:t></w:r></w:p>',
+}
+
+
+@pytest.mark.parametrize('case', list(_DOCX_BODIES))
+def test_streaming_docx_reader_matches_the_tree_reader(case):
+    data = _docx(_DOCX_BODIES[case])
+    expected = app._docx_to_dataframe(data)
+    actual = app._docx_to_dataframe_streaming(data)
+    if expected is None:
+        assert actual is None
+    else:
+        pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_streaming_docx_reader_matches_the_tree_reader_on_a_roster(roster):
+    data = sjjp_benchmark.roster_to_docx(roster.head(200))
+    pd.testing.assert_frame_equal(app._docx_to_dataframe_streaming(data),
+                                  app._docx_to_dataframe(data))
+
+
+def test_stage_profiler_records_add_up_over_chunks_and_files(roster):
+    data = roster_to_csv(roster)
+    profiler = app.StageProfiler()
+    started = time.perf_counter()
+    with profiler.file('streamed.csv'):
+        summary, _ = app._stream_csv_to_import(io.BytesIO(data), io.StringIO(), 'letters',
+                                               chunksize=300, profiler=profiler)
+    with profiler.file('whole.csv'):
+        df = pd.read_csv(io.BytesIO(data), dtype=str)
+        normalised = app._normalise_dataframe(df, 'letters', profiler=profiler)
+        with app._profile_stage(profiler, 'import_format', len(normalised)):
+            app._to_import_format(normalised)
+    elapsed = time.perf_counter() - started
+
+    records = profiler.frame()
+    streamed = records[records['file'] == 'streamed.csv'].set_index('stage')
+    whole = records[records['file'] == 'whole.csv'].set_index('stage')
+    assert len(records) == len(streamed) + len(whole)
+    assert streamed.loc['read', 'calls'] == summary['chunks'] + 1 == 8
+    assert streamed.loc['read', 'rows'] == streamed.loc['export', 'rows'] == len(roster)
+    # per-row stages see each chunk as they see the whole file
+    for stage in whole.index:
+        if stage.startswith('clean:') and whole.loc[stage, 'rows'] % len(roster) == 0:
+            assert streamed.loc[stage, 'rows'] == whole.loc[stage, 'rows'], stage
+            assert streamed.loc[stage, 'calls'] == whole.loc[stage, 'calls'] * 7, stage
+    assert records['seconds'].sum() <= elapsed
+
+
+@pytest.mark.parametrize('option', ['auto', 'numbers'])
+def test_compact_mode_writes_identical_csv(roster, option):
+    plain = app._normalise_dataframe(roster, option)
+    compact = app._normalise_dataframe(roster, option, compact=True)
+    assert compact.attrs['compact_report']
+    assert (compact['Gender'].dtype == 'category') and (plain['Gender'].dtype == object)
+    assert compact.to_csv(index=False) == plain.to_csv(index=False)
+    buffers = [app._export_to_buffer([app._to_import_format(df, compact=c)])
+               for df, c in ((plain, False), (compact, True))]
+    assert buffers[0].getvalue() == buffers[1].getvalue()
+
+
+def _export_sources(roster, tmp_path) -> list:
+    """The import rows of ``roster`` as a frame, a CSV file object and a CSV path."""
+    import_df = app._to_import_format(app._normalise_dataframe(roster, 'auto'))
+    thirds = [import_df.iloc[:700], import_df.iloc[700:1400], import_df.iloc[1400:]]
+    path = tmp_path / 'part.csv'
+    thirds[2].to_csv(path, index=False, encoding='utf-8')
+    return [thirds[0], io.BytesIO(thirds[1].to_csv(index=False).encode('utf-8')), path]
+
+
+def _read_export(data: bytes, fmt: str) -> pd.DataFrame:
+    if fmt == 'parquet':
+        return pd.read_parquet(io.BytesIO(data)).fillna('')
+    return pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False,
+                       compression='gzip' if fmt == 'csv.gz' else None)
+
+
+@pytest.mark.parametrize('fmt', list(app.EXPORT_FORMATS))
+def test_export_round_trips_every_source_kind(roster, tmp_path, fmt):
+    if fmt not in app._available_export_formats():
+        pytest.skip(f'{fmt} export needs pyarrow')
+    sources = _export_sources(roster, tmp_path)
+    expected = app._to_import_format(app._normalise_dataframe(roster, 'auto'))
+    expected = expected.astype(object).fillna('').astype(str)
+
+    data = app._export_to_buffer(sources, fmt).getvalue()
+    pd.testing.assert_frame_equal(_read_export(data, fmt), expected)
+    if fmt == 'csv':
+        assert data.decode('utf-8') == expected.to_csv(index=False)
+
+    output = io.BytesIO()
+    with app.ImportWriter(output, fmt) as writer:
+        for source in sources:
+            writer.write(source)
+    assert output.getvalue() == data
+
+    bundle = io.BytesIO()
+    app._write_zip_bundle(bundle, {'Al Noor': sources, 'مدرسة النور': sources[:1]}, fmt)
+    with zipfile.ZipFile(bundle) as z:
+        assert z.namelist() == [app._export_file_name('Al Noor', fmt),
+                                app._export_file_name('مدرسة النور', fmt)]
+        assert z.read(z.namelist()[0]) == data
+        pd.testing.assert_frame_equal(_read_export(z.read(z.namelist()[1]), fmt),
+                                      expected.iloc[:700])
+
+
+def test_import_writer_rejects_unknown_formats():
+    with pytest.raises(ValueError):
+        app.ImportWriter(io.BytesIO(), 'xlsx')
+
+
+_XLSX_HEADER = ['Student Name', 'Grade', 'Section', 'Date Of Birth', 'Mobile']
+
+
+def _workbook(sheets: dict, epoch=None, styles: bool = True) -> bytes:
+    """Workbook holding ``{sheet name: rows}``; ``None`` cells are left out."""
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    if epoch is not None:
+        wb.epoch = epoch
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        for r, row in enumerate(rows, start=1):
+            for c, value in enumerate(row, start=1):
+                if value is None:
+                    continue
+                cell = ws.cell(row=r, column=c, value=value)
+                if styles and isinstance(value, (datetime.date, datetime.time)):
+                    cell.number_format = 'dd/mm/yyyy' if c % 2 else 'yyyy-mm-dd hh:mm'
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _shared_strings(data: bytes) -> bytes:
+    """``data`` with its inline string cells moved to a shared string table.
+
+    openpyxl writes inline strings while Excel writes shared ones; strings
+    holding a space are stored as two rich text runs.
+    """
+    shared = {}
+
+    def share(match) -> str:
+        index = shared.setdefault(match.group(3), len(shared))
+        return f'<c r="{match.group(1)}"{match.group(2) or ""} t="s"><v>{index}</v></c>'
+
+    def si(text: str) -> str:
+        head, space, tail = text.partition(' ')
+        if not space:
+            return f'<si><t>{text}</t></si>'
+        return (f'<si><r><t>{head}</t></r>'
+                f'<r><t xml:space="preserve"> {tail}</t></r></si>')
+
+    source = zipfile.ZipFile(io.BytesIO(data))
+    parts = {name: source.read(name) for name in source.namelist()}
+    for name in parts:
+        if name.startswith('xl/worksheets/'):
+            parts[name] = re.sub(
+                r'<c r="([A-Z]+\d+)"( s="\d+")? t="inlineStr"><is><t[^>]*>(.*?)</t></is></c>',
+                share, parts[name].decode('utf-8')).encode('utf-8')
+    parts['xl/sharedStrings.xml'] = (
+        f'<sst xmlns="{app._S[1:-1]}" count="{len(shared)}" uniqueCount="{len(shared)}">'
+        + ''.join(map(si, shared)) + '</sst>').encode('utf-8')
+    parts['xl/_rels/workbook.xml.rels'] = parts['xl/_rels/workbook.xml.rels'].replace(
+        b'</Relationships>',
+        b'<Relationship Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+        b'relationships/sharedStrings" Target="sharedStrings.xml" Id="rIdShared" />'
+        b'</Relationships>')
+    parts['[Content_Types].xml'] = parts['[Content_Types].xml'].replace(
+        b'</Types>',
+        b'<Override PartName="/xl/sharedStrings.xml" ContentType="application/'
+        b'vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml" /></Types>')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as out:
+        for name, part in parts.items():
+            out.writestr(name, part)
+    return buffer.getvalue()
+
+
+def _student_rows(n: int, seed: int) -> list:
+    """Rows of mixed cell types: text, numbers, booleans, dates and gaps."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        born = datetime.date(2008, 1, 1) + datetime.timedelta(days=rng.randrange(3000))
+        rows.append([
+            rng.choice(['Ahmed Ali', 'sara  khan', 'مريم أحمد', ' Omar ', '']),
+            rng.choice([5, 6, 7.0, 'KG2', None]),
+            rng.choice(['A', '1', 2, None]),
+            rng.choice([born, datetime.datetime.combine(born, datetime.time(7, 30)),
+                        born.strftime('%d/%m/%Y'), None]),
+            rng.choice([971501234567, 5.5, '050 123 4567', True, None]),
+        ])
+    return rows
+
+
+_XLSX_CASES = {
+    'dates': lambda: _workbook({'Students': [_XLSX_HEADER] + _student_rows(200, 1)}),
+    '1904 dates': lambda: _workbook({'Students': [_XLSX_HEADER] + _student_rows(200, 2)},
+                                    epoch=CALENDAR_MAC_1904),
+    'shared strings': lambda: _shared_strings(
+        _workbook({'Students': [_XLSX_HEADER] + _student_rows(200, 3)})),
+    'sparse rows': lambda: _workbook({'Students': [
+        _XLSX_HEADER, ['Ahmed Ali', 5], [], [None, None, 'B'], [], [],
+        ['Sara Khan', None, None, None, 971501234567], [None] * 4 + ['x'], [], []]}),
+    'multi-sheet': lambda: _workbook({
+        'Grade 5': [_XLSX_HEADER] + _student_rows(50, 4),
+        'Notes': [['Instructions'], ['Fill in one row per student']],
+        'Grade 6': [['Name', 'Class', 'Gender']] + [[f'Student {i}', 'B', 'M'] for i in range(30)],
+    }),
+}
+
+
+@pytest.fixture(scope='module')
+def workbooks() -> dict:
+    return {case: build() for case, build in _XLSX_CASES.items()}
+
+
+@pytest.mark.parametrize('case', list(_XLSX_CASES))
+def test_xlsx_sheet_reader_matches_read_excel(workbooks, case):
+    data = workbooks[case]
+    expected = pd.read_excel(io.BytesIO(data), sheet_name=None, dtype=str, engine='openpyxl')
+    for name, df in expected.items():
+        actual = app._read_xlsx_sheet(data, name, require_mapped=False)
+        pd.testing.assert_frame_equal(actual, df, check_dtype=False, obj=f'{case}: {name}')
+
+
+@pytest.mark.parametrize('case', list(_XLSX_CASES))
+def test_xlsx_fast_reader_matches_read_excel(workbooks, case):
+    data = workbooks[case]
+    sheets = pd.read_excel(io.BytesIO(data), sheet_name=None, dtype=str, engine='openpyxl')
+    mapped = [df for df in sheets.values() if app._has_mapped_header(df.columns)]
+    expected = (mapped[0] if len(mapped) == 1 else pd.concat(
+        [app._standardise_column_names(df) for df in mapped], ignore_index=True))
+    sequential = app._read_xlsx_fast(data, sheet_workers=1)
+    pd.testing.assert_frame_equal(sequential, expected, check_dtype=False)
+    if len(sheets) > 1:
+        pd.testing.assert_frame_equal(app._read_xlsx_fast(data, sheet_workers=2), sequential)
+
+
+def _fuzzy_frame(names: list, dobs: list) -> pd.DataFrame:
+    df = pd.DataFrame({'Student Name': names, 'Date Of Birth': dobs})
+    for column in ('Grade', 'Gender', 'Student No', 'Emirate Id'):
+        df[column] = ''
+    return df
+
+
+# Sort (by phonetic key) between Omar and Umar, whose keys start with the
+# letter they are spelt with, and match neither of them nor each other.
+_FILLERS = ['Peter Smith', 'Qasim Ali', 'Rashid Khan', 'Salem Noor', 'Tariq Aziz']
+
+
+@pytest.mark.parametrize('between', [0, app.FUZZY_WINDOW - 2, app.FUZZY_WINDOW - 1])
+def test_fuzzy_candidates_come_from_the_name_window(between):
+    names = ['Omar Haddad'] + _FILLERS[:between] + ['Umar Haddad']
+    df = _fuzzy_frame(names, ['2012-03-04'] * len(names))
+    found = app._fuzzy_duplicate_candidates(df)
+    if between < app.FUZZY_WINDOW - 1:
+        assert found['Row'].tolist() == [1, len(df)]
+        assert found['Score'].tolist() == [1.0, 1.0]
+    else:
+        assert found.empty
+    # comparing every pair finds them at any distance
+    found = app._fuzzy_duplicate_candidates(df, window=len(df))
+    assert found['Row'].tolist() == [1, len(df)]
+
+
+def test_fuzzy_candidates_of_the_phonetic_pass_need_no_birth_date():
+    # row 3 has no birth date block; only the phonetic block pairs it
+    df = _fuzzy_frame(['Mohammed Al Ali', 'Sara Khan', 'Muhammad Al-Ali'],
+                      ['2012-03-04', '2012-03-04', ''])
+    found = app._fuzzy_duplicate_candidates(df)
+    assert found['Row'].tolist() == [1, 3]
+    assert found['Cluster'].tolist() == [1, 1]
+
+
+def _graded(rows: list) -> pd.DataFrame:
+    """``_import_frame`` of ``(student_no, emirate_id, name, grade)`` rows."""
+    df = _import_frame([row[:3] for row in rows])
+    df.insert(3, 'Grade', [row[3] for row in rows])
+    return df
+
+
+def test_import_delta_reports_new_changed_and_removed_students():
+    previous = _graded([('', _VALID_ID, 'Ahmed Ali', '5'), ('2', '', 'Sara Khan', '6'),
+                        ('3', '', 'Omar Haddad', '7'), ('5', '', 'Mona Saeed', '5')])
+    current = _graded([('10', _VALID_ID, 'Ahmed Ali', '5'), ('4', '', 'Huda Nasser', '5'),
+                       ('2', '', 'Sara Khan', '7'), ('5', '', 'Mona Saeed', '5')])
+    delta, report, summary = app._import_delta(previous, current)
+    assert summary == {'new': 1, 'changed': 2, 'unchanged': 1, 'removed': 1}
+    assert delta['Student No'].tolist() == ['10', '4', '2']
+    assert list(report.columns) == app.DELTA_REPORT_COLUMNS
+    assert report[['Change', 'Student Name', 'Changed Fields']].values.tolist() == [
+        ['new', 'Huda Nasser', ''],
+        ['changed', 'Ahmed Ali', 'Student No'],
+        ['changed', 'Sara Khan', 'Grade'],
+        ['removed', 'Omar Haddad', ''],
+    ]
+
+
+@pytest.mark.parametrize('fmt', list(app.EXPORT_FORMATS))
+def test_unchanged_reimport_has_an_empty_delta(roster, tmp_path, fmt):
+    if fmt not in app._available_export_formats():
+        pytest.skip(f'{fmt} export needs pyarrow')
+    import_df = app._to_import_format(app._normalise_dataframe(roster, 'auto'))
+    path = tmp_path / app._export_file_name('School', fmt)
+    path.write_bytes(app._export_to_buffer([import_df], fmt).getvalue())
+    previous, err = app._read_previous_import(path)
+    assert err == ''
+    delta, report, summary = app._import_delta(previous, import_df)
+    assert delta.empty and report.empty
+    assert summary == {'new': 0, 'changed': 0, 'unchanged': len(roster), 'removed': 0}